@@ -0,0 +1,394 @@
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+# A 股交易费用（按成交金额比例）：佣金与过户费双边收取，印花税只在卖出时收取；
+# slippage 为成交价相对开盘价的不利偏移
+DEFAULT_COSTS = {'commission': 0.00025, 'transfer_fee': 0.00001, 'stamp_duty': 0.0005, 'slippage': 0.0}
+
+# 年化换算使用的每年交易日数
+TRADING_DAYS_PER_YEAR = 252
+
+# 平仓原因编码
+EXIT_REASONS = np.array(['止损', '止盈', '信号反转', '持有到期', '未平仓'])
+
+
+def limit_pct(codes: List[str], st_codes=()) -> np.ndarray:
+    """各股票的涨跌停幅度：主板 10%，创业板/科创板 20%，北交所 30%，ST 5%"""
+    codes = pd.Series(codes, dtype=str)
+    pct = np.full(len(codes), 0.10)
+    pct[codes.str.startswith(('300', '301', '688', '689')).to_numpy()] = 0.20
+    pct[codes.str.startswith(('43', '83', '87', '92')).to_numpy()] = 0.30
+    pct[codes.isin(set(st_codes)).to_numpy()] = 0.05
+    return pct
+
+
+def _ffill_index(valid: np.ndarray) -> np.ndarray:
+    """按列向前填充用的行号：各位置最近一个有效行（之前没有有效行时为 0）"""
+    rows = np.where(valid, np.arange(valid.shape[0])[:, None], 0)
+    return np.maximum.accumulate(rows, axis=0)
+
+
+def _next_true(mask: np.ndarray) -> np.ndarray:
+    """各位置起（含当日）首个为 True 的行号，之后都没有时为行数"""
+    n_rows = mask.shape[0]
+    rows = np.where(mask, np.arange(n_rows)[:, None], n_rows)
+    return np.minimum.accumulate(rows[::-1], axis=0)[::-1]
+
+
+class MarketPanel:
+    """
+    回测行情面板：交易日 × 股票 的日历对齐矩阵（前复权价，停牌日为 NaN）。
+    由前复权价与复权比例还原当日不复权的开盘价和涨跌停价，标记每个交易日能否以开盘价买入/卖出：
+    开盘即涨停（一字板、顶板开盘）不能买入，开盘即跌停不能卖出，停牌日两者都不能。
+    """
+
+    def __init__(self, dates: np.ndarray, codes: List[str], open_: np.ndarray, close: np.ndarray,
+                 adj_ratio: Optional[np.ndarray] = None, st_codes=()):
+        """
+        Args:
+            dates: (D,) 交易日
+            codes: (S,) 6 位股票代码
+            open_, close: (D, S) 前复权开盘价、收盘价
+            adj_ratio: (D, S) 复权比例（前复权价 / 不复权价），缺省视为 1
+            st_codes: ST 股票代码（涨跌停幅度 5%）
+        """
+        self.dates = np.asarray(dates, dtype='datetime64[ns]')
+        self.codes = list(codes)
+        self.column_of = {code: i for i, code in enumerate(self.codes)}
+        self.open = open_
+        self.close = close
+        self.has_bar = ~np.isnan(close)
+
+        cols = np.arange(close.shape[1])
+        last = _ffill_index(self.has_bar)
+        # 持仓估值用收盘价：停牌日沿用最近一个收盘价
+        self.mark = np.where(self.has_bar[last, cols], close[last, cols], np.nan)
+
+        ratio = np.ones_like(close) if adj_ratio is None else np.where(np.isnan(adj_ratio), 1.0, adj_ratio)
+        prev_mark = np.vstack([np.full((1, close.shape[1]), np.nan), self.mark[:-1]])
+        # 涨跌停按当日复权基准下的前收盘价（除权日即除权参考价）计算，价格精度 0.01 元
+        reference = prev_mark / ratio
+        pct = limit_pct(self.codes, st_codes)[None, :]
+        raw_open = open_ / ratio
+        with np.errstate(invalid='ignore'):
+            at_limit_up = raw_open >= np.round(reference * (1 + pct), 2) - 1e-6
+            at_limit_down = raw_open <= np.round(reference * (1 - pct), 2) + 1e-6
+        self.can_buy = self.has_bar & ~at_limit_up
+        self.can_sell = self.has_bar & ~at_limit_down
+        self.next_sellable = _next_true(self.can_sell)
+
+    @property
+    def shape(self):
+        return self.close.shape
+
+    @classmethod
+    def from_long(cls, kline_df: pd.DataFrame, date_col: str = 'trade_date', code_col: str = 'symbol',
+                  st_codes=()) -> 'MarketPanel':
+        """由K线长表（前复权 open/close，可选 adj_ratio）构建面板，代码统一为 6 位"""
+        codes = kline_df[code_col].astype(str).str.extract(r'(\d{6})', expand=False)
+        df = kline_df.assign(_code=codes.to_numpy())[codes.notna().to_numpy()]
+        date_cat = pd.Categorical(pd.to_datetime(df[date_col]))
+        code_cat = pd.Categorical(df['_code'])
+        rows, cols = date_cat.codes, code_cat.codes
+        shape = (len(date_cat.categories), len(code_cat.categories))
+
+        def matrix(column):
+            out = np.full(shape, np.nan)
+            out[rows, cols] = df[column].to_numpy(dtype='float64', na_value=np.nan)
+            return out
+
+        adj_ratio = matrix('adj_ratio') if 'adj_ratio' in df.columns else None
+        return cls(date_cat.categories.to_numpy(), list(code_cat.categories), matrix('open'), matrix('close'),
+                   adj_ratio, st_codes)
+
+    def mask_from_rows(self, rows: pd.DataFrame, date_col: str = 'archive_date',
+                       code_col: str = 'stock_code') -> np.ndarray:
+        """把 (日期, 股票代码) 长表转为面板上的布尔矩阵，面板外的日期或股票忽略"""
+        mask = np.zeros(self.shape, dtype=bool)
+        if rows.empty:
+            return mask
+        day = pd.Index(self.dates).get_indexer(pd.to_datetime(rows[date_col]).to_numpy(dtype='datetime64[ns]'))
+        col = pd.Index(self.codes).get_indexer(rows[code_col].astype(str).str.extract(r'(\d{6})', expand=False))
+        ok = (day >= 0) & (col >= 0)
+        mask[day[ok], col[ok]] = True
+        return mask
+
+
+class BacktestResult:
+    """回测结果：逐笔交易、每日组合收益与汇总指标"""
+
+    def __init__(self, trades: pd.DataFrame, daily: pd.DataFrame, summary: Dict):
+        self.trades = trades
+        self.daily = daily
+        self.summary = summary
+
+    def __repr__(self):
+        return '\n'.join(f"{key}: {value}" for key, value in self.summary.items())
+
+
+class VectorBacktester:
+    """
+    向量化回测引擎
+    信号在交易日 t 收盘后产生，t+1 开盘买入（开盘涨停或停牌则放弃该信号）；
+    持仓期间以每日收盘价检查止损、止盈、反转信号与持有期，触发后次日开盘卖出（A 股 T+1，最早买入次日卖出），
+    开盘跌停或停牌则顺延到首个可卖出的交易日。全部信号的买卖点、收益同时以数组运算求出，不逐笔循环；
+    组合按当日持仓等权（每日再平衡）汇总收益。
+    """
+
+    def __init__(self, market: MarketPanel, costs: Dict = None):
+        self.market = market
+        self.costs = {**DEFAULT_COSTS, **(costs or {})}
+
+    def run(self, entry: np.ndarray, exit_signal: np.ndarray = None, holding_days: int = 5,
+            stop_loss: float = None, take_profit: float = None, allow_overlap: bool = False) -> BacktestResult:
+        """
+        Args:
+            entry: (D, S) 买入信号（当日收盘后可知）
+            exit_signal: (D, S) 反转/卖出信号，可为空
+            holding_days: 最长持有的交易日数（按收盘检查次数计）
+            stop_loss: 止损幅度（如 0.08 表示收盘较买入价跌 8%），None 不止损
+            take_profit: 止盈幅度，None 不止盈
+            allow_overlap: 是否允许同一股票持仓期间再次买入（False 时同一股票同时只持有一笔）
+        """
+        m = self.market
+        n_days = m.shape[0]
+        costs = self.costs
+        buy_cost = costs['commission'] + costs['transfer_fee']
+        sell_cost = costs['commission'] + costs['transfer_fee'] + costs['stamp_duty']
+
+        signal_day, sym = np.nonzero(entry[:-1])
+        entry_day = signal_day + 1
+        ok = m.can_buy[entry_day, sym]
+        signal_day, entry_day, sym = signal_day[ok], entry_day[ok], sym[ok]
+        entry_px = m.open[entry_day, sym] * (1 + costs['slippage'])
+
+        # (交易, 持有第 k 天) 矩阵：第 k 天收盘检查平仓条件
+        offsets = np.arange(holding_days)
+        days = entry_day[:, None] + offsets[None, :]
+        in_range = days < n_days
+        days = np.minimum(days, n_days - 1)
+        cols = sym[:, None]
+        with np.errstate(invalid='ignore'):
+            change = m.mark[days, cols] / entry_px[:, None] - 1
+            triggers = [
+                change <= -stop_loss if stop_loss is not None else np.zeros(days.shape, dtype=bool),
+                change >= take_profit if take_profit is not None else np.zeros(days.shape, dtype=bool),
+                (exit_signal[days, cols] & m.has_bar[days, cols]) if exit_signal is not None
+                else np.zeros(days.shape, dtype=bool),
+                np.broadcast_to(offsets[None, :] == holding_days - 1, days.shape),
+            ]
+        hit = np.zeros(days.shape, dtype=bool)
+        for trigger in triggers:
+            hit |= trigger
+        hit &= in_range
+        triggered = hit.any(axis=1)
+        first = hit.argmax(axis=1)
+        # 同一天多个条件同时满足时按 止损 > 止盈 > 信号反转 > 持有到期 记原因
+        reason = np.full(len(sym), len(EXIT_REASONS) - 1)
+        for code in range(len(triggers) - 1, -1, -1):
+            fired = triggered & triggers[code][np.arange(len(sym)), first]
+            reason = np.where(fired, code, reason)
+
+        target = np.where(triggered, entry_day + first + 1, n_days)
+        sell_day = np.where(target < n_days, m.next_sellable[np.minimum(target, n_days - 1), sym], n_days)
+        is_open = sell_day >= n_days
+        reason = np.where(is_open, len(EXIT_REASONS) - 1, reason)
+
+        if not allow_overlap:
+            keep = self._one_position_per_symbol(sym, entry_day, sell_day)
+            signal_day, entry_day, sym, entry_px = signal_day[keep], entry_day[keep], sym[keep], entry_px[keep]
+            sell_day, is_open, reason = sell_day[keep], is_open[keep], reason[keep]
+
+        last_day = np.minimum(sell_day, n_days - 1)
+        exit_px = np.where(is_open, m.mark[last_day, sym], m.open[last_day, sym] * (1 - costs['slippage']))
+        exit_value = exit_px * np.where(is_open, 1.0, 1 - sell_cost)
+        entry_value = entry_px * (1 + buy_cost)
+        net_return = exit_value / entry_value - 1
+
+        trades = pd.DataFrame({
+            'stock_code': np.asarray(m.codes, dtype=object)[sym],
+            'signal_date': m.dates[signal_day],
+            'entry_date': m.dates[entry_day],
+            'exit_date': m.dates[last_day],
+            'entry_price': entry_px,
+            'exit_price': exit_px,
+            'holding_days': last_day - entry_day,
+            'exit_reason': EXIT_REASONS[reason],
+            'return': net_return,
+        }).sort_values(['entry_date', 'stock_code'], ignore_index=True)
+        daily = self._daily_returns(entry_day, last_day, is_open, sym, entry_value, exit_value)
+        return BacktestResult(trades, daily, self._summary(trades, daily))
+
+    @staticmethod
+    def _one_position_per_symbol(sym: np.ndarray, entry_day: np.ndarray, sell_day: np.ndarray) -> np.ndarray:
+        """
+        同一股票持仓期间的后续信号作废：按股票分组，每轮同时为所有股票选出下一笔（买入日不早于上一笔卖出日），
+        轮数等于单只股票最多的交易笔数。
+        """
+        order = np.lexsort((entry_day, sym))
+        s, e, x = sym[order], entry_day[order], sell_day[order]
+        keep = np.zeros(len(order), dtype=bool)
+        free_from = np.full(int(s.max()) + 1 if len(s) else 0, -1)
+        pending = np.ones(len(order), dtype=bool)
+        while True:
+            pending &= e >= free_from[s]
+            if not pending.any():
+                break
+            idx = np.flatnonzero(pending)
+            # 每只股票候选中买入日最早的一笔（已按 股票、买入日 排序，取组内第一个）
+            _, first = np.unique(s[idx], return_index=True)
+            chosen = idx[first]
+            keep[chosen] = True
+            pending[chosen] = False
+            free_from[s[chosen]] = x[chosen]
+        result = np.zeros(len(order), dtype=bool)
+        result[order] = keep
+        return result
+
+    def _daily_returns(self, entry_day, last_day, is_open, sym, entry_value, exit_value) -> pd.DataFrame:
+        """各笔交易逐日的收益（买入日按成本价、卖出日按卖出净额计），按持仓等权汇总为组合日收益"""
+        m = self.market
+        n_days = m.shape[0]
+        span = last_day - entry_day + 1
+        width = int(span.max()) if len(span) else 0
+        days = entry_day[:, None] + np.arange(width)[None, :]
+        held = np.arange(width)[None, :] < span[:, None]
+        days = np.minimum(days, n_days - 1)
+        cols = sym[:, None]
+        value = m.mark[days, cols]
+        prev_value = np.concatenate([entry_value[:, None], value[:, :-1]], axis=1)
+        # 卖出日的价值为卖出净额（未平仓的以最后收盘价估值）
+        is_exit = (np.arange(width)[None, :] == (span - 1)[:, None]) & ~is_open[:, None]
+        value = np.where(is_exit, exit_value[:, None], value)
+        daily_ret = value / prev_value - 1
+
+        flat_days = days[held]
+        total = np.bincount(flat_days, weights=daily_ret[held], minlength=n_days)
+        positions = np.bincount(flat_days, minlength=n_days)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            portfolio = np.where(positions > 0, total / np.maximum(positions, 1), 0.0)
+        return pd.DataFrame({
+            'date': m.dates,
+            'positions': positions,
+            'daily_return': portfolio,
+            'equity': np.cumprod(1 + portfolio),
+        })
+
+    @staticmethod
+    def _summary(trades: pd.DataFrame, daily: pd.DataFrame) -> Dict:
+        closed = trades[trades['exit_reason'] != '未平仓']
+        equity = daily['equity'].to_numpy()
+        returns = daily['daily_return'].to_numpy()
+        years = len(daily) / TRADING_DAYS_PER_YEAR
+        drawdown = 1 - equity / np.maximum.accumulate(equity) if len(equity) else np.array([0.0])
+        std = returns.std(ddof=1) if len(returns) > 1 else 0.0
+        return {
+            '交易笔数': len(trades),
+            '已平仓笔数': len(closed),
+            '胜率': float((closed['return'] > 0).mean()) if len(closed) else np.nan,
+            '平均收益': float(closed['return'].mean()) if len(closed) else np.nan,
+            '收益中位数': float(closed['return'].median()) if len(closed) else np.nan,
+            '平均持有天数': float(closed['holding_days'].mean()) if len(closed) else np.nan,
+            '累计收益': float(equity[-1] - 1) if len(equity) else 0.0,
+            '年化收益': float(equity[-1] ** (1 / years) - 1) if len(equity) and years > 0 else 0.0,
+            '最大回撤': float(drawdown.max()),
+            '夏普比率': float(returns.mean() / std * np.sqrt(TRADING_DAYS_PER_YEAR)) if std > 0 else np.nan,
+            '平仓原因': closed['exit_reason'].value_counts().to_dict(),
+        }
+
+
+class StrategySignalLoader:
+    """从数据仓读取回测所需的K线与信号：stock_daily_kline、app_stock_strategy_report、ods_ak_ranking_stocks"""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def load_market(self, start_date: str, end_date: str, symbols: List[str] = None) -> MarketPanel:
+        from DataManager.KlineHistoryLoader import KlineHistoryLoader
+
+        loader = KlineHistoryLoader(self.engine)
+        if symbols is None:
+            with self.engine.connect() as conn:
+                symbols = [row[0] for row in conn.execute(text(
+                    f"SELECT DISTINCT symbol FROM {KlineHistoryLoader.TABLE_NAME}"))]
+        kline = loader.read_typed(symbols, start_date, end_date, columns=['trade_date', 'symbol', 'open', 'close',
+                                                                          'adj_ratio'])
+        st_codes = self._st_codes(start_date, end_date)
+        return MarketPanel.from_long(kline, st_codes=st_codes)
+
+    def _st_codes(self, start_date: str, end_date: str) -> set:
+        """报告中名称带 ST 的股票（涨跌停幅度按 5% 计）"""
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.execute(text("""
+                    SELECT DISTINCT stock_code FROM app_stock_strategy_report
+                    WHERE archive_date BETWEEN :start AND :end AND stock_name LIKE :pattern
+                """), {'start': start_date, 'end': end_date, 'pattern': '%ST%'})
+                return {row[0] for row in rows}
+        except Exception as e:
+            print(f"[WARN] 读取 ST 股票列表失败: {e}，全部按普通涨跌幅处理。")
+            return set()
+
+    def report_mask(self, market: MarketPanel, rules: Dict[str, str], start_date: str, end_date: str) -> np.ndarray:
+        """
+        以报告信号列作为规则：rules 为 列名 -> 正则表达式（各列同时匹配才算信号），
+        如 {'macd_12269_signal': '金叉', 'kdj_signal': '超卖|底背离'}。
+        """
+        columns = ', '.join(f'"{col}"' for col in rules)
+        with self.engine.connect() as conn:
+            rows = pd.read_sql(text(f"""
+                SELECT archive_date, stock_code, {columns} FROM app_stock_strategy_report
+                WHERE archive_date BETWEEN :start AND :end
+            """), conn, params={'start': start_date, 'end': end_date})
+        matched = np.ones(len(rows), dtype=bool)
+        for col, pattern in rules.items():
+            matched &= rows[col].fillna('').astype(str).str.contains(pattern, regex=True).to_numpy()
+        return market.mask_from_rows(rows[matched])
+
+    def ranking_mask(self, market: MarketPanel, strategy_types: List[str], start_date: str, end_date: str) -> np.ndarray:
+        """以策略归档（强势股池、连续上涨、量价齐升、持续放量）作为信号"""
+        with self.engine.connect() as conn:
+            rows = pd.read_sql(text("""
+                SELECT archive_date, stock_code FROM ods_ak_ranking_stocks
+                WHERE archive_date BETWEEN :start AND :end AND strategy_type = ANY(:types)
+            """), conn, params={'start': start_date, 'end': end_date, 'types': list(strategy_types)})
+        return market.mask_from_rows(rows)
+
+
+# 测试代码：合成行情上的规模与规则自检
+if __name__ == "__main__":
+    from DataManager.DataProvider import FakeMarketProvider
+
+    provider = FakeMarketProvider(n_symbols=5000, n_days=750, seed=7)
+    mk = provider.market
+    qfq_open, qfq_close = mk['open'] * mk['adj_ratio'], mk['close'] * mk['adj_ratio']
+    market = MarketPanel(mk['dates'], list(mk['codes']), qfq_open, qfq_close, mk['adj_ratio'])
+
+    # 示例规则：收盘价上穿 20 日均线买入，下穿卖出
+    ma20 = pd.DataFrame(qfq_close).rolling(20).mean().to_numpy()
+    above = qfq_close > ma20
+    entry = above & ~np.vstack([np.ones((1, above.shape[1]), dtype=bool), above[:-1]])
+    exit_signal = ~above
+
+    started = time.time()
+    result = VectorBacktester(market).run(entry, exit_signal, holding_days=10, stop_loss=0.08, take_profit=0.2)
+    print(f"[INFO] {market.shape[1]} 只股票 × {market.shape[0]} 个交易日回测耗时 {time.time() - started:.2f}s")
+    print(result)
+
+    trades = result.trades
+    day_of = {d: i for i, d in enumerate(market.dates)}
+    entry_idx = trades['entry_date'].map(day_of).to_numpy()
+    exit_idx = trades['exit_date'].map(day_of).to_numpy()
+    col_idx = trades['stock_code'].map(market.column_of).to_numpy()
+    closed = (trades['exit_reason'] != '未平仓').to_numpy()
+    assert (exit_idx[closed] > entry_idx[closed]).all(), "T+1：卖出日必须晚于买入日"
+    assert market.can_buy[entry_idx, col_idx].all(), "开盘涨停或停牌时不能买入"
+    assert market.can_sell[exit_idx[closed], col_idx[closed]].all(), "开盘跌停或停牌时不能卖出"
+    ordered = trades.sort_values(['stock_code', 'entry_date'])
+    next_entry = ordered.groupby('stock_code')['entry_date'].shift(-1)
+    assert (next_entry.dropna() >= ordered['exit_date'][next_entry.notna()]).all(), "同一股票持仓不应重叠"
+    print("[INFO] T+1、涨跌停与持仓不重叠检查通过。")
@@ -40,6 +40,56 @@ class Config:
         self.MAX_WORKERS = system.getint('MAX_WORKERS', fallback=15)
         self.DATA_FETCH_RETRIES = system.getint('DATA_FETCH_RETRIES', fallback=3)
         self.DATA_FETCH_DELAY = system.getint('DATA_FETCH_DELAY', fallback=5)
+        # K线同步模式：incremental（按库内最后交易日增量补齐）/ full（全量重取并重写）
+        self.KLINE_SYNC_MODE = system.get('KLINE_SYNC_MODE', 'incremental').strip().lower()
+        # K线批量写库时并行 COPY 的数据库连接数（按股票分片）
+        self.DB_COPY_WORKERS = system.getint('DB_COPY_WORKERS', fallback=4)
+        # 接口抓取调度：令牌桶速率（次/秒）、自适应并发上下限、触发降并发的平均延迟（秒）
+        self.FETCH_RATE_LIMIT = system.getfloat('FETCH_RATE_LIMIT', fallback=8.0)
+        self.FETCH_MIN_CONCURRENCY = system.getint('FETCH_MIN_CONCURRENCY', fallback=2)
+        self.FETCH_MAX_CONCURRENCY = system.getint('FETCH_MAX_CONCURRENCY', fallback=12)
+        self.FETCH_LATENCY_TARGET = system.getfloat('FETCH_LATENCY_TARGET', fallback=3.0)
+        # K线获取断点续传：中断后重跑时跳过已落盘的股票
+        self.KLINE_FETCH_RESUME = system.getboolean('KLINE_FETCH_RESUME', fallback=True)
+        # 本地K线列式库目录（Parquet，按 symbol/year 分区），位于临时数据目录下
+        self.KLINE_STORE_DIR = os.path.join(self.TEMP_DATA_DIRECTORY, system.get('KLINE_STORE_DIR', 'kline_store'))
+        # 数据源录制/回放：off 直连（默认）/ record 请求并录制（压测、复现问题时显式开启）/ replay 从录制数据包离线回放
+        self.VENDOR_IO_MODE = system.get('VENDOR_IO_MODE', 'off').strip().lower()
+        self.VENDOR_BUNDLE_DIR = os.path.join(self.TEMP_DATA_DIRECTORY, system.get('VENDOR_BUNDLE_DIR', 'vendor_bundles'))
+        # 回放使用的数据包日期（YYYYMMDD），留空取最新数据包；回放时运行日期固定为该数据包的交易日（不随当天日期变化）
+        self.VENDOR_REPLAY_DATE = system.get('VENDOR_REPLAY_DATE', '').strip()
+        # 录制模式下数据包保留天数，更早的数据包及不再被引用的录制对象在开始录制时删除（0 不清理）
+        self.VENDOR_RETENTION_DAYS = system.getint('VENDOR_RETENTION_DAYS', fallback=14)
+        # 行情数据源：akshare / tushare / fake（本地合成 N 只 × T 日行情，用于压测）
+        self.DATA_PROVIDER = system.get('DATA_PROVIDER', 'akshare').strip().lower()
+        self.FAKE_MARKET_SYMBOLS = system.getint('FAKE_MARKET_SYMBOLS', fallback=5000)
+        self.FAKE_MARKET_DAYS = system.getint('FAKE_MARKET_DAYS', fallback=500)
+        self.FAKE_MARKET_SEED = system.getint('FAKE_MARKET_SEED', fallback=42)
+        # 技术指标增量计算：保存各股票指标状态，次日只折算新增K线（复权比例变化时该股全量重算）
+        self.INDICATOR_INCREMENTAL = system.getboolean('INDICATOR_INCREMENTAL', fallback=True)
+        self.INDICATOR_STATE_DIR = os.path.join(self.TEMP_DATA_DIRECTORY,
+                                                system.get('INDICATOR_STATE_DIR', 'indicator_state'))
+        # 技术指标计算的工作进程数（按股票分片，面板经共享内存传给子进程）：0 取 CPU 核数，1 单进程
+        self.SIGNAL_WORKERS = system.getint('SIGNAL_WORKERS', fallback=0)
+        # 技术指标结果缓存条目上限（按 股票 + 预热窗口K线内容哈希 + 参数 缓存信号快照，LRU 淘汰）：0 不缓存
+        # 仅用于全量计算路径（INDICATOR_INCREMENTAL=false 或增量计算失败回退时），增量模式复用的是指标状态
+        self.INDICATOR_MEMO_MAX_ENTRIES = system.getint('INDICATOR_MEMO_MAX_ENTRIES', fallback=50000)
+        # 接口数据统一缓存：目录、总大小上限（MB）、条目闲置天数上限（超出按最近访问淘汰）、
+        # 过期后先用旧值并后台刷新的宽限秒数（0 表示过期即同步重取）
+        self.FETCH_CACHE_DIR = os.path.join(self.TEMP_DATA_DIRECTORY, system.get('FETCH_CACHE_DIR', 'fetch_cache'))
+        self.FETCH_CACHE_MAX_MB = system.getint('FETCH_CACHE_MAX_MB', fallback=1024)
+        self.FETCH_CACHE_MAX_AGE_DAYS = system.getfloat('FETCH_CACHE_MAX_AGE_DAYS', fallback=30)
+        self.FETCH_CACHE_STALE_TTL = system.getfloat('FETCH_CACHE_STALE_TTL', fallback=0)
+        # 表格数据的缓存格式（parquet 列式快照 / csv 文本）与 parquet 压缩算法（zstd / snappy / gzip / none）
+        self.FETCH_CACHE_FORMAT = system.get('FETCH_CACHE_FORMAT', 'parquet').strip().lower()
+        self.FETCH_CACHE_COMPRESSION = system.get('FETCH_CACHE_COMPRESSION', 'zstd').strip().lower()
+        # 各数据源的缓存有效秒数（[CACHE_TTL] 节，键为数据源名称）；未配置的数据源在当个业务日内一直有效
+        # 数据源名称区分大小写（如 A股实时行情），该节单独用保留键名大小写的解析器读取
+        ttl_config = configparser.ConfigParser()
+        ttl_config.optionxform = str
+        ttl_config.read(self.config_file, encoding='utf-8')
+        self.CACHE_TTL = {source: float(ttl) for source, ttl in ttl_config['CACHE_TTL'].items()} \
+            if ttl_config.has_section('CACHE_TTL') else {}
 
             # 其他配置...
         self.CODE_ALIASES = {'代码': '股票代码', '证券代码': '股票代码', '股票代码': '股票代码'}
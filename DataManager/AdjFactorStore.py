@@ -0,0 +1,167 @@
+from typing import Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy import text
+
+from DataManager.DataProvider import AkshareProvider
+
+# 复权因子分段表：自 start_date 起（到下一个分段前）适用的 adj_ratio = 前复权价 / 不复权价
+ADJ_FACTOR_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS stock_adj_factor (
+    symbol varchar(10) NOT NULL,
+    start_date date NOT NULL,
+    adj_ratio numeric(24, 12) NOT NULL,
+    updated_at timestamp DEFAULT CURRENT_TIMESTAMP NULL,
+    CONSTRAINT stock_adj_factor_pkey PRIMARY KEY (symbol, start_date)
+)
+"""
+
+
+class AdjFactorStore:
+    """
+    前复权因子存储
+    K线只下载不复权数据，前复权价格由 不复权价 × adj_ratio 推导；
+    每只股票只在发生除权除息时重新下载复权因子，并在库内按新因子重算已存历史的前复权价格。
+    """
+
+    TABLE_NAME = 'stock_adj_factor'
+    KLINE_TABLE = 'stock_daily_kline'
+    FACTOR_ENDPOINT = 'stock_zh_a_daily_qfq_factor'
+
+    def __init__(self, engine, scheduler=None, provider=None):
+        """
+        Args:
+            engine: SQLAlchemy 引擎
+            scheduler: 可选的 FetchScheduler，下载因子时经其限速与重试
+            provider: 行情数据源（DataProvider），默认 akshare
+        """
+        self.engine = engine
+        self.scheduler = scheduler
+        self.provider = provider or AkshareProvider()
+
+    def ensure_table(self):
+        with self.engine.begin() as conn:
+            conn.execute(text(ADJ_FACTOR_TABLE_DDL))
+
+    def load(self, symbols: List[str]) -> Dict[str, pd.DataFrame]:
+        """读取库内复权因子分段，返回 {symbol: DataFrame[start_date, adj_ratio]}（按 start_date 升序）。"""
+        if not symbols:
+            return {}
+        try:
+            self.ensure_table()
+            with self.engine.connect() as conn:
+                df = pd.read_sql(text(f"""
+                    SELECT symbol, start_date, adj_ratio
+                    FROM {self.TABLE_NAME}
+                    WHERE symbol = ANY(:symbols)
+                    ORDER BY symbol, start_date
+                """), conn, params={'symbols': list(symbols)})
+        except Exception as e:
+            print(f"[WARN] 读取复权因子失败: {e}，相关股票将重新下载因子。")
+            return {}
+
+        df['start_date'] = pd.to_datetime(df['start_date'])
+        df['adj_ratio'] = df['adj_ratio'].astype(float)
+        return {sym: grp[['start_date', 'adj_ratio']].reset_index(drop=True) for sym, grp in df.groupby('symbol')}
+
+    def fetch(self, symbol: str) -> Optional[pd.DataFrame]:
+        """
+        从数据源下载单只股票的前复权因子（qfq_factor 自该日起生效，前复权价 = 不复权价 / qfq_factor）。
+        返回 DataFrame[start_date, adj_ratio]，失败返回 None。
+        """
+        try:
+            if self.scheduler is not None:
+                raw = self.scheduler.call(self.FACTOR_ENDPOINT, self.provider.qfq_factor, symbol)
+            else:
+                raw = self.provider.qfq_factor(symbol)
+        except Exception as e:
+            print(f"[ERROR] 获取 {symbol} 复权因子失败: {e}")
+            return None
+        if raw is None or raw.empty or 'qfq_factor' not in raw.columns:
+            return None
+
+        df = pd.DataFrame({
+            'start_date': pd.to_datetime(raw['date']).dt.normalize(),
+            'qfq_factor': pd.to_numeric(raw['qfq_factor'], errors='coerce'),
+        })
+        df = df[df['qfq_factor'] > 0]
+        if df.empty:
+            return None
+        df['adj_ratio'] = 1.0 / df['qfq_factor']
+        df = df.drop_duplicates(subset=['start_date'], keep='last').sort_values('start_date')
+        return df[['start_date', 'adj_ratio']].reset_index(drop=True)
+
+    @staticmethod
+    def apply(raw_df: pd.DataFrame, factor_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        按因子分段把不复权K线换算为前复权：close_normal 保留不复权收盘价，open/close/high/low 为前复权价。
+        raw_df 需包含 trade_date、open、close、high、low（不复权）。
+        """
+        df = raw_df.sort_values('trade_date').reset_index(drop=True)
+        # 因子可能来自数据库、接口或续传日志，时间精度不一，merge_asof 要求两侧一致
+        df['trade_date'] = df['trade_date'].astype('datetime64[ns]')
+        factor_df = factor_df.assign(start_date=factor_df['start_date'].astype('datetime64[ns]'))
+        df = pd.merge_asof(df, factor_df.sort_values('start_date'),
+                           left_on='trade_date', right_on='start_date', direction='backward')
+        # 早于首个分段的K线沿用最早的因子
+        df['adj_ratio'] = df['adj_ratio'].fillna(factor_df['adj_ratio'].iloc[0])
+
+        df['close_normal'] = df['close']
+        for col in ['open', 'close', 'high', 'low']:
+            df[col] = df[col] * df['adj_ratio']
+        return df.drop(columns=['start_date'])
+
+    def save_and_rescale(self, factors: Dict[str, pd.DataFrame], symbols: List[str], conn=None) -> int:
+        """
+        单事务内：替换 factors 中股票的因子分段，再把 symbols 内已存K线的前复权价格按库内因子重算。
+        传入 conn 时在调用方的事务内执行（与K线写入一起提交或回滚），否则自开事务。
+        只改写 adj_ratio 与因子不一致的行，可重复执行；返回被改写的K线行数。
+        新价格由不复权价 × 新因子得到：收盘价用 close_normal，开/高/低先按旧因子还原并取整到分
+        （A股最小变动价位 0.01，库内四位小数的舍入误差远小于半分），多次除权也不会累积舍入误差。
+        """
+        if conn is None:
+            with self.engine.begin() as conn:
+                return self.save_and_rescale(factors, symbols, conn)
+
+        rows = [
+            {'symbol': sym, 'start_date': d.date(), 'adj_ratio': float(r)}
+            for sym, df in factors.items()
+            for d, r in zip(df['start_date'], df['adj_ratio'])
+        ]
+        conn.execute(text(ADJ_FACTOR_TABLE_DDL))
+        if factors:
+            conn.execute(text(f"DELETE FROM {self.TABLE_NAME} WHERE symbol = ANY(:symbols)"),
+                         {'symbols': list(factors.keys())})
+        if rows:
+            conn.execute(text(f"""
+                INSERT INTO {self.TABLE_NAME} (symbol, start_date, adj_ratio)
+                VALUES (:symbol, :start_date, :adj_ratio)
+            """), rows)
+        if not symbols:
+            return 0
+        result = conn.execute(text(f"""
+            WITH target AS (
+                SELECT k.symbol, k.trade_date,
+                       COALESCE(
+                           (SELECT a.adj_ratio FROM {self.TABLE_NAME} a
+                            WHERE a.symbol = k.symbol AND a.start_date <= k.trade_date
+                            ORDER BY a.start_date DESC LIMIT 1),
+                           (SELECT a.adj_ratio FROM {self.TABLE_NAME} a
+                            WHERE a.symbol = k.symbol
+                            ORDER BY a.start_date ASC LIMIT 1)
+                       ) AS new_ratio
+                FROM {self.KLINE_TABLE} k
+                WHERE k.symbol = ANY(:symbols)
+            )
+            UPDATE {self.KLINE_TABLE} AS k
+            SET "open" = ROUND(k."open" / k.adj_ratio, 2) * t.new_ratio,
+                high = ROUND(k.high / k.adj_ratio, 2) * t.new_ratio,
+                low = ROUND(k.low / k.adj_ratio, 2) * t.new_ratio,
+                "close" = k.close_normal * t.new_ratio,
+                adj_ratio = t.new_ratio
+            FROM target t
+            WHERE k.symbol = t.symbol AND k.trade_date = t.trade_date
+              AND t.new_ratio IS NOT NULL AND k.adj_ratio > 0
+              AND ABS(k.adj_ratio - t.new_ratio) > 1e-9
+        """), {'symbols': list(symbols)})
+        return result.rowcount
@@ -1,38 +1,37 @@
 
-import akshare as ak
+from DataManager.DataProvider import DataProvider, AkshareProvider
 from datetime import datetime, timedelta
 import pytz
 import pandas as pd
-import os
-import json
 from typing import Set, Optional
+from DataManager.FetchCache import CachePolicy, FetchCache, fetch_cache
+from DataManager.VendorRecorder import vendor_recorder
 
 
 class TradingCalendarAnalyzer:
-    def __init__(self, cache_dir: str = "./cache"):
+    CACHE_SOURCE = '交易日历'
+
+    def __init__(self, cache_dir: str = "./cache", provider: DataProvider = None):
         self.beijing_tz = pytz.timezone('Asia/Shanghai')
         self.cache_dir = cache_dir
-        # 确保缓存目录存在
-        os.makedirs(self.cache_dir, exist_ok=True)
-
-        # 缓存文件名：包含日期，每天一个文件或通用文件均可，这里采用通用文件+过期机制
-        self.cache_filename = "official_trading_dates.json"
-        self.cache_path = os.path.join(self.cache_dir, self.cache_filename)
+        self.provider = provider or AkshareProvider()
+        # 日历经统一缓存按数据源名称存放（通用文件+过期机制），不同数据源互不覆盖
+        self._own_cache = None
 
         # 缓存失效时间（秒），设为 24 小时，强制定期更新
         self.cache_ttl = 24 * 60 * 60
 
-    def _fetch_from_akshare(self) -> Optional[Set[str]]:
+    def _fetch_from_provider(self) -> Optional[Set[str]]:
         """
-        私有方法：从 Akshare 获取官方交易日历。
+        私有方法：从数据源获取官方交易日历。
         返回：交易日集合 (YYYY-MM-DD) 或 None
         """
         try:
-            print("[Calendar] 正在从 Akshare 接口获取最新的官方交易日历...")
-            df = ak.tool_trade_date_hist_sina()
+            print(f"[Calendar] 正在从 {self.provider.name} 数据源获取最新的官方交易日历...")
+            df = self.provider.trade_calendar()
 
             if df is None or df.empty:
-                print("[Calendar WARN] Akshare 返回的数据为空。")
+                print(f"[Calendar WARN] {self.provider.name} 返回的数据为空。")
                 return None
 
             # 标准化日期格式
@@ -43,80 +42,34 @@ class TradingCalendarAnalyzer:
             return dates
 
         except Exception as e:
-            print(f"[Calendar ERROR] Akshare 接口调用失败: {e}")
+            print(f"[Calendar ERROR] {self.provider.name} 接口调用失败: {e}")
             return None
 
-    def _load_from_cache(self) -> Optional[Set[str]]:
-        """
-        私有方法：从本地文件加载缓存。
-        """
-        if os.path.exists(self.cache_path):
-            try:
-                file_stat = os.stat(self.cache_path)
-                # 检查文件是否在 TTL 有效期内
-                file_age = datetime.now().timestamp() - file_stat.st_mtime
-                if file_age < self.cache_ttl:
-                    with open(self.cache_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        # 将列表转为集合
-                        dates = set(data.get('dates', []))
-                        print(f"[Calendar] 成功从本地缓存加载数据 (文件未过期)。")
-                        return dates
-                else:
-                    print(f"[Calendar] 本地缓存文件已过期，将尝试更新。")
-            except Exception as e:
-                print(f"[Calendar ERROR] 读取缓存文件失败: {e}")
-        else:
-            print(f"[Calendar] 本地缓存文件不存在: {self.cache_path}")
-        return None
-
-    def _save_to_cache(self, dates: Set[str]):
-        """
-        私有方法：保存数据到本地缓存。
-        """
-        try:
-            data = {
-                "last_updated": datetime.now().isoformat(),
-                "date_count": len(dates),
-                "dates": sorted(list(dates))  # 集合不可JSON序列化，转为排序后的列表
-            }
-            with open(self.cache_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            print(f"[Calendar] 新的交易日历已保存到本地缓存。")
-        except Exception as e:
-            print(f"[Calendar ERROR] 保存缓存失败: {e}")
+    @property
+    def cache(self) -> FetchCache:
+        """全局接口缓存已配置时与其他数据源共用；否则在 cache_dir 下单独建一个"""
+        cache = fetch_cache if fetch_cache.enabled else self._own_cache
+        if cache is None:
+            cache = self._own_cache = FetchCache(self.cache_dir)
+        cache.set_policy(self.CACHE_SOURCE, CachePolicy(ttl=self.cache_ttl, codec='json'))
+        return cache
 
     def get_official_trading_dates(self) -> Set[str]:
         """
         公共方法：获取官方交易日历（优先缓存，其次接口）。
         逻辑：
-        1. 尝试读取本地缓存（未过期）。
-        2. 如果缓存不可用，尝试从 Akshare 接口获取。
-        3. 如果接口失败，尝试读取本地缓存（不管过没过期，保底用）。
+        1. 本地缓存未过期（默认 24 小时，可在 [CACHE_TTL] 中按“交易日历”调整）时直接使用。
+        2. 如果缓存不可用，尝试从数据源接口获取并写入缓存。
+        3. 如果接口失败，使用本地缓存（不管过没过期，保底用）。
         4. 如果全失败，回退到仅周末逻辑。
         """
-        # 1. 尝试加载有效缓存
-        dates = self._load_from_cache()
-        if dates:
-            return dates
+        def fetch() -> Optional[list]:
+            dates = self._fetch_from_provider()
+            return sorted(dates) if dates else None  # 集合不可JSON序列化，转为排序后的列表
 
-        # 2. 缓存失效或不存在，尝试从网络获取
-        fresh_dates = self._fetch_from_akshare()
-        if fresh_dates:
-            # 获取成功，保存新缓存
-            self._save_to_cache(fresh_dates)
-            return fresh_dates
-
-        # 3. 网络获取失败，尝试强制读取旧缓存（即使过期，也比没有强）
-        if os.path.exists(self.cache_path):
-            try:
-                with open(self.cache_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    dates = set(data.get('dates', []))
-                    print(f"[Calendar WARN] 接口失效，正在使用过期的本地缓存数据。")
-                    return dates
-            except:
-                pass
+        dates = self.cache.fetch(self.CACHE_SOURCE, self.provider.name, fetch, codec='json')
+        if dates:
+            return set(dates)
 
         # 4. 所有手段失败，回退到仅排除周末逻辑（保底）
         print("[Calendar CRITICAL] 缓存和接口均不可用，回退到仅周末逻辑（无法识别法定节假日）。")
@@ -132,12 +85,13 @@ class TradingCalendarAnalyzer:
     def get_last_trading_day(self, input_date: datetime = None) -> str:
         """
         核心方法：计算最后一个交易日。
+        未指定 input_date 时按当前时间计算；回放模式下按回放数据包的交易日计算，使离线重放与录制时的运行日期一致。
         """
         # 获取官方日历数据
         official_dates = self.get_official_trading_dates()
 
         # 处理输入时间
-        check_date = input_date or datetime.now()
+        check_date = input_date or vendor_recorder.replay_session() or datetime.now()
         if check_date.tzinfo is None:
             check_date = self.beijing_tz.localize(check_date)
         else:
@@ -159,6 +113,18 @@ class TradingCalendarAnalyzer:
         # 理论上不会走到这里，除非日历数据为空
         return current_str
 
+    def get_lookback_start(self, end_date: str, sessions: int) -> str:
+        """
+        返回截至 end_date（含）向前数第 sessions 个交易日的日期 (YYYY-MM-DD)，
+        使 [起始日, end_date] 恰好包含 sessions 个交易日。日历覆盖不足时返回日历中最早的交易日。
+        """
+        end_str = pd.to_datetime(end_date).strftime('%Y-%m-%d')
+        dates = sorted(d for d in self.get_official_trading_dates() if d <= end_str)
+        if not dates:
+            # 日历不可用：按自然日粗略估算（每周 5 个交易日，另留节假日余量）
+            return (pd.to_datetime(end_str) - timedelta(days=int(sessions * 7 / 5) + 30)).strftime('%Y-%m-%d')
+        return dates[-sessions] if len(dates) >= sessions else dates[0]
+
 # --- 实例化供外部调用 ---
 # 假设你的缓存目录配置在 Config 中，或者直接用默认的
 # trading_calendar = TradingCalendarAnalyzer()
\ No newline at end of file
@@ -0,0 +1,724 @@
+import re
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+import tushare as ts
+
+from DataManager.VendorRecorder import ak, vendor_recorder
+from FormatManager.ShareCodeFormatMgr import format_stock_code
+
+
+class DataProvider(ABC):
+    """
+    行情数据源接口
+    各方法返回与 akshare 对应接口相同列名的 DataFrame（股票列表沿用 Tushare stock_basic 的列），
+    调用方的清洗、缓存逻辑不随数据源变化。
+    """
+
+    name = 'base'
+
+    @abstractmethod
+    def stock_basic(self, list_status: str = 'L', market: str = '主板') -> pd.DataFrame:
+        """股票列表：ts_code, symbol, name, industry, market"""
+
+    @abstractmethod
+    def kline(self, symbol: str, start_date: str, end_date: str, adjust: str = '') -> pd.DataFrame:
+        """单只股票日K线（symbol 如 sh600000，日期 YYYYMMDD）：date, open, close, high, low, amount"""
+
+    @abstractmethod
+    def qfq_factor(self, symbol: str) -> pd.DataFrame:
+        """前复权因子分段：date（自该日起生效）, qfq_factor（前复权价 = 不复权价 / qfq_factor）"""
+
+    @abstractmethod
+    def spot(self) -> pd.DataFrame:
+        """全市场实时行情（同 stock_zh_a_spot_em）"""
+
+    @abstractmethod
+    def profit_forecast(self) -> pd.DataFrame:
+        """研报盈利预测（同 stock_profit_forecast_em）"""
+
+    @abstractmethod
+    def fund_flow_individual(self, symbol: str = '即时') -> pd.DataFrame:
+        """个股资金流排行，symbol 为 即时 / 3日排行 / 5日排行 / 10日排行 / 20日排行"""
+
+    @abstractmethod
+    def zt_pool_strong(self, date: str) -> pd.DataFrame:
+        """强势股池（同 stock_zt_pool_strong_em）"""
+
+    @abstractmethod
+    def rank_lxsz(self) -> pd.DataFrame:
+        """连续上涨排行"""
+
+    @abstractmethod
+    def rank_ljqs(self) -> pd.DataFrame:
+        """量价齐升排行"""
+
+    @abstractmethod
+    def rank_cxfl(self) -> pd.DataFrame:
+        """持续放量排行"""
+
+    @abstractmethod
+    def rank_xstp(self, symbol: str = '10日均线') -> pd.DataFrame:
+        """向上突破均线，symbol 为 N日均线"""
+
+    @abstractmethod
+    def industry_boards(self) -> pd.DataFrame:
+        """行业板块行情（同 stock_board_industry_name_em）"""
+
+    @abstractmethod
+    def industry_constituents(self, symbol: str) -> pd.DataFrame:
+        """行业板块成分股，symbol 为板块名称"""
+
+    @abstractmethod
+    def industry_fund_flow(self, symbol: str = '即时') -> pd.DataFrame:
+        """行业资金流排行（同 stock_fund_flow_industry）"""
+
+    @abstractmethod
+    def big_deal(self) -> pd.DataFrame:
+        """大单追踪（同 stock_fund_flow_big_deal）"""
+
+    @abstractmethod
+    def cost_data(self) -> pd.DataFrame:
+        """主力成本 / 机构参与度（同 stock_comment_em）"""
+
+    @abstractmethod
+    def trade_calendar(self) -> pd.DataFrame:
+        """交易日历：trade_date"""
+
+
+def _tushare_pro(token: str):
+    ts.set_token(token)
+    return vendor_recorder.proxy(ts.pro_api(), 'tushare.pro')
+
+
+class AkshareProvider(DataProvider):
+    """akshare 数据源（经录制层）；akshare 没有带行业分类的股票列表，stock_basic 沿用 Tushare。"""
+
+    name = 'akshare'
+
+    def __init__(self, tushare_token: str = None):
+        self.tushare_token = tushare_token
+        self._pro = None
+
+    def _tushare(self):
+        if self._pro is None:
+            if not self.tushare_token:
+                raise ValueError("获取股票列表需要 tushare_token。")
+            self._pro = _tushare_pro(self.tushare_token)
+        return self._pro
+
+    def stock_basic(self, list_status: str = 'L', market: str = '主板') -> pd.DataFrame:
+        return self._tushare().stock_basic(exchange='', list_status=list_status, market=market,
+                                           fields='ts_code,symbol,name,industry,market')
+
+    def kline(self, symbol: str, start_date: str, end_date: str, adjust: str = '') -> pd.DataFrame:
+        return ak.stock_zh_a_hist_tx(symbol=symbol, start_date=start_date, end_date=end_date, adjust=adjust)
+
+    def qfq_factor(self, symbol: str) -> pd.DataFrame:
+        return ak.stock_zh_a_daily(symbol=symbol, adjust="qfq-factor")
+
+    def spot(self) -> pd.DataFrame:
+        return ak.stock_zh_a_spot_em()
+
+    def profit_forecast(self) -> pd.DataFrame:
+        return ak.stock_profit_forecast_em()
+
+    def fund_flow_individual(self, symbol: str = '即时') -> pd.DataFrame:
+        return ak.stock_fund_flow_individual(symbol=symbol)
+
+    def zt_pool_strong(self, date: str) -> pd.DataFrame:
+        return ak.stock_zt_pool_strong_em(date=date)
+
+    def rank_lxsz(self) -> pd.DataFrame:
+        return ak.stock_rank_lxsz_ths()
+
+    def rank_ljqs(self) -> pd.DataFrame:
+        return ak.stock_rank_ljqs_ths()
+
+    def rank_cxfl(self) -> pd.DataFrame:
+        return ak.stock_rank_cxfl_ths()
+
+    def rank_xstp(self, symbol: str = '10日均线') -> pd.DataFrame:
+        return ak.stock_rank_xstp_ths(symbol=symbol)
+
+    def industry_boards(self) -> pd.DataFrame:
+        return ak.stock_board_industry_name_em()
+
+    def industry_constituents(self, symbol: str) -> pd.DataFrame:
+        return ak.stock_board_industry_cons_em(symbol=symbol)
+
+    def industry_fund_flow(self, symbol: str = '即时') -> pd.DataFrame:
+        return ak.stock_fund_flow_industry(symbol=symbol)
+
+    def big_deal(self) -> pd.DataFrame:
+        return ak.stock_fund_flow_big_deal()
+
+    def cost_data(self) -> pd.DataFrame:
+        return ak.stock_comment_em()
+
+    def trade_calendar(self) -> pd.DataFrame:
+        return ak.tool_trade_date_hist_sina()
+
+
+class TushareProvider(AkshareProvider):
+    """
+    Tushare 数据源：K线、复权因子、交易日历、股票列表走 Tushare Pro（结果换算为 akshare 列格式），
+    资金流、排行、板块、主力成本等 Tushare 没有对应接口的数据仍走 akshare。
+    """
+
+    name = 'tushare'
+
+    def __init__(self, tushare_token: str):
+        super().__init__(tushare_token)
+        self.pro = self._tushare()
+
+    @staticmethod
+    def _ts_code(symbol: str) -> str:
+        symbol = format_stock_code(symbol)
+        return f"{symbol[2:]}.{symbol[:2].upper()}"
+
+    def kline(self, symbol: str, start_date: str, end_date: str, adjust: str = '') -> pd.DataFrame:
+        df = self.pro.daily(ts_code=self._ts_code(symbol), start_date=start_date, end_date=end_date)
+        if df is None or df.empty:
+            return pd.DataFrame()
+        df = df.sort_values('trade_date')
+        out = pd.DataFrame({
+            'date': pd.to_datetime(df['trade_date'], format='%Y%m%d').dt.date,
+            'open': df['open'], 'close': df['close'], 'high': df['high'], 'low': df['low'],
+            # 与腾讯接口一致，amount 为成交量（手）
+            'amount': df['vol'],
+        }).reset_index(drop=True)
+        if adjust == 'qfq':
+            factor = self.qfq_factor(symbol)
+            if not factor.empty:
+                dates = pd.to_datetime(out['date']).astype('datetime64[ns]')
+                seg = pd.merge_asof(pd.DataFrame({'date': dates}),
+                                    factor.assign(date=pd.to_datetime(factor['date']).astype('datetime64[ns]')),
+                                    on='date', direction='backward')
+                qfq = seg['qfq_factor'].fillna(factor['qfq_factor'].iloc[0]).to_numpy()
+                for col in ['open', 'close', 'high', 'low']:
+                    out[col] = out[col] / qfq
+        return out
+
+    def qfq_factor(self, symbol: str) -> pd.DataFrame:
+        """Tushare 复权因子 adj_factor 为后复权口径，前复权因子 qfq_factor = 最新 adj_factor / 当日 adj_factor。"""
+        df = self.pro.adj_factor(ts_code=self._ts_code(symbol))
+        if df is None or df.empty:
+            return pd.DataFrame(columns=['date', 'qfq_factor'])
+        df = df.sort_values('trade_date')
+        # 只保留因子变化的分段起点
+        df = df[df['adj_factor'] != df['adj_factor'].shift()]
+        return pd.DataFrame({
+            'date': pd.to_datetime(df['trade_date'], format='%Y%m%d').dt.date,
+            'qfq_factor': df['adj_factor'].iloc[-1] / df['adj_factor'],
+        }).reset_index(drop=True)
+
+    def trade_calendar(self) -> pd.DataFrame:
+        df = self.pro.trade_cal(exchange='SSE', is_open='1')
+        return pd.DataFrame({'trade_date': pd.to_datetime(df['cal_date'], format='%Y%m%d').dt.date})
+
+
+class FakeMarketProvider(DataProvider):
+    """
+    本地合成行情（压测用）
+    按随机种子确定性地生成 N 只主板股票 × T 个交易日的市场：市场 + 行业 + 个股三因子收益，
+    涨跌幅限制在 ±10%，约 5% 的股票在区间内发生一次除权；各接口按 akshare 列格式从同一份行情派生，
+    可在不触碰接口限速的前提下跑满全市场规模的流水线。
+    """
+
+    name = 'fake'
+    INDUSTRY_COUNT = 30
+    EX_RIGHTS_PROB = 0.05
+    LIMIT_PCT = 0.0995
+
+    def __init__(self, n_symbols: int = 5000, n_days: int = 500, seed: int = 42, end_date=None):
+        """
+        Args:
+            n_symbols: 股票数量
+            n_days: 交易日数量（截至 end_date 的最近 n_days 个工作日）
+            seed: 随机种子，相同参数生成的行情完全一致
+            end_date: 最后一个交易日，默认今天（周末取上周五）
+        """
+        self.n_symbols = int(n_symbols)
+        self.n_days = int(n_days)
+        self.seed = int(seed)
+        self.end_date = pd.Timestamp(end_date or datetime.now()).normalize()
+        self._market: Optional[Dict[str, np.ndarray]] = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 行情生成
+    # ------------------------------------------------------------------
+    def _rng(self, tag: int) -> np.random.Generator:
+        return np.random.default_rng([self.seed, tag])
+
+    @property
+    def market(self) -> Dict[str, np.ndarray]:
+        if self._market is None:
+            with self._lock:
+                if self._market is None:
+                    self._market = self._build_market()
+        return self._market
+
+    def _build_market(self) -> Dict[str, np.ndarray]:
+        n, t, k = self.n_symbols, self.n_days, self.INDUSTRY_COUNT
+        rng = self._rng(0)
+        dates = pd.bdate_range(end=self.end_date, periods=t)
+
+        idx = np.arange(n)
+        codes = np.where(idx % 2 == 0, 600000 + idx // 2, 1 + idx // 2)
+        codes = np.array([f"{c:06d}" for c in codes])
+        symbols = np.array([format_stock_code(c) for c in codes])
+        names = np.array([f"{'ST' if rng.random() < 0.02 else ''}模拟{c}" for c in codes])
+        industry = rng.integers(0, k, n)
+
+        # 三因子日收益，主板 ±10% 涨跌停
+        vol = rng.uniform(0.012, 0.035, n)
+        ret = (rng.normal(0.0003, 0.01, t)[:, None]
+               + rng.normal(0.0, 0.008, (t, k))[:, industry]
+               + rng.normal(0.0, 1.0, (t, n)) * vol)
+        ret[0] = 0.0
+        ret = np.clip(ret, -self.LIMIT_PCT, self.LIMIT_PCT)
+        qfq_close = np.exp(rng.uniform(np.log(3.0), np.log(80.0), n)) * np.cumprod(1.0 + ret, axis=0)
+
+        # 除权：事件日之前 adj_ratio = m（前复权价 = 不复权价 × m），不复权价在事件日跳低
+        adj_ratio = np.ones((t, n))
+        has_event = rng.random(n) < self.EX_RIGHTS_PROB
+        event_day = rng.integers(1, t, n) if t > 1 else np.zeros(n, dtype=int)
+        event_mult = rng.uniform(0.7, 0.98, n)
+        before = np.arange(t)[:, None] < event_day[None, :]
+        adj_ratio = np.where(before & has_event[None, :], event_mult[None, :], adj_ratio)
+
+        close = np.round(qfq_close / adj_ratio, 2)
+        prev_close = np.vstack([close[:1], close[:-1] * adj_ratio[:-1] / adj_ratio[1:]])
+        gap = np.clip(rng.normal(0.0, 0.3, (t, n)) * vol, -self.LIMIT_PCT, self.LIMIT_PCT)
+        open_ = np.round(prev_close * (1.0 + gap), 2)
+        high = np.round(np.maximum(open_, close) * (1.0 + np.abs(rng.normal(0.0, 0.4, (t, n))) * vol), 2)
+        low = np.round(np.minimum(open_, close) * (1.0 - np.abs(rng.normal(0.0, 0.4, (t, n))) * vol), 2)
+        high = np.minimum(high, np.round(prev_close * (1 + self.LIMIT_PCT), 2)).clip(min=np.maximum(open_, close))
+        low = np.maximum(low, np.round(prev_close * (1 - self.LIMIT_PCT), 2)).clip(max=np.minimum(open_, close))
+
+        float_shares = rng.uniform(2e8, 5e9, n)
+        volume = np.round(float_shares * rng.uniform(0.005, 0.03, n) / 100.0
+                          * np.exp(rng.normal(0.0, 0.3, (t, n))) * (1.0 + 5.0 * np.abs(ret)))
+        amount = volume * 100.0 * (open_ + close) / 2.0
+
+        return {
+            'dates': dates.to_numpy(), 'codes': codes, 'symbols': symbols, 'names': names,
+            'industry': industry, 'open': open_, 'close': close, 'high': high, 'low': low,
+            'prev_close': prev_close, 'adj_ratio': adj_ratio, 'volume': volume, 'amount': amount,
+            'float_shares': float_shares, 'has_event': has_event, 'event_day': event_day,
+            'event_mult': event_mult, 'symbol_index': {s: i for i, s in enumerate(symbols)},
+        }
+
+    def _industry_names(self) -> np.ndarray:
+        return np.array([f"模拟行业{i + 1:02d}" for i in range(self.INDUSTRY_COUNT)])
+
+    def _qfq_close(self) -> np.ndarray:
+        m = self.market
+        return m['close'] * m['adj_ratio']
+
+    def _pct_change(self, window: int = 1) -> np.ndarray:
+        """最近 window 个交易日的涨跌幅（%，前复权口径）"""
+        qfq = self._qfq_close()
+        window = min(window, len(qfq) - 1)
+        return (qfq[-1] / qfq[-1 - window] - 1.0) * 100.0 if window > 0 else np.zeros(qfq.shape[1])
+
+    def _turnover(self, window: int = 1) -> np.ndarray:
+        m = self.market
+        return m['volume'][-window:].sum(axis=0) * 100.0 / m['float_shares'] * 100.0
+
+    def _net_inflow(self, window: int) -> np.ndarray:
+        """模拟资金净流入（元）：按涨跌方向与成交额估算，叠加噪声"""
+        m = self.market
+        rng = self._rng(100 + window)
+        qfq = self._qfq_close()
+        ret = np.vstack([np.zeros((1, qfq.shape[1])), qfq[1:] / qfq[:-1] - 1.0])[-window:]
+        flow = (np.tanh(ret * 20.0) * 0.15 + rng.normal(0.0, 0.05, ret.shape)) * m['amount'][-window:]
+        return flow.sum(axis=0)
+
+    @staticmethod
+    def _streak(cond: np.ndarray, max_len: int = 30) -> np.ndarray:
+        """每列末尾连续为 True 的天数"""
+        streak = np.zeros(cond.shape[1], dtype=int)
+        alive = np.ones(cond.shape[1], dtype=bool)
+        for row in cond[::-1][:max_len]:
+            alive &= row
+            if not alive.any():
+                break
+            streak += alive
+        return streak
+
+    @staticmethod
+    def _money_str(values: np.ndarray) -> list:
+        return [f"{v / 1e8:.2f}亿" if abs(v) >= 1e8 else f"{v / 1e4:.2f}万" for v in values]
+
+    @staticmethod
+    def _period_days(symbol: str) -> int:
+        match = re.match(r'(\d+)', str(symbol))
+        return int(match.group(1)) if match else 1
+
+    @staticmethod
+    def _with_rank(df: pd.DataFrame, col: str = '序号') -> pd.DataFrame:
+        df = df.reset_index(drop=True)
+        df.insert(0, col, np.arange(1, len(df) + 1))
+        return df
+
+    def _quote_frame(self, cols: np.ndarray) -> pd.DataFrame:
+        """东方财富行情表格式的个股快照（实时行情、板块成分股共用）"""
+        m = self.market
+        close, prev = m['close'][-1, cols], m['prev_close'][-1, cols]
+        pe = self._rng(200).uniform(5.0, 80.0, self.n_symbols)[cols]
+        return pd.DataFrame({
+            '代码': m['codes'][cols],
+            '名称': m['names'][cols],
+            '最新价': close,
+            '涨跌幅': np.round((close / prev - 1.0) * 100.0, 2),
+            '涨跌额': np.round(close - prev, 2),
+            '成交量': m['volume'][-1, cols],
+            '成交额': np.round(m['amount'][-1, cols], 2),
+            '振幅': np.round((m['high'][-1, cols] - m['low'][-1, cols]) / prev * 100.0, 2),
+            '最高': m['high'][-1, cols],
+            '最低': m['low'][-1, cols],
+            '今开': m['open'][-1, cols],
+            '昨收': np.round(prev, 2),
+            '量比': np.round(m['volume'][-1, cols] / np.maximum(m['volume'][-6:-1, cols].mean(axis=0), 1.0), 2)
+            if len(m['dates']) > 1 else 1.0,
+            '换手率': np.round(self._turnover()[cols], 2),
+            '市盈率-动态': np.round(pe, 2),
+            '市净率': np.round(pe / 10.0, 2),
+            '总市值': np.round(close * m['float_shares'][cols] * 1.2, 0),
+            '流通市值': np.round(close * m['float_shares'][cols], 0),
+        })
+
+    # ------------------------------------------------------------------
+    # DataProvider 接口
+    # ------------------------------------------------------------------
+    def stock_basic(self, list_status: str = 'L', market: str = '主板') -> pd.DataFrame:
+        m = self.market
+        if list_status != 'L' or market not in ('', '主板'):
+            return pd.DataFrame(columns=['ts_code', 'symbol', 'name', 'industry', 'market'])
+        return pd.DataFrame({
+            'ts_code': [f"{s[2:]}.{s[:2].upper()}" for s in m['symbols']],
+            'symbol': m['codes'],
+            'name': m['names'],
+            'industry': self._industry_names()[m['industry']],
+            'market': '主板',
+        })
+
+    def kline(self, symbol: str, start_date: str, end_date: str, adjust: str = '') -> pd.DataFrame:
+        m = self.market
+        col = m['symbol_index'].get(format_stock_code(symbol))
+        if col is None:
+            return pd.DataFrame()
+        dates = pd.DatetimeIndex(m['dates'])
+        rows = (dates >= pd.to_datetime(start_date)) & (dates <= pd.to_datetime(end_date))
+        scale = m['adj_ratio'][rows, col] if adjust == 'qfq' else 1.0
+        return pd.DataFrame({
+            'date': dates[rows].date,
+            'open': m['open'][rows, col] * scale,
+            'close': m['close'][rows, col] * scale,
+            'high': m['high'][rows, col] * scale,
+            'low': m['low'][rows, col] * scale,
+            'amount': m['volume'][rows, col],
+        })
+
+    def qfq_factor(self, symbol: str) -> pd.DataFrame:
+        m = self.market
+        col = m['symbol_index'].get(format_stock_code(symbol))
+        if col is None:
+            return pd.DataFrame(columns=['date', 'qfq_factor'])
+        dates = pd.DatetimeIndex(m['dates'])
+        if not m['has_event'][col]:
+            return pd.DataFrame({'date': [dates[0].date()], 'qfq_factor': [1.0]})
+        return pd.DataFrame({
+            'date': [dates[0].date(), dates[m['event_day'][col]].date()],
+            'qfq_factor': [1.0 / m['event_mult'][col], 1.0],
+        })
+
+    def spot(self) -> pd.DataFrame:
+        return self._with_rank(self._quote_frame(np.arange(self.n_symbols)))
+
+    def profit_forecast(self) -> pd.DataFrame:
+        m = self.market
+        rng = self._rng(300)
+        cols = np.flatnonzero(rng.random(self.n_symbols) < 0.6)
+        buy = rng.poisson(3.0, len(cols))
+        df = pd.DataFrame({
+            '代码': m['codes'][cols],
+            '名称': m['names'][cols],
+            '研报数': buy + rng.poisson(2.0, len(cols)),
+            '机构投资评级(近六个月)-买入': buy.astype(float),
+            '机构投资评级(近六个月)-增持': rng.poisson(2.0, len(cols)).astype(float),
+            '机构投资评级(近六个月)-中性': rng.poisson(0.5, len(cols)).astype(float),
+            '机构投资评级(近六个月)-减持': 0.0,
+            '机构投资评级(近六个月)-卖出': 0.0,
+        })
+        eps = rng.uniform(0.05, 3.0, len(cols))
+        for offset in range(-1, 3):
+            df[f"{self.end_date.year + offset}预测每股收益"] = np.round(eps * (1.1 ** (offset + 1)), 4)
+        return self._with_rank(df)
+
+    def fund_flow_individual(self, symbol: str = '即时') -> pd.DataFrame:
+        m = self.market
+        if symbol == '即时':
+            net = self._net_inflow(1)
+            amount = m['amount'][-1]
+            df = pd.DataFrame({
+                '股票代码': m['codes'], '股票简称': m['names'], '最新价': m['close'][-1],
+                '涨跌幅': [f"{v:.2f}%" for v in self._pct_change(1)],
+                '换手率': [f"{v:.2f}%" for v in self._turnover(1)],
+                '流入资金': self._money_str((amount + net) / 2.0),
+                '流出资金': self._money_str((amount - net) / 2.0),
+                '净额': self._money_str(net),
+                '成交额': self._money_str(amount),
+                '_net': net,
+            })
+        else:
+            days = self._period_days(symbol)
+            net = self._net_inflow(days)
+            df = pd.DataFrame({
+                '股票代码': m['codes'], '股票简称': m['names'], '最新价': m['close'][-1],
+                '阶段涨跌幅': [f"{v:.2f}%" for v in self._pct_change(days)],
+                '连续换手率': [f"{v:.2f}%" for v in self._turnover(days)],
+                '资金流入净额': self._money_str(net),
+                '_net': net,
+            })
+        df = df.sort_values('_net', ascending=False).drop(columns=['_net'])
+        return self._with_rank(df)
+
+    def zt_pool_strong(self, date: str) -> pd.DataFrame:
+        m = self.market
+        pct = self._pct_change(1)
+        qfq = self._qfq_close()
+        new_high = qfq[-1] >= qfq[-60:].max(axis=0)
+        cols = np.flatnonzero((pct >= 7.0) | (new_high & (pct > 3.0)))
+        close, prev = m['close'][-1, cols], m['prev_close'][-1, cols]
+        df = pd.DataFrame({
+            '代码': m['codes'][cols], '名称': m['names'][cols],
+            '涨跌幅': np.round(pct[cols], 2), '最新价': close,
+            '涨停价': np.round(prev * 1.1, 2),
+            '成交额': np.round(m['amount'][-1, cols], 0),
+            '流通市值': np.round(close * m['float_shares'][cols], 0),
+            '总市值': np.round(close * m['float_shares'][cols] * 1.2, 0),
+            '换手率': np.round(self._turnover(1)[cols], 2),
+            '涨速': 0.0,
+            '是否新高': np.where(new_high[cols], '是', '否'),
+            '量比': 1.0,
+            '涨停统计': '',
+            '入选理由': np.where(pct[cols] >= 9.9, 1, np.where(new_high[cols], 2, 3)),
+            '所属行业': self._industry_names()[m['industry'][cols]],
+        })
+        return self._with_rank(df.sort_values('涨跌幅', ascending=False))
+
+    def _daily_up(self, values: np.ndarray) -> np.ndarray:
+        return values[1:] > values[:-1]
+
+    def rank_lxsz(self) -> pd.DataFrame:
+        m = self.market
+        qfq = self._qfq_close()
+        streak = self._streak(self._daily_up(qfq))
+        cols = np.flatnonzero(streak >= 2)
+        df = pd.DataFrame({
+            '股票代码': m['codes'][cols], '股票简称': m['names'][cols],
+            '收盘价': m['close'][-1, cols], '最高价': m['high'][-1, cols], '最低价': m['low'][-1, cols],
+            '连涨天数': streak[cols],
+            '连续涨跌幅': [f"{(qfq[-1, c] / qfq[-1 - s, c] - 1) * 100:.2f}%" for c, s in zip(cols, streak[cols])],
+            '累计换手率': [f"{self._turnover(int(s))[c]:.2f}%" for c, s in zip(cols, streak[cols])],
+            '所属行业': self._industry_names()[m['industry'][cols]],
+        })
+        return self._with_rank(df.sort_values('连涨天数', ascending=False))
+
+    def rank_ljqs(self) -> pd.DataFrame:
+        m = self.market
+        qfq = self._qfq_close()
+        streak = self._streak(self._daily_up(qfq) & self._daily_up(m['volume']))
+        cols = np.flatnonzero(streak >= 2)
+        df = pd.DataFrame({
+            '股票代码': m['codes'][cols], '股票简称': m['names'][cols],
+            '最新价': m['close'][-1, cols],
+            '量价齐升天数': streak[cols],
+            '阶段涨幅': [round((qfq[-1, c] / qfq[-1 - s, c] - 1) * 100, 2) for c, s in zip(cols, streak[cols])],
+            '累计换手率': [round(self._turnover(int(s))[c], 2) for c, s in zip(cols, streak[cols])],
+            '所属行业': self._industry_names()[m['industry'][cols]],
+        })
+        return self._with_rank(df.sort_values('量价齐升天数', ascending=False))
+
+    def rank_cxfl(self) -> pd.DataFrame:
+        m = self.market
+        qfq = self._qfq_close()
+        streak = self._streak(self._daily_up(m['volume']))
+        cols = np.flatnonzero(streak >= 2)
+        df = pd.DataFrame({
+            '股票代码': m['codes'][cols], '股票简称': m['names'][cols],
+            '涨跌幅': np.round(self._pct_change(1)[cols], 2),
+            '最新价': m['close'][-1, cols],
+            '成交量': m['volume'][-1, cols],
+            '基准日成交量': [m['volume'][-1 - s, c] for c, s in zip(cols, streak[cols])],
+            '放量天数': streak[cols],
+            '阶段涨跌幅': [round((qfq[-1, c] / qfq[-1 - s, c] - 1) * 100, 2) for c, s in zip(cols, streak[cols])],
+            '所属行业': self._industry_names()[m['industry'][cols]],
+        })
+        return self._with_rank(df.sort_values('放量天数', ascending=False))
+
+    def rank_xstp(self, symbol: str = '10日均线') -> pd.DataFrame:
+        m = self.market
+        window = self._period_days(symbol)
+        qfq = self._qfq_close()
+        if len(qfq) < window + 1:
+            return pd.DataFrame()
+        ma_now = qfq[-window:].mean(axis=0)
+        ma_prev = qfq[-window - 1:-1].mean(axis=0)
+        cols = np.flatnonzero((qfq[-1] > ma_now) & (qfq[-2] <= ma_prev))
+        df = pd.DataFrame({
+            '股票代码': m['codes'][cols], '股票简称': m['names'][cols],
+            '最新价': m['close'][-1, cols],
+            '成交额': self._money_str(m['amount'][-1, cols]),
+            '成交量': m['volume'][-1, cols],
+            '涨跌幅': np.round(self._pct_change(1)[cols], 2),
+            '换手率': np.round(self._turnover(1)[cols], 2),
+        })
+        return self._with_rank(df)
+
+    def _industry_table(self, window: int) -> pd.DataFrame:
+        """按行业聚合：区间涨跌幅（成分股均值）、资金净额、领涨股等"""
+        m = self.market
+        pct = self._pct_change(window)
+        day_pct = self._pct_change(1)
+        net = self._net_inflow(window)
+        amount = m['amount'][-window:].sum(axis=0)
+        df = pd.DataFrame({
+            'industry': m['industry'], 'pct': pct, 'day_pct': day_pct, 'net': net, 'amount': amount,
+            'mcap': m['close'][-1] * m['float_shares'] * 1.2, 'turnover': self._turnover(1),
+            'name': m['names'], 'close': m['close'][-1], 'up': day_pct > 0,
+        })
+        leader = df.loc[df.groupby('industry')['day_pct'].idxmax(), ['industry', 'name', 'day_pct', 'close']]
+        agg = df.groupby('industry').agg(
+            pct=('pct', 'mean'), day_pct=('day_pct', 'mean'), net=('net', 'sum'), amount=('amount', 'sum'),
+            mcap=('mcap', 'sum'), turnover=('turnover', 'mean'), count=('name', 'size'), up=('up', 'sum'))
+        agg = agg.join(leader.set_index('industry').add_prefix('leader_'))
+        qfq = self._qfq_close()
+        daily = np.vstack([np.zeros((1, qfq.shape[1])), qfq[1:] / qfq[:-1] - 1.0])
+        index_level = pd.DataFrame(daily).T.groupby(m['industry']).mean().T.add(1.0).cumprod().iloc[-1] * 1000.0
+        agg['index'] = index_level.reindex(agg.index).to_numpy()
+        agg['board'] = self._industry_names()[agg.index.to_numpy()]
+        return agg.reset_index(drop=True)
+
+    def industry_boards(self) -> pd.DataFrame:
+        agg = self._industry_table(1).sort_values('day_pct', ascending=False)
+        df = pd.DataFrame({
+            '排名': np.arange(1, len(agg) + 1),
+            '板块名称': agg['board'].to_numpy(),
+            '板块代码': [f"BK{1000 + int(name[-2:])}" for name in agg['board']],
+            '最新价': np.round(agg['index'].to_numpy(), 2),
+            '涨跌额': np.round((agg['index'] * agg['day_pct'] / (100 + agg['day_pct'])).to_numpy(), 2),
+            '涨跌幅': np.round(agg['day_pct'].to_numpy(), 2),
+            '总市值': np.round(agg['mcap'].to_numpy(), 0),
+            '换手率': np.round(agg['turnover'].to_numpy(), 2),
+            '上涨家数': agg['up'].to_numpy().astype(int),
+            '下跌家数': (agg['count'] - agg['up']).to_numpy().astype(int),
+            '领涨股票': agg['leader_name'].to_numpy(),
+            '领涨股票-涨跌幅': np.round(agg['leader_day_pct'].to_numpy(), 2),
+        })
+        return df
+
+    def industry_constituents(self, symbol: str) -> pd.DataFrame:
+        names = list(self._industry_names())
+        if symbol not in names:
+            return pd.DataFrame()
+        cols = np.flatnonzero(self.market['industry'] == names.index(symbol))
+        return self._with_rank(self._quote_frame(cols))
+
+    def industry_fund_flow(self, symbol: str = '即时') -> pd.DataFrame:
+        window = 1 if symbol == '即时' else self._period_days(symbol)
+        agg = self._industry_table(window)
+        inflow = (agg['amount'] + agg['net']) / 2.0 / 1e8
+        outflow = (agg['amount'] - agg['net']) / 2.0 / 1e8
+        if symbol == '即时':
+            df = pd.DataFrame({
+                '行业': agg['board'], '行业指数': np.round(agg['index'], 2),
+                '行业-涨跌幅': np.round(agg['day_pct'], 2),
+                '流入资金': np.round(inflow, 2), '流出资金': np.round(outflow, 2),
+                '净额': np.round(agg['net'] / 1e8, 2), '公司家数': agg['count'],
+                '领涨股': agg['leader_name'], '领涨股-涨跌幅': np.round(agg['leader_day_pct'], 2),
+                '当前价': agg['leader_close'],
+            })
+            df = df.sort_values('行业-涨跌幅', ascending=False)
+        else:
+            df = pd.DataFrame({
+                '行业': agg['board'], '公司家数': agg['count'], '行业指数': np.round(agg['index'], 2),
+                '阶段涨跌幅': [f"{v:.2f}%" for v in agg['pct']],
+                '流入资金': np.round(inflow, 2), '流出资金': np.round(outflow, 2),
+                '净额': np.round(agg['net'] / 1e8, 2),
+            })
+            df = df.sort_values('净额', ascending=False)
+        return self._with_rank(df)
+
+    def big_deal(self) -> pd.DataFrame:
+        m = self.market
+        rng = self._rng(400)
+        top = np.argsort(-m['amount'][-1])[:min(200, self.n_symbols)]
+        cols = rng.choice(top, size=min(500, 5 * len(top)), replace=True) if len(top) else top
+        price = m['close'][-1, cols]
+        lots = rng.integers(500, 20000, len(cols))
+        session = pd.Timestamp(m['dates'][-1])
+        seconds = np.sort(rng.integers(0, 4 * 3600, len(cols)))[::-1]
+        times = [(session + pd.Timedelta(hours=9, minutes=30) + pd.Timedelta(seconds=int(s))
+                  + (pd.Timedelta(minutes=90) if s >= 7200 else pd.Timedelta(0))).strftime('%Y-%m-%d %H:%M:%S')
+                 for s in seconds]
+        return pd.DataFrame({
+            '成交时间': times,
+            '股票代码': m['codes'][cols], '股票简称': m['names'][cols],
+            '成交价格': price, '成交量': lots * 100,
+            '成交额': np.round(price * lots * 100 / 1e4, 2),
+            '大单性质': np.where(rng.random(len(cols)) < 0.55, '买盘', '卖盘'),
+            '涨跌幅': [f"{v:.2f}%" for v in self._pct_change(1)[cols]],
+            '涨跌额': np.round(price - m['prev_close'][-1, cols], 2),
+        })
+
+    def cost_data(self) -> pd.DataFrame:
+        m = self.market
+        rng = self._rng(500)
+        qfq = self._qfq_close()
+        cost = qfq[-20:].mean(axis=0) / m['adj_ratio'][-1]
+        participation = rng.uniform(0.0, 100.0, self.n_symbols)
+        score = np.clip(50.0 + self._pct_change(5) * 2.0 + rng.normal(0.0, 10.0, self.n_symbols), 0.0, 100.0)
+        rank = (-score).argsort().argsort() + 1
+        df = pd.DataFrame({
+            '代码': m['codes'], '名称': m['names'],
+            '最新价': m['close'][-1],
+            '涨跌幅': np.round(self._pct_change(1), 2),
+            '换手率': np.round(self._turnover(1), 2),
+            '市盈率': np.round(self._rng(200).uniform(5.0, 80.0, self.n_symbols), 2),
+            '主力成本': np.round(cost, 2),
+            '机构参与度': np.round(participation, 2),
+            '综合得分': np.round(score, 2),
+            '上升': rng.integers(-500, 500, self.n_symbols),
+            '目前排名': rank,
+            '关注指数': np.round(rng.uniform(60.0, 95.0, self.n_symbols), 1),
+            '交易日': pd.Timestamp(m['dates'][-1]).date(),
+        })
+        return self._with_rank(df)
+
+    def trade_calendar(self) -> pd.DataFrame:
+        dates = pd.bdate_range(start=pd.Timestamp(self.market['dates'][0]),
+                               end=pd.Timestamp(year=self.end_date.year + 1, month=12, day=31))
+        return pd.DataFrame({'trade_date': dates.date})
+
+
+def create_provider(config) -> DataProvider:
+    """按配置 DATA_PROVIDER 创建数据源：akshare（默认）/ tushare / fake（本地合成行情）。"""
+    name = config.DATA_PROVIDER
+    if name == 'fake':
+        print(f"[INFO] 数据源: 本地合成行情（{config.FAKE_MARKET_SYMBOLS} 只 × {config.FAKE_MARKET_DAYS} 日，"
+              f"种子 {config.FAKE_MARKET_SEED}）")
+        return FakeMarketProvider(config.FAKE_MARKET_SYMBOLS, config.FAKE_MARKET_DAYS, config.FAKE_MARKET_SEED)
+    if name == 'tushare':
+        return TushareProvider(config.TUSHARE_TOKEN)
+    if name != 'akshare':
+        print(f"[WARN] 未知的数据源 '{name}'，使用 akshare。")
+    return AkshareProvider(config.TUSHARE_TOKEN)
@@ -0,0 +1,457 @@
+import atexit
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+class CachePolicy:
+    """
+    单个数据源的缓存策略
+    - ttl：条目写入后保持新鲜的秒数，None 表示在同一缓存键（通常为业务日期）内一直有效；
+    - stale_ttl：过期后仍可先返回旧值、同时在后台刷新的宽限秒数（stale-while-revalidate），0 表示过期即同步重取；
+    - codec：落盘格式，parquet（DataFrame 列式快照，保留列类型）、csv（DataFrame，| 分隔）或 json；
+      为空时 DataFrame 使用缓存的默认格式。
+    无论策略如何，重取失败时都会退回仍在磁盘上的旧值（stale-if-error）。
+    """
+
+    def __init__(self, ttl: Optional[float] = None, stale_ttl: float = 0.0, codec: str = None):
+        self.ttl = ttl
+        self.stale_ttl = float(stale_ttl)
+        self.codec = codec
+
+
+class FetchCache:
+    """
+    统一的接口数据缓存
+    - 按 (数据源, 键) 存放，键一般为业务日期；各数据源可单独配置 TTL 与后台刷新宽限；
+    - 数据文件与索引均先写临时文件再原子替换，中断不会留下半截文件；
+    - 目录总大小与条目闲置天数设上限，超出时按最近访问时间（LRU）淘汰；
+    - 同一条目的并发请求只发出一次（其余等待结果），统计命中、过期返回、未命中与淘汰次数；
+    - DataFrame 默认存为 Parquet 列式快照：列类型原样保留（代码列为补零文本），命中时多线程读取，
+      不再经过文本解析与类型推断；写入时与该数据源上一份快照的列结构比对，接口字段变化当场告警。
+    未配置目录时直接透传，不缓存。
+    """
+
+    INDEX_FILE = 'cache_index.json'
+    CODE_COLUMNS = {'股票代码': str, 'symbol': str, '代码': str}
+    EXTENSIONS = {'parquet': 'parquet', 'csv': 'txt', 'json': 'json'}
+
+    def __init__(self, root_dir: str = None, max_bytes: int = 1 << 30, max_age_days: float = 30,
+                 policies: Dict[str, CachePolicy] = None, default_codec: str = 'parquet',
+                 compression: str = 'zstd'):
+        self.root_dir = None
+        self.policies: Dict[str, CachePolicy] = {}
+        self.default_policy = CachePolicy()
+        self.default_codec = default_codec
+        self.compression = compression
+        self._index: Dict[str, Dict] = {}
+        # 命中只在内存中更新访问时间，索引在 put / evict / invalidate 或 flush 时才落盘
+        self._index_dirty = False
+        self._lock = threading.RLock()
+        self._inflight: Dict[str, threading.Lock] = {}
+        self.stats = {'hits': 0, 'stale': 0, 'stale_on_error': 0, 'misses': 0, 'fetch_errors': 0, 'evictions': 0,
+                      'schema_drift': 0}
+        if root_dir:
+            self.configure(root_dir, max_bytes, max_age_days, policies, default_codec, compression)
+
+    # ------------------------------------------------------------------
+    # 配置
+    # ------------------------------------------------------------------
+    def configure(self, root_dir: str, max_bytes: int = 1 << 30, max_age_days: float = 30,
+                  policies: Dict[str, CachePolicy] = None, default_codec: str = 'parquet',
+                  compression: str = 'zstd'):
+        if default_codec not in ('parquet', 'csv'):
+            print(f"[WARN] 未知的缓存格式 '{default_codec}'，按 parquet 处理。")
+            default_codec = 'parquet'
+        with self._lock:
+            self.root_dir = root_dir
+            self.max_bytes = int(max_bytes)
+            self.max_age = float(max_age_days) * 86400
+            self.default_codec = default_codec
+            self.compression = None if compression in (None, '', 'none') else compression
+            self.policies.update(policies or {})
+            os.makedirs(root_dir, exist_ok=True)
+            self._index = self._load_index()
+            self._index_dirty = False
+            self.evict()
+        atexit.unregister(self.flush)
+        atexit.register(self.flush)
+
+    def configure_from_config(self, config):
+        """按 config.ini [SYSTEM] 的 FETCH_CACHE_* 与 [CACHE_TTL] 配置；已配置到同一目录时只补充策略"""
+        policies = {source: CachePolicy(ttl=ttl, stale_ttl=config.FETCH_CACHE_STALE_TTL)
+                    for source, ttl in config.CACHE_TTL.items()}
+        if self.root_dir == config.FETCH_CACHE_DIR:
+            self.policies.update(policies)
+            return
+        self.configure(config.FETCH_CACHE_DIR, config.FETCH_CACHE_MAX_MB * 1024 * 1024,
+                       config.FETCH_CACHE_MAX_AGE_DAYS, policies, config.FETCH_CACHE_FORMAT,
+                       config.FETCH_CACHE_COMPRESSION)
+
+    @property
+    def enabled(self) -> bool:
+        return self.root_dir is not None
+
+    def set_policy(self, source: str, policy: CachePolicy):
+        """代码内的默认策略；config.ini [CACHE_TTL] 中配置过的数据源以配置为准"""
+        with self._lock:
+            if source not in self.policies:
+                self.policies[source] = policy
+
+    def policy(self, source: str, codec: str = None) -> CachePolicy:
+        policy = self.policies.get(source, self.default_policy)
+        codec = codec or policy.codec or self.default_codec
+        if codec != policy.codec:
+            policy = CachePolicy(policy.ttl, policy.stale_ttl, codec)
+        return policy
+
+    # ------------------------------------------------------------------
+    # 读写
+    # ------------------------------------------------------------------
+    def fetch(self, source: str, key: str, fetch_func: Callable[[], Any], codec: str = None,
+              is_valid: Callable[[Any], bool] = None) -> Any:
+        """
+        取 (source, key) 的缓存值：新鲜则直接返回；过期但在宽限期内先返回旧值并在后台刷新；
+        否则调用 fetch_func 重取并写入（is_valid 判定为无效的结果不缓存），重取失败或无效时退回旧值；
+        没有旧值时返回 fetch_func 的结果（抛出异常时为 None）。
+        """
+        if not self.enabled:
+            return fetch_func()
+        is_valid = is_valid or self._default_valid
+        policy = self.policy(source, codec)
+        entry_id = self._entry_id(source, key)
+
+        state, value = self._lookup(entry_id, policy)
+        if state == 'fresh':
+            self._count('hits')
+            return value
+        if state == 'stale' and policy.stale_ttl > 0 and self._age(entry_id) < (policy.ttl or 0) + policy.stale_ttl:
+            self._count('stale')
+            threading.Thread(target=self._refresh, args=(source, key, fetch_func, policy, is_valid),
+                             daemon=True, name=f"cache-refresh-{source}").start()
+            return value
+
+        with self._flight_lock(entry_id):
+            # 等待期间可能已由其他线程取回
+            state_now, value_now = self._lookup(entry_id, policy)
+            if state_now == 'fresh':
+                self._count('hits')
+                return value_now
+            self._count('misses')
+            fresh = self._call(source, fetch_func)
+            if fresh is not None and is_valid(fresh):
+                # 返回按写入格式规整后的值，首次获取与之后命中缓存拿到的列类型一致
+                return self.put(source, key, fresh, policy.codec)
+        if value is not None:
+            self._count('stale_on_error')
+            print(f"[WARN] {source} 重新获取失败，使用已过期的本地缓存。")
+            return value
+        return fresh
+
+    def get(self, source: str, key: str, codec: str = None, allow_stale: bool = False) -> Any:
+        """只读缓存，不触发获取；无条目（或过期且不接受过期值）时返回 None"""
+        if not self.enabled:
+            return None
+        state, value = self._lookup(self._entry_id(source, key), self.policy(source, codec))
+        return value if state == 'fresh' or (state == 'stale' and allow_stale) else None
+
+    def put(self, source: str, key: str, value: Any, codec: str = None) -> Any:
+        """写入缓存，返回实际写入的值（DataFrame 为代码列补零、混合类型列转文本后的结果，与之后读出的一致）"""
+        if not self.enabled:
+            return value
+        policy = self.policy(source, codec)
+        entry_id = self._entry_id(source, key)
+        file_name = f"{self._slug(source)}_{self._slug(str(key))}.{self.EXTENSIONS.get(policy.codec, policy.codec)}"
+        path = os.path.join(self.root_dir, file_name)
+        schema = None
+        if isinstance(value, pd.DataFrame):
+            value = self._normalize_codes(source, value)
+            if policy.codec == 'parquet':
+                value = self._coerce_mixed_columns(value)
+            value = value.reset_index(drop=True)
+            schema = self._schema_of(value)
+            self._check_drift(source, key, schema)
+        try:
+            self._atomic_write(path, lambda tmp: self._encode(value, tmp, policy.codec))
+        except Exception as e:
+            print(f"[ERROR] 写入缓存 {file_name} 失败: {e}")
+            return value
+        now = time.time()
+        with self._lock:
+            previous = self._index.get(entry_id)
+            if previous and previous['file'] != file_name:
+                self._remove(entry_id)  # 换了格式，删除旧格式的文件
+            self._index[entry_id] = {'source': source, 'key': str(key), 'file': file_name, 'codec': policy.codec,
+                                     'created': now, 'accessed': now, 'size': os.path.getsize(path),
+                                     'schema': schema}
+            self._evict_locked()
+            self._save_index()
+        return value
+
+    def invalidate(self, source: str, key: str = None):
+        """删除某数据源的指定键（为空时删除该数据源全部条目）"""
+        with self._lock:
+            for entry_id, meta in list(self._index.items()):
+                if meta['source'] == source and (key is None or meta['key'] == str(key)):
+                    self._remove(entry_id)
+            self._save_index()
+
+    # ------------------------------------------------------------------
+    # 淘汰与统计
+    # ------------------------------------------------------------------
+    def evict(self):
+        """先删除闲置超过 max_age 的条目，再按最近访问时间从旧到新删除，直到总大小不超过 max_bytes"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._evict_locked():
+                self._save_index()
+
+    def flush(self):
+        """把命中时在内存中更新的访问时间写回索引（运行结束时调用，进程退出时也会自动执行）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._index_dirty:
+                self._save_index()
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(meta['size'] for meta in self._index.values())
+
+    def summary(self) -> str:
+        """本次运行的缓存统计；同时落盘访问时间，作为运行结束时的收尾"""
+        self.flush()
+        s = self.stats
+        requests = s['hits'] + s['stale'] + s['misses']
+        rate = (s['hits'] + s['stale']) / requests if requests else 0.0
+        return (f"缓存命中 {s['hits']}，过期先用 {s['stale']}，未命中 {s['misses']}（命中率 {rate:.0%}），"
+                f"重取失败退回旧值 {s['stale_on_error']}，淘汰 {s['evictions']}，字段变化 {s['schema_drift']}；"
+                f"{len(self._index)} 个条目共 {self.total_bytes / 1024 / 1024:.1f} MB")
+
+    # ------------------------------------------------------------------
+    # 内部实现
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _default_valid(value: Any) -> bool:
+        if isinstance(value, pd.DataFrame):
+            return not value.empty
+        return value is not None
+
+    @staticmethod
+    def _slug(text: str) -> str:
+        return re.sub(r'[\\/:*?"<>|\s]+', '_', text)
+
+    @staticmethod
+    def _entry_id(source: str, key: str) -> str:
+        return f"{source}\x1f{key}"
+
+    @staticmethod
+    def _schema_of(df: pd.DataFrame) -> Dict[str, str]:
+        return {str(col): str(dtype) for col, dtype in df.dtypes.items()}
+
+    def _normalize_codes(self, source: str, df: pd.DataFrame) -> pd.DataFrame:
+        """代码列若被接口返回成数值（丢了前导零），写入前补回 6 位文本，读出时无需再做类型修正"""
+        numeric = [col for col in self.CODE_COLUMNS if col in df.columns and pd.api.types.is_numeric_dtype(df[col])]
+        if not numeric:
+            return df
+        print(f"[WARN] {source} 的代码列 {numeric} 为数值类型，已补零转为文本后缓存。")
+        df = df.copy()
+        for col in numeric:
+            df[col] = df[col].astype('Int64').astype(str).str.zfill(6).where(df[col].notna())
+        return df
+
+    def _check_drift(self, source: str, key: str, schema: Dict[str, str]):
+        """与同一数据源最近一份快照的列结构比对：增删列或列类型变化时告警（接口字段调整在写入时即可发现）"""
+        with self._lock:
+            previous = [meta for meta in self._index.values()
+                        if meta['source'] == source and meta.get('schema') and meta['key'] != str(key)]
+        if not previous:
+            return
+        last = max(previous, key=lambda meta: meta['created'])
+        old = last['schema']
+        added = [col for col in schema if col not in old]
+        removed = [col for col in old if col not in schema]
+        changed = [f"{col}: {old[col]} -> {schema[col]}" for col in schema if col in old and old[col] != schema[col]]
+        if not (added or removed or changed):
+            return
+        self._count('schema_drift')
+        details = '；'.join(part for part in (f"新增列 {added}" if added else '', f"缺少列 {removed}" if removed else '',
+                                            f"类型变化 {changed}" if changed else '') if part)
+        print(f"[WARN] {source} 的字段与 {last['key']} 的缓存不一致：{details}")
+
+    def _count(self, stat: str, n: int = 1):
+        with self._lock:
+            self.stats[stat] += n
+
+    def _evict_locked(self) -> int:
+        """evict 的实现（调用方持有锁，不落盘索引），返回删除的条目数"""
+        now = time.time()
+        removed = 0
+        for entry_id, meta in list(self._index.items()):
+            if now - meta['accessed'] > self.max_age:
+                self._remove(entry_id)
+                removed += 1
+        total = sum(meta['size'] for meta in self._index.values())
+        for entry_id, meta in sorted(self._index.items(), key=lambda item: item[1]['accessed']):
+            if total <= self.max_bytes:
+                break
+            total -= meta['size']
+            self._remove(entry_id)
+            removed += 1
+        # 只统计按闲置时间、总大小淘汰的条目；invalidate、换格式与损坏文件的删除不计入
+        self.stats['evictions'] += removed
+        return removed
+
+    def _age(self, entry_id: str) -> float:
+        meta = self._index.get(entry_id)
+        return time.time() - meta['created'] if meta else float('inf')
+
+    def _flight_lock(self, entry_id: str) -> threading.Lock:
+        with self._lock:
+            return self._inflight.setdefault(entry_id, threading.Lock())
+
+    def _lookup(self, entry_id: str, policy: CachePolicy):
+        """返回 (状态, 值)，状态为 fresh / stale / missing"""
+        with self._lock:
+            meta = self._index.get(entry_id)
+        if meta is None:
+            return 'missing', None
+        path = os.path.join(self.root_dir, meta['file'])
+        try:
+            value = self._decode(path, meta['codec'])
+        except Exception as e:
+            print(f"[WARN] 读取缓存 {meta['file']} 失败: {e}，将重新获取。")
+            with self._lock:
+                self._remove(entry_id)
+                self._save_index()
+            return 'missing', None
+        with self._lock:
+            meta['accessed'] = time.time()
+            self._index_dirty = True
+        fresh = policy.ttl is None or time.time() - meta['created'] < policy.ttl
+        return ('fresh' if fresh else 'stale'), value
+
+    def _refresh(self, source: str, key: str, fetch_func: Callable[[], Any], policy: CachePolicy,
+                 is_valid: Callable[[Any], bool]):
+        entry_id = self._entry_id(source, key)
+        lock = self._flight_lock(entry_id)
+        if not lock.acquire(blocking=False):
+            return  # 已有线程在刷新
+        try:
+            value = self._call(source, fetch_func)
+            if value is not None and is_valid(value):
+                self.put(source, key, value, policy.codec)
+        finally:
+            lock.release()
+
+    def _call(self, source: str, fetch_func: Callable[[], Any]) -> Any:
+        try:
+            return fetch_func()
+        except Exception as e:
+            self._count('fetch_errors')
+            print(f"[ERROR] 获取 {source} 失败: {e}")
+            return None
+
+    def _remove(self, entry_id: str):
+        meta = self._index.pop(entry_id, None)
+        if meta is None:
+            return
+        try:
+            os.remove(os.path.join(self.root_dir, meta['file']))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[WARN] 删除缓存文件 {meta['file']} 失败: {e}")
+
+    def _load_index(self) -> Dict[str, Dict]:
+        path = os.path.join(self.root_dir, self.INDEX_FILE)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            # 丢弃文件已不存在的条目
+            return {entry_id: meta for entry_id, meta in entries.items()
+                    if os.path.exists(os.path.join(self.root_dir, meta['file']))}
+        except Exception as e:
+            print(f"[WARN] 读取缓存索引失败: {e}，按空缓存处理。")
+            return {}
+
+    def _save_index(self):
+        path = os.path.join(self.root_dir, self.INDEX_FILE)
+        payload = json.dumps(self._index, ensure_ascii=False)
+
+        def write(tmp_path):
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+
+        try:
+            self._atomic_write(path, write)
+            self._index_dirty = False
+        except Exception as e:
+            print(f"[WARN] 保存缓存索引失败: {e}")
+
+    @staticmethod
+    def _atomic_write(path: str, writer: Callable[[str], Any]):
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            writer(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _encode(self, value: Any, path: str, codec: str):
+        if codec == 'parquet':
+            pq.write_table(self._to_arrow(value), path, compression=self.compression)
+        elif codec == 'csv':
+            value.to_csv(path, sep='|', index=False, encoding='utf-8')
+        elif codec == 'json':
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+        else:
+            raise ValueError(f"不支持的缓存格式: {codec}")
+
+    def _decode(self, path: str, codec: str) -> Any:
+        if codec == 'parquet':
+            return pq.read_table(path, use_threads=True, memory_map=True).to_pandas(use_threads=True)
+        if codec == 'csv':
+            return pd.read_csv(path, sep='|', encoding='utf-8', dtype=self.CODE_COLUMNS)
+        if codec == 'json':
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        raise ValueError(f"不支持的缓存格式: {codec}")
+
+    @staticmethod
+    def _to_arrow(df: pd.DataFrame) -> pa.Table:
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    @staticmethod
+    def _coerce_mixed_columns(df: pd.DataFrame) -> pd.DataFrame:
+        """接口偶尔在同一文本列里混入数值，Arrow 无法直接写入，这类列整列转为文本"""
+        mixed = []
+        for col in df.columns[df.dtypes == object]:
+            try:
+                pa.array(df[col], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                mixed.append(col)
+        if not mixed:
+            return df
+        df = df.copy()
+        for col in mixed:
+            df[col] = df[col].astype(str).where(df[col].notna())
+        return df
+
+
+# 全局缓存；由 StockAnalyzer / StockSyncEngine 按配置指定目录与容量，各模块通过 `from DataManager.FetchCache import fetch_cache` 使用
+fetch_cache = FetchCache()
@@ -0,0 +1,77 @@
+import json
+import os
+import shutil
+import uuid
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+
+class FetchJournal:
+    """
+    逐股获取的完成日志（断点续传）
+    每只股票的获取结果先原子写入暂存目录，再向 journal.jsonl 追加一条记录并落盘；
+    进程中途退出后重跑时，已记录的股票直接从暂存目录加载，不再请求接口。
+    整批写库成功后调用 clear() 删除本次日志。
+    """
+
+    JOURNAL_FILE = 'journal.jsonl'
+
+    def __init__(self, root_dir: str, run_key: str):
+        """
+        Args:
+            root_dir: 日志根目录
+            run_key: 本次任务标识（如 交易日_同步模式），不同任务的日志互不影响
+        """
+        self.run_dir = os.path.join(root_dir, run_key)
+        self.journal_path = os.path.join(self.run_dir, self.JOURNAL_FILE)
+
+    def completed(self) -> Dict[str, dict]:
+        """读取已完成的股票 {symbol: 记录}；暂存文件缺失或日志末行不完整的记录视为未完成。"""
+        if not os.path.exists(self.journal_path):
+            return {}
+        done = {}
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                files = [entry.get('kline_file'), entry.get('factor_file')]
+                if all(name is None or os.path.exists(os.path.join(self.run_dir, name)) for name in files):
+                    done[entry['symbol']] = entry
+        return done
+
+    def record(self, symbol: str, kline_df: pd.DataFrame, factor_df: Optional[pd.DataFrame] = None):
+        """先落盘该股的K线（及重新下载的复权因子），再追加日志记录并 fsync。"""
+        os.makedirs(self.run_dir, exist_ok=True)
+        entry = {'symbol': symbol, 'rows': int(len(kline_df)), 'kline_file': None, 'factor_file': None}
+        if not kline_df.empty:
+            entry['kline_file'] = self._write_frame(f"{symbol}.kline.parquet", kline_df)
+        if factor_df is not None:
+            entry['factor_file'] = self._write_frame(f"{symbol}.factor.parquet", factor_df)
+
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load(self, entry: dict) -> Tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+        """按日志记录加载暂存的 (K线, 复权因子)。"""
+        kline_df = pd.read_parquet(os.path.join(self.run_dir, entry['kline_file'])) \
+            if entry.get('kline_file') else pd.DataFrame()
+        factor_df = pd.read_parquet(os.path.join(self.run_dir, entry['factor_file'])) \
+            if entry.get('factor_file') else None
+        return kline_df, factor_df
+
+    def clear(self):
+        shutil.rmtree(self.run_dir, ignore_errors=True)
+
+    def _write_frame(self, name: str, df: pd.DataFrame) -> str:
+        path = os.path.join(self.run_dir, name)
+        tmp_path = os.path.join(self.run_dir, f".{name}.{uuid.uuid4().hex}.tmp")
+        df.to_parquet(tmp_path, index=False)
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return name
@@ -0,0 +1,232 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+
+class FetchCancelled(Exception):
+    """调度器已取消，排队中的请求不再发出。"""
+
+
+class TokenBucket:
+    """
+    令牌桶限速器：每秒补充 rate 个令牌，最多积攒 capacity 个（允许的突发量）。
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = max(float(rate), 0.01)
+        self.capacity = max(float(capacity), 1.0)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cancel_event: threading.Event):
+        """阻塞直到拿到一个令牌；等待期间被取消则抛出 FetchCancelled。"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            if cancel_event.wait(wait):
+                raise FetchCancelled()
+
+
+class EndpointPolicy:
+    """单个接口的重试策略：最多重试 retries 次，退避基数 base_delay 秒（全抖动指数退避，上限 max_delay）。"""
+
+    def __init__(self, retries: int = 3, base_delay: float = 1.0, max_delay: float = 30.0,
+                 retry_on_empty: bool = False):
+        self.retries = max(0, int(retries))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.retry_on_empty = retry_on_empty
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class FetchScheduler:
+    """
+    自适应限速抓取调度器
+    - 令牌桶限制整体请求速率；
+    - AIMD 自适应并发：请求顺利时每轮并发 +1，出错、错误率或延迟超标时并发减半；
+    - 按接口配置重试次数与抖动退避；
+    - cancel() 后排队任务与等待中的请求立即放弃。
+    """
+
+    def __init__(self, rate: float = 8.0, burst: float = None, min_concurrency: int = 2,
+                 max_concurrency: int = 12, latency_target: float = 3.0, error_threshold: float = 0.2,
+                 default_policy: EndpointPolicy = None, name: str = "fetch"):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst if burst is not None else rate)
+        self.min_concurrency = max(1, int(min_concurrency))
+        self.max_concurrency = max(self.min_concurrency, int(max_concurrency))
+        self.latency_target = float(latency_target)
+        self.error_threshold = float(error_threshold)
+        self.default_policy = default_policy or EndpointPolicy()
+        self.policies: Dict[str, EndpointPolicy] = {}
+
+        self._cancel = threading.Event()
+        self._cond = threading.Condition()
+        self._limit = float(self.min_concurrency)
+        self._active = 0
+        self._credit = 0.0
+        self._last_decrease = 0.0
+        self._ewma_latency = 0.0
+        self._ewma_error = 0.0
+        self.stats = {'requests': 0, 'errors': 0, 'retries': 0}
+
+    @classmethod
+    def from_config(cls, config, name: str = "fetch") -> 'FetchScheduler':
+        """按 config.ini [SYSTEM] 中的 FETCH_* 参数创建调度器，默认重试策略沿用 DATA_FETCH_RETRIES / DATA_FETCH_DELAY。"""
+        return cls(
+            rate=config.FETCH_RATE_LIMIT,
+            min_concurrency=config.FETCH_MIN_CONCURRENCY,
+            max_concurrency=config.FETCH_MAX_CONCURRENCY,
+            latency_target=config.FETCH_LATENCY_TARGET,
+            default_policy=EndpointPolicy(retries=config.DATA_FETCH_RETRIES, base_delay=config.DATA_FETCH_DELAY),
+            name=name,
+        )
+
+    def register_endpoint(self, endpoint: str, policy: EndpointPolicy):
+        self.policies[endpoint] = policy
+
+    @property
+    def concurrency(self) -> int:
+        return int(self._limit)
+
+    def cancel(self):
+        """取消调度：唤醒所有等待中的请求并让其抛出 FetchCancelled。"""
+        self._cancel.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def call(self, endpoint: str, func: Callable, *args, **kwargs) -> Any:
+        """
+        通过调度器发起一次接口请求：占用并发名额 → 取令牌 → 调用，失败按该接口策略抖动退避重试。
+        重试耗尽后抛出最后一次异常；返回空 DataFrame 且策略要求时也会重试。
+        """
+        policy = self.policies.get(endpoint, self.default_policy)
+        last_error: Optional[Exception] = None
+        result = None
+        for attempt in range(policy.retries + 1):
+            if attempt > 0:
+                with self._cond:
+                    self.stats['retries'] += 1
+                if self._cancel.wait(policy.backoff(attempt - 1)):
+                    raise FetchCancelled()
+
+            self._enter()
+            try:
+                self.bucket.acquire(self._cancel)
+                start = time.monotonic()
+                try:
+                    result = func(*args, **kwargs)
+                    last_error = None
+                except Exception as e:
+                    last_error = e
+                latency = time.monotonic() - start
+            finally:
+                self._leave()
+
+            empty = isinstance(result, pd.DataFrame) and result.empty
+            ok = last_error is None and not (empty and policy.retry_on_empty)
+            self._observe(latency, ok)
+            if ok:
+                return result
+
+        if last_error is not None:
+            raise last_error
+        return result
+
+    def map(self, items: Iterable[Any], worker: Callable[[Any], Any], desc: str = "任务",
+            on_result: Callable[[Any, Any], None] = None) -> List[Any]:
+        """
+        并发执行 worker(item)，返回与 items 顺序一致的结果列表（异常、取消的任务为 None）。
+        实际并发由 call() 的自适应名额控制，这里的线程数只是上限。
+        on_result(item, result) 在调用线程中按完成顺序逐个回调（仅非 None 结果），可用于即时落盘。
+        """
+        items = list(items)
+        results: List[Any] = [None] * len(items)
+        print(f"\n>>> 开始调度执行: {desc} (数量: {len(items)}, 并发上限: {self.max_concurrency})...")
+
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        try:
+            futures = {executor.submit(self._run_task, worker, item): idx for idx, item in enumerate(items)}
+            for future in as_completed(futures):
+                idx = futures[future]
+                results[idx] = future.result()
+                if on_result is not None and results[idx] is not None:
+                    on_result(items[idx], results[idx])
+        except KeyboardInterrupt:
+            print(f"[WARN] {desc} 被中断，正在取消剩余请求...")
+            self.cancel()
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=self.cancelled)
+
+        done = sum(r is not None for r in results)
+        print(f">>> {desc} 执行完毕，成功 {done}/{len(items)}；请求 {self.stats['requests']} 次，"
+              f"重试 {self.stats['retries']} 次，当前并发 {self.concurrency}。")
+        return results
+
+    def _run_task(self, worker: Callable[[Any], Any], item: Any) -> Any:
+        if self.cancelled:
+            return None
+        try:
+            return worker(item)
+        except FetchCancelled:
+            return None
+        except Exception as e:
+            print(f"[ERROR] 处理 {item} 时发生异常: {e}")
+            return None
+
+    def _enter(self):
+        with self._cond:
+            while self._active >= int(self._limit):
+                if self._cancel.is_set():
+                    raise FetchCancelled()
+                self._cond.wait(0.5)
+            if self._cancel.is_set():
+                raise FetchCancelled()
+            self._active += 1
+
+    def _leave(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def _observe(self, latency: float, ok: bool):
+        """AIMD：顺利时每完成一轮（limit 个请求）并发 +1；出错或延迟/错误率超标时并发减半（1 秒内只减一次）。"""
+        with self._cond:
+            self.stats['requests'] += 1
+            if not ok:
+                self.stats['errors'] += 1
+            self._ewma_latency = 0.8 * self._ewma_latency + 0.2 * latency
+            self._ewma_error = 0.8 * self._ewma_error + 0.2 * (0.0 if ok else 1.0)
+
+            congested = (not ok) or self._ewma_error > self.error_threshold \
+                or self._ewma_latency > self.latency_target
+            now = time.monotonic()
+            if congested:
+                if now - self._last_decrease >= 1.0:
+                    self._limit = max(float(self.min_concurrency), self._limit / 2)
+                    self._credit = 0.0
+                    self._last_decrease = now
+            else:
+                self._credit += 1.0 / self._limit
+                if self._credit >= 1.0:
+                    self._credit = 0.0
+                    self._limit = min(float(self.max_concurrency), self._limit + 1)
+            self._cond.notify_all()
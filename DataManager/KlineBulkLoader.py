@@ -0,0 +1,194 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+import pandas as pd
+from sqlalchemy import text
+
+# 与 PostgreSQL建表语句.sql 保持一致，upsert 依赖 (symbol, trade_date) 唯一约束
+KLINE_COLUMN_DEFS = """
+    symbol varchar(10) NOT NULL,
+    trade_date date NOT NULL,
+    "open" numeric(16, 4) NULL,
+    "close" numeric(16, 4) NULL,
+    high numeric(16, 4) NULL,
+    low numeric(16, 4) NULL,
+    close_normal numeric(16, 4) NULL,
+    adj_ratio numeric(24, 12) NULL
+"""
+
+KLINE_TABLE_DDL = f"""
+CREATE TABLE IF NOT EXISTS stock_daily_kline ({KLINE_COLUMN_DEFS},
+    CONSTRAINT stock_daily_kline_pkey PRIMARY KEY (symbol, trade_date),
+    CONSTRAINT unique_stock_daily_kline_symbol_date UNIQUE (symbol, trade_date)
+)
+"""
+
+KLINE_COLUMNS = ['trade_date', 'symbol', 'open', 'close', 'high', 'low', 'close_normal', 'adj_ratio']
+
+
+class KlineBulkLoader:
+    """
+    stock_daily_kline 批量写入器
+    先用 COPY 协议把数据流式写入暂存表（可按股票分片多连接并行），
+    再在单个事务内完成 ON CONFLICT 合并（merge）或整表替换（swap），写入过程中主表始终可读且约束不丢失。
+    """
+
+    TABLE_NAME = 'stock_daily_kline'
+
+    def __init__(self, engine, workers: int = 4):
+        """
+        Args:
+            engine: SQLAlchemy 引擎（psycopg2 驱动）
+            workers: 并行 COPY 的连接数
+        """
+        self.engine = engine
+        self.workers = max(1, int(workers))
+
+    def ensure_table(self):
+        """确保主表存在，且 (symbol, trade_date) 上有唯一索引供 ON CONFLICT 使用。"""
+        with self.engine.begin() as conn:
+            conn.execute(text(KLINE_TABLE_DDL))
+            # 旧版本以 to_sql(if_exists='replace') 建表，不带任何约束，这里补建唯一索引
+            has_unique = conn.execute(text("""
+                SELECT 1 FROM pg_indexes
+                WHERE schemaname = current_schema()
+                  AND tablename = :table
+                  AND indexdef ILIKE 'CREATE UNIQUE INDEX%'
+            """), {'table': self.TABLE_NAME}).first()
+            if has_unique is None:
+                conn.execute(text(
+                    f"CREATE UNIQUE INDEX IF NOT EXISTS unique_{self.TABLE_NAME}_symbol_date "
+                    f"ON {self.TABLE_NAME} (symbol, trade_date)"
+                ))
+
+    def merge(self, df: pd.DataFrame, then: Callable = None) -> int:
+        """
+        增量合并：COPY 到 UNLOGGED 暂存表后，单事务 INSERT ... ON CONFLICT DO UPDATE 合并进主表。
+        then(conn) 在同一事务内、合并之后执行（如保存复权因子并重算历史），失败时与合并一起回滚。
+        返回写入行数。
+        """
+        rows = self._prepare(df)
+        if rows.empty:
+            self._run_alone(then)
+            return 0
+
+        self.ensure_table()
+        stage = self._stage_name()
+        with self.engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {stage}"))
+            conn.execute(text(f"CREATE UNLOGGED TABLE {stage} ({KLINE_COLUMN_DEFS})"))
+
+        try:
+            self._parallel_copy(rows, stage)
+            update_cols = [c for c in KLINE_COLUMNS if c not in ('symbol', 'trade_date')]
+            col_list = ', '.join(f'"{c}"' for c in KLINE_COLUMNS)
+            set_list = ', '.join(f'"{c}" = EXCLUDED."{c}"' for c in update_cols)
+            with self.engine.begin() as conn:
+                conn.execute(text(f"""
+                    INSERT INTO {self.TABLE_NAME} ({col_list})
+                    SELECT {col_list} FROM {stage}
+                    ON CONFLICT (symbol, trade_date) DO UPDATE SET {set_list}
+                """))
+                if then is not None:
+                    then(conn)
+        finally:
+            self._drop_stage(stage)
+
+        return len(rows)
+
+    def swap(self, df: pd.DataFrame, then: Callable = None) -> int:
+        """
+        全量替换：COPY 到新表并建好主键/唯一约束后，单事务内删除旧表、新表改名接替。
+        then(conn) 在同一事务内、替换之后执行，语义同 merge。
+        返回写入行数。
+        """
+        rows = self._prepare(df)
+        if rows.empty:
+            self._run_alone(then)
+            return 0
+
+        stage = self._stage_name()
+        with self.engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {stage}"))
+            # 按标准建表语句建新表，旧版 to_sql 建出的宽松列类型随旧表一起淘汰
+            conn.execute(text(f"CREATE TABLE {stage} ({KLINE_COLUMN_DEFS})"))
+
+        try:
+            self._parallel_copy(rows, stage)
+            with self.engine.begin() as conn:
+                conn.execute(text(f"DROP TABLE IF EXISTS {self.TABLE_NAME}"))
+                conn.execute(text(f"ALTER TABLE {stage} RENAME TO {self.TABLE_NAME}"))
+                conn.execute(text(f"""
+                    ALTER TABLE {self.TABLE_NAME}
+                        ADD CONSTRAINT {self.TABLE_NAME}_pkey PRIMARY KEY (symbol, trade_date),
+                        ADD CONSTRAINT unique_{self.TABLE_NAME}_symbol_date UNIQUE (symbol, trade_date)
+                """))
+                if then is not None:
+                    then(conn)
+        finally:
+            self._drop_stage(stage)
+
+        return len(rows)
+
+    def _run_alone(self, then: Callable):
+        """没有K线可写时，附加写入单独成一个事务"""
+        if then is not None:
+            with self.engine.begin() as conn:
+                then(conn)
+
+    def _prepare(self, df: pd.DataFrame) -> pd.DataFrame:
+        """按建表列顺序整理数据，并按 (symbol, trade_date) 去重，避免 ON CONFLICT 同一行被更新两次。"""
+        if df is None or df.empty:
+            return pd.DataFrame(columns=KLINE_COLUMNS)
+        rows = df[KLINE_COLUMNS].copy()
+        rows['trade_date'] = pd.to_datetime(rows['trade_date']).dt.strftime('%Y-%m-%d')
+        rows['symbol'] = rows['symbol'].astype(str)
+        return rows.drop_duplicates(subset=['symbol', 'trade_date'], keep='last')
+
+    def _stage_name(self) -> str:
+        return f"{self.TABLE_NAME}_stage_{os.getpid()}"
+
+    def _shard_by_symbol(self, rows: pd.DataFrame) -> List[pd.DataFrame]:
+        """按股票分片，同一只股票的K线总落在同一个分片里。"""
+        symbols = sorted(rows['symbol'].unique())
+        n_shards = min(self.workers, len(symbols))
+        shard_of = {sym: i % n_shards for i, sym in enumerate(symbols)}
+        shard_ids = rows['symbol'].map(shard_of)
+        return [rows[shard_ids == i] for i in range(n_shards)]
+
+    def _parallel_copy(self, rows: pd.DataFrame, stage: str):
+        """每个分片使用独立连接 COPY 进暂存表，各自提交。"""
+        shards = self._shard_by_symbol(rows)
+        if len(shards) == 1:
+            self._copy_shard(shards[0], stage)
+            return
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            # list() 触发迭代，任一分片失败都会在这里抛出
+            list(executor.map(lambda shard: self._copy_shard(shard, stage), shards))
+
+    def _copy_shard(self, shard: pd.DataFrame, stage: str):
+        output = io.StringIO()
+        shard.to_csv(output, sep='\t', header=False, index=False, encoding='utf-8')
+        output.seek(0)
+
+        raw_conn = self.engine.raw_connection()
+        cursor = raw_conn.cursor()
+        try:
+            columns = ', '.join(f'"{col}"' for col in KLINE_COLUMNS)
+            cursor.copy_expert(f"COPY {stage} ({columns}) FROM STDIN WITH CSV DELIMITER '\t'", output)
+            raw_conn.commit()
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            raw_conn.close()
+
+    def _drop_stage(self, stage: str):
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(text(f"DROP TABLE IF EXISTS {stage}"))
+        except Exception as e:
+            print(f"[WARN] 清理暂存表 {stage} 失败: {e}")
@@ -0,0 +1,103 @@
+import io
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+# COPY 输出解析时各列的类型：价格、复权比例直接解析为 float64（不经 Decimal），symbol 字典编码
+KLINE_READ_TYPES = {
+    'trade_date': pa.date32(),
+    'symbol': pa.dictionary(pa.int32(), pa.string()),
+    'open': pa.float64(),
+    'close': pa.float64(),
+    'high': pa.float64(),
+    'low': pa.float64(),
+    'close_normal': pa.float64(),
+    'adj_ratio': pa.float64(),
+}
+
+
+class KlineHistoryLoader:
+    """
+    按指标预热需求加载K线历史
+    只读取截至业务日期的最近 N 个交易日（N 由指标参数推导，起始日按交易日历计算），
+    股票池以数组参数绑定（symbol = ANY(:symbols)），走 (symbol, trade_date) 主键索引做范围扫描，
+    读取量与内存只取决于股票数 × N，不随库内历史累积增长。
+    读取经 COPY ... TO STDOUT 以 CSV 流式输出，再由 pyarrow 直接解析为 float64 列，
+    避免 numeric 列经 pd.read_sql 变成逐个 Decimal 对象的 object 列。
+    """
+
+    TABLE_NAME = 'stock_daily_kline'
+    COLUMNS = ['trade_date', 'symbol', 'open', 'close', 'high', 'low']
+
+    def __init__(self, engine, calendar=None):
+        """
+        Args:
+            engine: SQLAlchemy 引擎
+            calendar: TradingCalendarAnalyzer，用于把交易日数换算为起始日期（只用 read_typed 时可为空）
+        """
+        self.engine = engine
+        self.calendar = calendar
+
+    def load(self, symbols: List[str], lookback: int, end_date: str,
+             columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        读取 symbols 在 [end_date 前第 lookback 个交易日, end_date] 内的K线。
+        Args:
+            symbols: 带市场前缀的代码（如 sh600000）
+            lookback: 需要的交易日数
+            end_date: 业务日期（最后一个交易日）
+            columns: 读取的列，默认 COLUMNS
+        """
+        if not symbols:
+            return pd.DataFrame(columns=columns or self.COLUMNS)
+
+        start_date = self.calendar.get_lookback_start(end_date, lookback)
+        df = self.read_typed(symbols, start_date, end_date, columns)
+        print(f"[INFO] 按指标预热窗口加载 {lookback} 个交易日K线（{start_date} 至 {end_date}）: "
+              f"{df['symbol'].nunique() if not df.empty else 0} 只股票，{len(df)} 行。")
+        return df
+
+    def read_typed(self, symbols: List[str], start_date=None, end_date=None,
+                   columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        按股票与日期范围读取K线，返回按 (symbol, trade_date) 排序、价格列为 float64 的 DataFrame
+        （trade_date 为 datetime64[ns]，symbol 为 category）。
+        """
+        columns = columns or self.COLUMNS
+        conditions = ["symbol = ANY(%(symbols)s)"]
+        params = {'symbols': list(symbols)}
+        if start_date is not None:
+            conditions.append("trade_date >= %(start_date)s")
+            params['start_date'] = pd.to_datetime(start_date).date()
+        if end_date is not None:
+            conditions.append("trade_date <= %(end_date)s")
+            params['end_date'] = pd.to_datetime(end_date).date()
+
+        select_cols = ', '.join(f'"{col}"' for col in columns)
+        select = (f"SELECT {select_cols} FROM {self.TABLE_NAME} "
+                  f"WHERE {' AND '.join(conditions)} ORDER BY symbol, trade_date")
+
+        output = io.BytesIO()
+        raw_conn = self.engine.raw_connection()
+        cursor = raw_conn.cursor()
+        try:
+            # COPY 不支持绑定参数，由驱动按参数类型转义后嵌入（列表转为 ARRAY[...]）
+            query = cursor.mogrify(select, params).decode('utf-8')
+            cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)", output)
+        finally:
+            cursor.close()
+            raw_conn.close()
+
+        output.seek(0)
+        return self._parse_csv(output, columns)
+
+    @staticmethod
+    def _parse_csv(source, columns: List[str]) -> pd.DataFrame:
+        column_types = {col: KLINE_READ_TYPES[col] for col in columns if col in KLINE_READ_TYPES}
+        table = pa_csv.read_csv(source, convert_options=pa_csv.ConvertOptions(column_types=column_types))
+        df = table.to_pandas(date_as_object=False)
+        if 'trade_date' in df.columns:
+            df['trade_date'] = df['trade_date'].astype('datetime64[ns]')
+        return df
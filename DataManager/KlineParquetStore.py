@@ -0,0 +1,155 @@
+import glob
+import os
+import uuid
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# 分区文件内只存数值列，symbol / year 由 hive 目录名（symbol=sh600000/year=2025）提供
+KLINE_FILE_SCHEMA = pa.schema([
+    ('trade_date', pa.date32()),
+    ('open', pa.float64()),
+    ('close', pa.float64()),
+    ('high', pa.float64()),
+    ('low', pa.float64()),
+    ('close_normal', pa.float64()),
+    ('adj_ratio', pa.float64()),
+])
+
+KLINE_PARTITIONING = ds.partitioning(
+    pa.schema([('symbol', pa.string()), ('year', pa.int32())]),
+    flavor='hive'
+)
+
+KLINE_COLUMNS = ['trade_date', 'symbol', 'open', 'close', 'high', 'low', 'close_normal', 'adj_ratio']
+
+
+class KlineParquetStore:
+    """
+    本地K线列式存储（Parquet，按 symbol / year 分区）
+    每次同步只把新增K线追加进对应分区（同日重复写入以新值为准），
+    读取时按股票、日期做分区裁剪与谓词下推，只读需要的列。
+    """
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def append(self, df: pd.DataFrame) -> int:
+        """把K线按 (symbol, year) 追加进分区文件，按 trade_date 去重（保留新值）；返回写入行数。"""
+        if df is None or df.empty:
+            return 0
+        rows = df[KLINE_COLUMNS].copy()
+        rows['trade_date'] = pd.to_datetime(rows['trade_date']).dt.normalize().astype('datetime64[ns]')
+        rows['symbol'] = rows['symbol'].astype(str)
+
+        for (symbol, year), part in rows.groupby([rows['symbol'], rows['trade_date'].dt.year]):
+            existing = self._read_partition(symbol, year)
+            merged = pd.concat([existing, part.drop(columns=['symbol'])], ignore_index=True) \
+                if not existing.empty else part.drop(columns=['symbol'])
+            merged = merged.drop_duplicates(subset=['trade_date'], keep='last').sort_values('trade_date')
+            self._write_partition(symbol, year, merged)
+        return len(rows)
+
+    def read(self, symbols: Optional[List[str]] = None, start_date=None, end_date=None,
+             columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        按条件读取K线：symbols / 年份用于分区裁剪，trade_date 范围下推到行组统计，columns 只读取需要的列。
+        """
+        columns = columns or KLINE_COLUMNS
+        if not self._has_data():
+            return pd.DataFrame(columns=columns)
+
+        dataset = ds.dataset(self.root_dir, format='parquet', partitioning=KLINE_PARTITIONING,
+                             schema=KLINE_FILE_SCHEMA.append(pa.field('symbol', pa.string()))
+                             .append(pa.field('year', pa.int32())))
+        condition = None
+        if symbols is not None:
+            condition = ds.field('symbol').isin(list(symbols))
+        if start_date is not None:
+            start = pd.to_datetime(start_date)
+            cond = (ds.field('year') >= start.year) & (ds.field('trade_date') >= pa.scalar(start.date()))
+            condition = cond if condition is None else condition & cond
+        if end_date is not None:
+            end = pd.to_datetime(end_date)
+            cond = (ds.field('year') <= end.year) & (ds.field('trade_date') <= pa.scalar(end.date()))
+            condition = cond if condition is None else condition & cond
+
+        table = dataset.to_table(columns=columns, filter=condition)
+        df = table.to_pandas(date_as_object=False)
+        if 'trade_date' in df.columns:
+            df['trade_date'] = pd.to_datetime(df['trade_date']).astype('datetime64[ns]')
+            sort_cols = [c for c in ['symbol', 'trade_date'] if c in df.columns]
+            df = df.sort_values(sort_cols).reset_index(drop=True)
+        return df
+
+    def last_dates(self, symbols: List[str]) -> Dict[str, pd.Timestamp]:
+        """每只股票在本地库中最后一根K线的交易日（只读最新年份分区的 trade_date 列）。"""
+        result = {}
+        for symbol in symbols:
+            years = self._years(symbol)
+            if not years:
+                continue
+            dates = pq.read_table(self._partition_file(symbol, max(years)), columns=['trade_date']).column(0)
+            if len(dates):
+                result[symbol] = pd.Timestamp(max(dates.to_pylist()))
+        return result
+
+    def rescale(self, factors: Dict[str, pd.DataFrame]):
+        """
+        复权因子更新后，按新因子分段重算本地已存K线的前复权价格，与 AdjFactorStore.save_and_rescale 的库内重算一致：
+        开高低先按旧因子还原并四舍五入到分得到不复权价，再乘新因子（收盘用 close_normal），重复除权不累积误差。
+        """
+        for symbol, factor_df in factors.items():
+            factor_df = factor_df.sort_values('start_date')
+            factor_df = factor_df.assign(start_date=factor_df['start_date'].astype('datetime64[ns]'))
+            for year in self._years(symbol):
+                part = self._read_partition(symbol, year)
+                if part.empty:
+                    continue
+                part = pd.merge_asof(part.sort_values('trade_date'), factor_df,
+                                     left_on='trade_date', right_on='start_date', direction='backward',
+                                     suffixes=('', '_new'))
+                new_ratio = part['adj_ratio_new'].fillna(factor_df['adj_ratio'].iloc[0])
+                changed = (part['adj_ratio'] > 0) & ((part['adj_ratio'] - new_ratio).abs() > 1e-9)
+                if not changed.any():
+                    continue
+                old_ratio = part.loc[changed, 'adj_ratio']
+                for col in ['open', 'high', 'low']:
+                    # 与 PostgreSQL ROUND(numeric, 2) 一致：四舍五入（而非银行家舍入），容忍浮点表示误差
+                    unadjusted = np.floor(part.loc[changed, col] / old_ratio * 100 + 0.5 + 1e-9) / 100
+                    part.loc[changed, col] = unadjusted * new_ratio[changed]
+                part.loc[changed, 'close'] = part.loc[changed, 'close_normal'] * new_ratio[changed]
+                part.loc[changed, 'adj_ratio'] = new_ratio[changed]
+                self._write_partition(symbol, year, part[KLINE_FILE_SCHEMA.names])
+
+    def _has_data(self) -> bool:
+        return bool(glob.glob(os.path.join(self.root_dir, 'symbol=*', 'year=*', '*.parquet')))
+
+    def _years(self, symbol: str) -> List[int]:
+        pattern = os.path.join(self.root_dir, f'symbol={symbol}', 'year=*', 'data.parquet')
+        return sorted(int(os.path.basename(os.path.dirname(p)).split('=', 1)[1]) for p in glob.glob(pattern))
+
+    def _partition_file(self, symbol: str, year: int) -> str:
+        return os.path.join(self.root_dir, f'symbol={symbol}', f'year={int(year)}', 'data.parquet')
+
+    def _read_partition(self, symbol: str, year: int) -> pd.DataFrame:
+        path = self._partition_file(symbol, year)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=KLINE_FILE_SCHEMA.names)
+        df = pq.read_table(path, schema=KLINE_FILE_SCHEMA).to_pandas(date_as_object=False)
+        df['trade_date'] = pd.to_datetime(df['trade_date']).astype('datetime64[ns]')
+        return df
+
+    def _write_partition(self, symbol: str, year: int, df: pd.DataFrame):
+        """先写临时文件再原子替换，避免中断时留下半个分区文件（"." 开头的临时文件不会被数据集扫描到）。"""
+        path = self._partition_file(symbol, year)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(df[KLINE_FILE_SCHEMA.names], schema=KLINE_FILE_SCHEMA, preserve_index=False)
+        tmp_path = os.path.join(os.path.dirname(path), f".data.{uuid.uuid4().hex}.tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
@@ -0,0 +1,114 @@
+import hashlib
+import json
+from contextlib import contextmanager
+
+import pandas as pd
+from sqlalchemy import text
+
+RUN_MANIFEST_DDL = """
+CREATE TABLE IF NOT EXISTS etl_run_manifest (
+    job_name varchar(50) NOT NULL,
+    session_date date NOT NULL,
+    fingerprint varchar(64) NOT NULL,
+    status varchar(16) NOT NULL,
+    detail text NULL,
+    started_at timestamp DEFAULT CURRENT_TIMESTAMP NULL,
+    finished_at timestamp NULL,
+    CONSTRAINT etl_run_manifest_pkey PRIMARY KEY (job_name, session_date, fingerprint)
+)
+"""
+
+
+class RunManifest:
+    """
+    任务运行清单
+    以 (任务名, 交易日, 输入指纹) 记录每次同步的状态：已完成的同一输入再次调用直接跳过；
+    同一任务同一交易日的并发调用通过 PostgreSQL advisory lock 串行化，后到者等待后复查清单即可返回。
+    """
+
+    TABLE_NAME = 'etl_run_manifest'
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._table_ready = False
+
+    @staticmethod
+    def fingerprint(payload: dict) -> str:
+        """对输入（股票池、参数、数据源版本等）做稳定哈希。"""
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def is_complete(self, job_name: str, session_date, fingerprint: str) -> bool:
+        """清单中该输入是否已完成；清单不可用时返回 False（照常执行）。"""
+        try:
+            self._ensure_table()
+            with self.engine.connect() as conn:
+                row = conn.execute(text(f"""
+                    SELECT 1 FROM {self.TABLE_NAME}
+                    WHERE job_name = :job AND session_date = :session
+                      AND fingerprint = :fp AND status = 'complete'
+                """), self._key(job_name, session_date, fingerprint)).first()
+            return row is not None
+        except Exception as e:
+            print(f"[WARN] 读取运行清单失败: {e}，按未完成处理。")
+            return False
+
+    def mark(self, job_name: str, session_date, fingerprint: str, status: str, detail: str = None):
+        """写入/更新清单状态（running / complete / partial）。"""
+        try:
+            self._ensure_table()
+            params = self._key(job_name, session_date, fingerprint)
+            params.update({'status': status, 'detail': detail})
+            with self.engine.begin() as conn:
+                conn.execute(text(f"""
+                    INSERT INTO {self.TABLE_NAME} (job_name, session_date, fingerprint, status, detail, started_at)
+                    VALUES (:job, :session, :fp, :status, :detail, CURRENT_TIMESTAMP)
+                    ON CONFLICT (job_name, session_date, fingerprint) DO UPDATE SET
+                        status = EXCLUDED.status,
+                        detail = EXCLUDED.detail,
+                        started_at = CASE WHEN EXCLUDED.status = 'running'
+                                          THEN CURRENT_TIMESTAMP ELSE {self.TABLE_NAME}.started_at END,
+                        finished_at = CASE WHEN EXCLUDED.status = 'running'
+                                           THEN NULL ELSE CURRENT_TIMESTAMP END
+                """), params)
+        except Exception as e:
+            print(f"[WARN] 写入运行清单失败: {e}")
+
+    @contextmanager
+    def lock(self, job_name: str, session_date):
+        """
+        对 (任务名, 交易日) 加会话级 advisory lock，已被占用时阻塞等待。
+        加锁失败（如数据库不支持）时不阻止执行，只打印警告。
+        """
+        key = f"{job_name}:{pd.to_datetime(session_date).strftime('%Y%m%d')}"
+        conn = None
+        try:
+            conn = self.engine.connect()
+            conn.execute(text("SELECT pg_advisory_lock(hashtext(:key))"), {'key': key})
+            conn.commit()
+        except Exception as e:
+            print(f"[WARN] 获取运行锁失败: {e}，不加锁继续执行。")
+            if conn is not None:
+                conn.close()
+            conn = None
+
+        try:
+            yield
+        finally:
+            if conn is not None:
+                try:
+                    conn.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), {'key': key})
+                    conn.commit()
+                finally:
+                    conn.close()
+
+    def _ensure_table(self):
+        if self._table_ready:
+            return
+        with self.engine.begin() as conn:
+            conn.execute(text(RUN_MANIFEST_DDL))
+        self._table_ready = True
+
+    @staticmethod
+    def _key(job_name: str, session_date, fingerprint: str) -> dict:
+        return {'job': job_name, 'session': pd.to_datetime(session_date).date(), 'fp': fingerprint}
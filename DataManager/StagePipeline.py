@@ -0,0 +1,165 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+
+class PipelineAbort(Exception):
+    """阶段主动终止整个流程（如股票池为空），调用方记录原因后正常退出，不视为程序错误。"""
+
+
+class StageFailed(Exception):
+    """某个阶段抛出异常，流程停止；原始异常见 __cause__。"""
+
+    def __init__(self, stage: str, error: BaseException):
+        super().__init__(f"阶段 {stage} 执行失败: {error}")
+        self.stage = stage
+
+
+class Stage:
+    """
+    流程中的一个命名阶段：inputs 为依赖的产出名，func 以 产出名 -> 值 的关键字参数调用。
+    outputs 为空时产出一个与阶段同名的值；给出多个产出名时 func 须返回以这些名称为键的字典。
+    """
+
+    def __init__(self, name: str, func: Callable[..., Any], inputs: Sequence[str] = (),
+                 outputs: Optional[Sequence[str]] = None):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs) if outputs else (name,)
+
+
+class StagePipeline:
+    """
+    依赖图流程执行器
+    - 按阶段声明的输入/输出建立依赖关系，依赖全部就绪的阶段立即提交到线程池，互不依赖的阶段并发执行；
+    - 产出按名称缓存，同一实例再次 run() 时已完成的阶段直接复用结果；
+    - 任一阶段失败后不再提交新阶段，等已在运行的阶段结束后抛出 StageFailed（PipelineAbort 原样抛出）；
+    - 结束时打印各阶段耗时与关键路径，总耗时应接近关键路径而不是各阶段耗时之和。
+    """
+
+    def __init__(self, executor: Executor, name: str = "pipeline"):
+        self.executor = executor
+        self.name = name
+        self.stages: Dict[str, Stage] = {}
+        self.producer: Dict[str, str] = {}
+        self.results: Dict[str, Any] = {}
+        self.timings: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, func: Callable[..., Any], inputs: Sequence[str] = (),
+            outputs: Optional[Sequence[str]] = None) -> 'StagePipeline':
+        if name in self.stages:
+            raise ValueError(f"阶段重复定义: {name}")
+        stage = Stage(name, func, inputs, outputs)
+        for output in stage.outputs:
+            if output in self.producer:
+                raise ValueError(f"产出 {output} 同时由 {self.producer[output]} 与 {name} 产生")
+            self.producer[output] = name
+        self.stages[name] = stage
+        return self
+
+    def _required(self, targets: Iterable[str]) -> List[str]:
+        """目标产出所需的全部阶段（按拓扑序），同时检查缺失的输入与循环依赖"""
+        order, state = [], {}
+
+        def visit(stage_name: str, path: tuple):
+            if state.get(stage_name) == 'done':
+                return
+            if state.get(stage_name) == 'visiting':
+                raise ValueError(f"阶段存在循环依赖: {' -> '.join(path + (stage_name,))}")
+            state[stage_name] = 'visiting'
+            for item in self.stages[stage_name].inputs:
+                if item not in self.producer:
+                    raise ValueError(f"阶段 {stage_name} 的输入 {item} 没有对应的产出阶段")
+                visit(self.producer[item], path + (stage_name,))
+            state[stage_name] = 'done'
+            order.append(stage_name)
+
+        for target in targets:
+            if target not in self.producer:
+                raise ValueError(f"未定义的产出: {target}")
+            visit(self.producer[target], ())
+        return order
+
+    def _execute(self, stage: Stage) -> Dict[str, Any]:
+        started = time.time()
+        value = stage.func(**{item: self.results[item] for item in stage.inputs})
+        if len(stage.outputs) == 1:
+            produced = {stage.outputs[0]: value}
+        else:
+            missing = [o for o in stage.outputs if not isinstance(value, dict) or o not in value]
+            if missing:
+                raise ValueError(f"阶段 {stage.name} 未返回声明的产出: {missing}")
+            produced = {o: value[o] for o in stage.outputs}
+        with self._lock:
+            self.timings[stage.name] = (started, time.time())
+        return produced
+
+    def run(self, targets: Sequence[str] = None) -> Dict[str, Any]:
+        """执行得到 targets（默认全部产出）所需的阶段，返回 产出名 -> 值"""
+        targets = list(targets) if targets else list(self.producer)
+        pending = [name for name in self._required(targets)
+                   if not all(o in self.results for o in self.stages[name].outputs)]
+        executed = list(pending)
+        started = time.time()
+        running: Dict[Future, str] = {}
+        error: Optional[BaseException] = None
+
+        while pending or running:
+            if error is None:
+                for name in [n for n in pending if all(i in self.results for i in self.stages[n].inputs)]:
+                    pending.remove(name)
+                    running[self.executor.submit(self._execute, self.stages[name])] = name
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    self.results.update(future.result())
+                except PipelineAbort as e:
+                    error = error or e
+                except Exception as e:
+                    if error is None:
+                        error = StageFailed(name, e)
+                        error.__cause__ = e
+
+        if error is not None:
+            raise error
+        self._print_timings(started, executed)
+        return {target: self.results[target] for target in targets}
+
+    def critical_path(self) -> List[str]:
+        """已执行阶段中耗时累计最长的依赖链"""
+        total: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        for name in self._required([o for s in self.timings for o in self.stages[s].outputs]):
+            if name not in self.timings:
+                continue
+            begin, end = self.timings[name]
+            parents = [self.producer[i] for i in self.stages[name].inputs if self.producer[i] in total]
+            best = max(parents, key=lambda p: total[p], default=None)
+            total[name] = (end - begin) + (total[best] if best else 0.0)
+            previous[name] = best
+        if not total:
+            return []
+        node, path = max(total, key=total.get), []
+        while node:
+            path.append(node)
+            node = previous[node]
+        return path[::-1]
+
+    def _print_timings(self, started: float, executed: List[str]):
+        if not executed:
+            return
+        elapsed = time.time() - started
+        serial = sum(self.timings[n][1] - self.timings[n][0] for n in executed)
+        path = self.critical_path()
+        path_cost = sum(self.timings[n][1] - self.timings[n][0] for n in path)
+        print(f"\n>>> [{self.name}] {len(executed)} 个阶段完成：总耗时 {elapsed:.1f}s，"
+              f"各阶段耗时之和 {serial:.1f}s，关键路径 {path_cost:.1f}s（{' -> '.join(path)}）")
+        for name in sorted(executed, key=lambda n: self.timings[n][0]):
+            begin, end = self.timings[name]
+            print(f"  - {name}: {end - begin:.1f}s")
@@ -0,0 +1,267 @@
+import functools
+import gzip
+import hashlib
+import json
+import os
+import pickle
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import akshare
+
+
+class ReplayMissError(KeyError):
+    """回放模式下当日数据包中没有该调用的录制结果。"""
+
+
+class VendorRecorder:
+    """
+    数据源调用录制/回放层
+    - record：照常请求接口，并把返回结果按内容哈希压缩存入 objects/，当日数据包 bundles/{日期}.jsonl 记录 调用键 → 对象哈希；
+    - replay：不访问网络，按 函数名 + 参数 从指定日期的数据包中取回结果，可离线、确定性地重放整次运行；
+    - off：直接透传。
+    相同内容的返回结果跨天只存一份。
+    """
+
+    MODES = ('off', 'record', 'replay')
+    # 解析交易日用的日历接口；只含这些调用的数据包不是一次完整运行的录制
+    CALENDAR_FUNCS = frozenset({'akshare.tool_trade_date_hist_sina', 'tushare.pro.trade_cal'})
+
+    def __init__(self):
+        self.mode = 'off'
+        self.root_dir = None
+        self.bundle_date = None
+        self._index: Dict[str, str] = {}
+        # 录制模式下切换到交易日数据包之前写入自然日数据包的记录行，切换时并入交易日数据包
+        self._pre_session_lines: List[str] = []
+        self._session_resolved = False
+        self._lock = threading.Lock()
+
+    def configure(self, root_dir: str, mode: str = 'off', replay_date: str = None, retention_days: int = 0):
+        """
+        Args:
+            root_dir: 录制数据根目录
+            mode: off / record / replay
+            replay_date: 回放使用的数据包日期（YYYYMMDD），为空时取最新的数据包
+            retention_days: 录制模式下数据包保留天数，0 表示不清理
+        """
+        mode = (mode or 'off').strip().lower()
+        if mode not in self.MODES:
+            print(f"[WARN] 未知的录制模式 '{mode}'，按 off 处理。")
+            mode = 'off'
+        self.mode = mode
+        self.root_dir = root_dir
+        self._index = {}
+        self._pre_session_lines = []
+        self._session_resolved = False
+        if mode == 'off':
+            return
+
+        os.makedirs(os.path.join(root_dir, 'objects'), exist_ok=True)
+        os.makedirs(os.path.join(root_dir, 'bundles'), exist_ok=True)
+        if mode == 'record':
+            self.bundle_date = datetime.now().strftime('%Y%m%d')
+            if retention_days > 0:
+                self.prune(retention_days)
+        else:
+            self.bundle_date = replay_date or self._latest_bundle_date()
+            if self.bundle_date is None:
+                print("[WARN] 回放模式下未找到任何录制数据包，所有接口调用将失败。")
+        self._index = self._load_index(self.bundle_date) if self.bundle_date else {}
+        print(f"[INFO] 数据源录制层: 模式={self.mode}，数据包={self.bundle_date}（已有 {len(self._index)} 条记录）")
+
+    def replay_session(self) -> Optional[datetime]:
+        """
+        回放模式下返回数据包所属交易日（当日收盘后的时点），供交易日历据此确定运行日期；
+        调用键含日期参数（K线 end_date、股票池 date 等），运行日期须与录制时一致才能命中。其他模式返回 None。
+        """
+        if self.mode != 'replay' or not self.bundle_date:
+            return None
+        return datetime.strptime(self.bundle_date, '%Y%m%d').replace(hour=18)
+
+    def configure_from_config(self, config):
+        self.configure(config.VENDOR_BUNDLE_DIR, config.VENDOR_IO_MODE, config.VENDOR_REPLAY_DATE or None,
+                       config.VENDOR_RETENTION_DAYS)
+
+    def prune(self, retention_days: int) -> int:
+        """删除早于 retention_days 天的数据包，再删除不被剩余数据包引用的录制对象；返回删除的对象数"""
+        bundle_dir = os.path.join(self.root_dir, 'bundles')
+        cutoff = (datetime.now() - timedelta(days=retention_days)).strftime('%Y%m%d')
+        for name in os.listdir(bundle_dir):
+            if name.endswith('.jsonl') and name[:-6] < cutoff:
+                os.remove(os.path.join(bundle_dir, name))
+
+        referenced = set()
+        for name in os.listdir(bundle_dir):
+            if name.endswith('.jsonl'):
+                referenced.update(self._load_index(name[:-6]).values())
+        removed = 0
+        for dirpath, _, files in os.walk(os.path.join(self.root_dir, 'objects')):
+            for file_name in files:
+                if file_name.endswith('.pkl.gz') and file_name[:-7] not in referenced:
+                    os.remove(os.path.join(dirpath, file_name))
+                    removed += 1
+        if removed:
+            print(f"[INFO] 数据源录制层: 已清理 {retention_days} 天前的数据包，删除 {removed} 个不再引用的录制对象。")
+        return removed
+
+    def use_session(self, session_date: str):
+        """
+        录制模式下改为按交易日（YYYY-MM-DD 或 YYYYMMDD）命名数据包：周末、节假日的运行并入上一交易日的数据包，
+        回放时按交易日即可取回。切换前（解析交易日时）录制的日历请求一并移入交易日数据包，
+        自然日数据包移出后为空则删除。
+        """
+        if self.mode != 'record' or not session_date:
+            return
+        bundle_date = session_date.replace('-', '')[:8]
+        with self._lock:
+            moved, self._pre_session_lines = self._pre_session_lines, []
+            self._session_resolved = True
+            if bundle_date == self.bundle_date:
+                return
+            wall_clock_date = self.bundle_date
+            if moved:
+                with open(self._bundle_path(bundle_date), 'a', encoding='utf-8') as f:
+                    f.writelines(moved)
+                self._remove_lines(wall_clock_date, moved)
+            self.bundle_date = bundle_date
+            self._index = self._load_index(bundle_date)
+        print(f"[INFO] 数据源录制层: 数据包切换为交易日 {bundle_date}（已有 {len(self._index)} 条记录）")
+
+    def proxy(self, target: Any, namespace: str) -> 'VendorProxy':
+        """包装模块或接口对象（如 akshare 模块、tushare pro_api），其可调用属性经录制层转发。"""
+        return VendorProxy(self, target, namespace)
+
+    def call(self, name: str, func, args: tuple, kwargs: dict) -> Any:
+        if self.mode == 'off':
+            return func(*args, **kwargs)
+
+        key = self._call_key(name, args, kwargs)
+        if self.mode == 'replay':
+            obj_hash = self._index.get(key)
+            if obj_hash is None:
+                raise ReplayMissError(f"数据包 {self.bundle_date} 中没有 {name} 的录制结果（参数 {args} {kwargs}）")
+            return self._read_object(obj_hash)
+
+        result = func(*args, **kwargs)
+        try:
+            self._record(key, name, args, kwargs, result)
+        except Exception as e:
+            print(f"[WARN] 录制 {name} 返回结果失败: {e}")
+        return result
+
+    @staticmethod
+    def _call_key(name: str, args: tuple, kwargs: dict) -> str:
+        raw = json.dumps({'func': name, 'args': list(args), 'kwargs': kwargs},
+                         sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _record(self, key: str, name: str, args: tuple, kwargs: dict, result: Any):
+        payload = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        obj_hash = hashlib.sha256(payload).hexdigest()
+        obj_path = self._object_path(obj_hash)
+        if not os.path.exists(obj_path):
+            os.makedirs(os.path.dirname(obj_path), exist_ok=True)
+            tmp_path = f"{obj_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(gzip.compress(payload, mtime=0))
+            os.replace(tmp_path, obj_path)
+
+        entry = {'key': key, 'func': name, 'args': list(args), 'kwargs': kwargs, 'object': obj_hash,
+                 'recorded_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        line = json.dumps(entry, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            with open(self._bundle_path(self.bundle_date), 'a', encoding='utf-8') as f:
+                f.write(line)
+            self._index[key] = obj_hash
+            if not self._session_resolved:
+                self._pre_session_lines.append(line)
+
+    def _remove_lines(self, bundle_date: str, lines: List[str]):
+        """从数据包中删去给定记录行，删完为空时删除数据包文件"""
+        path = self._bundle_path(bundle_date)
+        if not os.path.exists(path):
+            return
+        to_remove = set(lines)
+        with open(path, 'r', encoding='utf-8') as f:
+            kept = [line for line in f if line not in to_remove]
+        if not kept:
+            os.remove(path)
+            return
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(kept)
+        os.replace(tmp_path, path)
+
+    def _read_object(self, obj_hash: str) -> Any:
+        with open(self._object_path(obj_hash), 'rb') as f:
+            return pickle.loads(gzip.decompress(f.read()))
+
+    def _load_index(self, bundle_date: str) -> Dict[str, str]:
+        path = self._bundle_path(bundle_date)
+        index = {}
+        if not os.path.exists(path):
+            return index
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                # 同一调用录制多次时以最后一次为准
+                index[entry['key']] = entry['object']
+        return index
+
+    def _latest_bundle_date(self) -> Optional[str]:
+        """最新的数据包日期；只含日历请求的数据包（如旧版本在非交易日留下的）不计入"""
+        bundle_dir = os.path.join(self.root_dir, 'bundles')
+        dates = sorted((name[:-6] for name in os.listdir(bundle_dir) if name.endswith('.jsonl')), reverse=True)
+        for bundle_date in dates:
+            if not self._calendar_only(bundle_date):
+                return bundle_date
+        return None
+
+    def _calendar_only(self, bundle_date: str) -> bool:
+        with open(self._bundle_path(bundle_date), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if entry.get('func') not in self.CALENDAR_FUNCS:
+                    return False
+        return True
+
+    def _bundle_path(self, bundle_date: str) -> str:
+        return os.path.join(self.root_dir, 'bundles', f"{bundle_date}.jsonl")
+
+    def _object_path(self, obj_hash: str) -> str:
+        return os.path.join(self.root_dir, 'objects', obj_hash[:2], f"{obj_hash}.pkl.gz")
+
+
+class VendorProxy:
+    """对模块/接口对象的透明代理：可调用属性返回经录制层转发的函数，其余属性原样返回。"""
+
+    def __init__(self, recorder: VendorRecorder, target: Any, namespace: str):
+        self._recorder = recorder
+        self._target = target
+        self._namespace = namespace
+
+    def __getattr__(self, attr: str):
+        value = getattr(self._target, attr)
+        if not callable(value) or isinstance(value, type):
+            return value
+        name = f"{self._namespace}.{attr}"
+
+        @functools.wraps(value)
+        def wrapper(*args, **kwargs):
+            return self._recorder.call(name, value, args, kwargs)
+
+        return wrapper
+
+
+# 全局录制层；各模块通过 `from DataManager.VendorRecorder import ak` 使用带录制的 akshare
+vendor_recorder = VendorRecorder()
+ak = vendor_recorder.proxy(akshare, 'akshare')
@@ -1,9 +1,10 @@
-import akshare as ak
+from DataManager.CalendarManager import TradingCalendarAnalyzer
+from DataManager.DataProvider import DataProvider, AkshareProvider
+from DataManager.FetchCache import FetchCache, fetch_cache
 import pandas as pd
 import numpy as np
 from typing import Optional, Dict, Any
 import time
-import os
 
 
 class MainCostDataManager:
@@ -12,51 +13,52 @@ class MainCostDataManager:
     提供主力成本、机构参与度等相关数据的获取、分析和管理功能
     """
 
-    def __init__(self, cache_enabled: bool = True, cache_dir: str = "~/Downloads/CoreNews_Reports"):
+    def __init__(self, cache_enabled: bool = True, cache_dir: str = "~/Downloads/CoreNews_Reports",
+                 provider: DataProvider = None):
         """
         初始化主力成本数据管理器
 
         Args:
             cache_enabled: 是否启用缓存
-            cache_dir: 缓存目录
+            cache_dir: 缓存目录（全局接口缓存已配置时使用全局缓存，此目录不再使用）
+            provider: 行情数据源，默认 akshare
         """
         self.cache_enabled = cache_enabled
         self.cache_dir = cache_dir
-        if cache_enabled and not os.path.exists(cache_dir):
-            os.makedirs(cache_dir)
+        self.provider = provider or AkshareProvider()
+        self._own_cache = None
 
-    def get_main_cost_data(self) -> pd.DataFrame:
+    @property
+    def cache(self) -> Optional[FetchCache]:
+        """全局接口缓存已配置时与其他数据源共用；否则在 cache_dir 下单独建一个"""
+        if not self.cache_enabled:
+            return None
+        if fetch_cache.enabled:
+            return fetch_cache
+        if self._own_cache is None:
+            self._own_cache = FetchCache(self.cache_dir)
+        return self._own_cache
+
+    def get_main_cost_data(self, trade_date: str = None) -> pd.DataFrame:
         """
         获取主力成本数据
 
+        Args:
+            trade_date: 缓存所属交易日（YYYY-MM-DD），默认取最近交易日，周末运行沿用上一交易日的缓存
+
         Returns:
             DataFrame: 包含代码、主力成本、机构参与度等字段的数据
         """
-        cache_file = os.path.join(self.cache_dir,
-                                  f"main_cost_data_{pd.Timestamp.now().date()}.csv") if self.cache_enabled else None
-
-        # 检查缓存
-        if self.cache_enabled and cache_file and os.path.exists(cache_file):
-            try:
-                df = pd.read_csv(cache_file)
-                print(f"从缓存加载主力成本数据: {cache_file}")
-                return df
-            except Exception as e:
-                print(f"读取缓存失败: {e}")
-
-        # 获取数据
-        print("正在获取主力成本数据...")
-        df = ak.stock_comment_em()
-
-        # 缓存数据
-        if self.cache_enabled and cache_file:
-            try:
-                df.to_csv(cache_file, index=False)
-                print(f"主力成本数据已缓存: {cache_file}")
-            except Exception as e:
-                print(f"缓存数据失败: {e}")
-
-        return df
+        def fetch() -> pd.DataFrame:
+            print("正在获取主力成本数据...")
+            return self.provider.cost_data()
+
+        cache = self.cache
+        if cache is None:
+            return fetch()
+        trade_date = trade_date or TradingCalendarAnalyzer(provider=self.provider).get_last_trading_day()
+        df = cache.fetch('main_cost_data', trade_date, fetch)
+        return df if df is not None else pd.DataFrame()
 
     def analyze_cost_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -0,0 +1,207 @@
+import argparse
+import time
+from statistics import NormalDist
+from typing import Dict, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from Backtester import MarketPanel, StrategySignalLoader
+from SignalBackfill import SIGNAL_COLUMN_MAP
+
+# 默认统计的前瞻交易日数
+DEFAULT_HORIZONS = (1, 3, 5, 10, 20)
+
+# 文字信号列：每个不同的信号文字各自作为一类事件（DIF 数值列除外）
+TEXT_SIGNAL_COLUMNS = [col for col in SIGNAL_COLUMN_MAP if not col.endswith('_dif')]
+
+# 是/否 标记列：取值为“是”的记录作为事件
+FLAG_COLUMNS = ['is_strong_stock', 'is_vol_price_rise', 'is_top10_industry', 'is_full_bullish']
+
+# 全部报告记录作为对照组的信号列名
+BASELINE = '全部记录'
+
+
+def normalize_labels(values: pd.Series) -> pd.Series:
+    """信号文字去掉括号里的数值与“=数值”（如 'KDJ 底背离金叉 (K=21.3, J=-4.0)'、'RSI=45.2'），同类信号归为一组"""
+    labels = values.fillna('').astype(str)
+    labels = labels.str.replace(r'\s*\([^)]*\)\s*$', '', regex=True).str.replace(r'=\s*-?[\d.]+', '', regex=True)
+    return labels.str.strip()
+
+
+class SignalEventStudy:
+    """
+    信号事件研究
+    把 app_stock_strategy_report 中每条 (股票, 归档日, 信号) 记录视为一次事件，以归档日收盘价为基准，
+    一次性取出所有事件之后 1..max(horizons) 个交易日的前复权收盘价路径（停牌日沿用最近收盘价），
+    得到各持有期的前瞻收益与期间最大回撤，再按 信号列 × 信号文字 × 持有期 分组统计：
+    事件数、胜率、平均收益、收益中位数、平均/最差回撤与平均收益的置信区间。
+    """
+
+    def __init__(self, horizons: Sequence[int] = DEFAULT_HORIZONS, confidence: float = 0.95):
+        self.horizons = sorted(int(h) for h in horizons)
+        self.confidence = confidence
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+    def forward_paths(self, market: MarketPanel, reports: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """
+        各事件的前瞻收益与期间回撤：返回 持有期 -> (事件数,) 数组，键为 'ret_h' / 'dd_h'。
+        归档日不在行情日历内或当日无收盘价的事件、以及尚未走完持有期的部分为 NaN。
+        """
+        n_days = market.shape[0]
+        day = pd.Index(market.dates).get_indexer(
+            pd.to_datetime(reports['archive_date']).to_numpy(dtype='datetime64[ns]'))
+        col = pd.Index(market.codes).get_indexer(reports['stock_code'].astype(str).str.extract(r'(\d{6})', expand=False))
+        ok = (day >= 0) & (col >= 0)
+        day, col = np.where(ok, day, 0), np.where(ok, col, 0)
+
+        base = np.where(ok, market.mark[day, col], np.nan)
+        steps = np.arange(1, self.horizons[-1] + 1)
+        days = day[:, None] + steps[None, :]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            path = market.mark[np.minimum(days, n_days - 1), col[:, None]] / base[:, None] - 1
+        path[days >= n_days] = np.nan
+        worst = np.minimum.accumulate(np.fmin(path, 0.0), axis=1)
+
+        out = {}
+        for h in self.horizons:
+            out[f'ret_{h}'] = path[:, h - 1]
+            # 回撤只在整个持有期都有价格时给出，与收益同口径
+            out[f'dd_{h}'] = np.where(np.isnan(path[:, h - 1]), np.nan, worst[:, h - 1])
+        return out
+
+    @staticmethod
+    def events(reports: pd.DataFrame) -> pd.DataFrame:
+        """报告记录展开为 (记录序号, 信号列, 信号) 事件表；同一条记录在每个有信号的列各算一次，另计入对照组"""
+        parts = [pd.DataFrame({'row': np.arange(len(reports)), '信号列': BASELINE, '信号': BASELINE})]
+        for col in TEXT_SIGNAL_COLUMNS:
+            if col not in reports.columns:
+                continue
+            labels = normalize_labels(reports[col]).to_numpy()
+            rows = np.flatnonzero(labels != '')
+            parts.append(pd.DataFrame({'row': rows, '信号列': col, '信号': labels[rows]}))
+        for col in FLAG_COLUMNS:
+            if col not in reports.columns:
+                continue
+            rows = np.flatnonzero((reports[col].astype(str).str.strip() == '是').to_numpy())
+            parts.append(pd.DataFrame({'row': rows, '信号列': col, '信号': '是'}))
+        return pd.concat(parts, ignore_index=True)
+
+    def summarize(self, events: pd.DataFrame, paths: Dict[str, np.ndarray]) -> pd.DataFrame:
+        """按 信号列 × 信号 × 持有期 分组统计"""
+        rows = events['row'].to_numpy()
+        frames = []
+        for h in self.horizons:
+            ret, dd = paths[f'ret_{h}'][rows], paths[f'dd_{h}'][rows]
+            df = pd.DataFrame({'信号列': events['信号列'].to_numpy(), '信号': events['信号'].to_numpy(),
+                               'ret': ret, 'win': np.where(np.isnan(ret), np.nan, ret > 0), 'dd': dd})
+            df = df[~np.isnan(ret)]
+            grouped = df.groupby(['信号列', '信号'], sort=False)
+            stats = grouped.agg(事件数=('ret', 'size'), 胜率=('win', 'mean'), 平均收益=('ret', 'mean'),
+                                收益中位数=('ret', 'median'), 收益标准差=('ret', 'std'),
+                                平均最大回撤=('dd', 'mean'), 最差回撤=('dd', 'min')).reset_index()
+            half = self.z * stats['收益标准差'] / np.sqrt(stats['事件数'])
+            stats['置信下限'] = stats['平均收益'] - half
+            stats['置信上限'] = stats['平均收益'] + half
+            stats.insert(2, '持有天数', h)
+            frames.append(stats)
+        if not frames:
+            return pd.DataFrame()
+        result = pd.concat(frames, ignore_index=True)
+        order = {col: i for i, col in enumerate([BASELINE] + TEXT_SIGNAL_COLUMNS + FLAG_COLUMNS)}
+        result['_order'] = result['信号列'].map(order)
+        return (result.sort_values(['_order', '信号', '持有天数'], ignore_index=True)
+                .drop(columns='_order'))
+
+    def run(self, market: MarketPanel, reports: pd.DataFrame) -> pd.DataFrame:
+        started = time.time()
+        paths = self.forward_paths(market, reports)
+        events = self.events(reports)
+        result = self.summarize(events, paths)
+        print(f"[INFO] 信号事件研究: {len(reports)} 条报告记录展开为 {len(events)} 个事件，"
+              f"{result[['信号列', '信号']].drop_duplicates().shape[0] if not result.empty else 0} 类信号，"
+              f"耗时 {time.time() - started:.2f}s。")
+        return result
+
+
+def load_reports(engine, start_date: str, end_date: str) -> pd.DataFrame:
+    """读取区间内的报告记录（代码、日期与全部信号列）"""
+    columns = ', '.join(f'"{col}"' for col in ['archive_date', 'stock_code'] + TEXT_SIGNAL_COLUMNS + FLAG_COLUMNS)
+    with engine.connect() as conn:
+        return pd.read_sql(text(f"""
+            SELECT {columns} FROM app_stock_strategy_report
+            WHERE archive_date BETWEEN :start AND :end
+        """), conn, params={'start': start_date, 'end': end_date})
+
+
+def _self_check():
+    """测试代码：合成行情与随机信号上，向量化统计与逐事件计算一致"""
+    from DataManager.DataProvider import FakeMarketProvider
+
+    mk = FakeMarketProvider(n_symbols=2000, n_days=500, seed=5).market
+    market = MarketPanel(mk['dates'], list(mk['codes']), mk['open'] * mk['adj_ratio'],
+                         mk['close'] * mk['adj_ratio'], mk['adj_ratio'])
+    rng = np.random.default_rng(3)
+    n = 200000
+    reports = pd.DataFrame({
+        'archive_date': np.asarray(mk['dates'])[rng.integers(0, len(mk['dates']), n)],
+        'stock_code': np.asarray(mk['codes'])[rng.integers(0, len(mk['codes']), n)],
+        'kdj_signal': rng.choice(['', '底背离金叉 (K=21.3, J=-4.0)', '低位超卖金叉 (K=15.0, J=8.1)'], n),
+        'rsi_signal': rng.choice(['RSI=45.2', 'RSI底背离! (28.1)', ''], n),
+        'is_strong_stock': rng.choice(['是', '否'], n),
+    }).drop_duplicates(['archive_date', 'stock_code'], ignore_index=True)
+
+    study = SignalEventStudy()
+    result = study.run(market, reports)
+    print(result[result['持有天数'] == 5].to_string())
+
+    # 逐事件对照：取若干事件按定义直接计算
+    day_of = {d: i for i, d in enumerate(market.dates)}
+    paths = study.forward_paths(market, reports)
+    for i in rng.integers(0, len(reports), 200):
+        d, c = day_of[np.datetime64(reports['archive_date'][i], 'ns')], market.column_of[reports['stock_code'][i]]
+        for h in study.horizons:
+            if d + h >= market.shape[0]:
+                assert np.isnan(paths[f'ret_{h}'][i])
+                continue
+            seg = market.mark[d + 1:d + h + 1, c] / market.mark[d, c] - 1
+            assert np.isclose(paths[f'ret_{h}'][i], seg[-1]) and np.isclose(paths[f'dd_{h}'][i], min(seg.min(), 0.0))
+
+    ret5 = pd.Series(paths['ret_5'])
+    kdj = normalize_labels(reports['kdj_signal'])
+    picked = ret5[(kdj == '底背离金叉').to_numpy()].dropna()
+    row = result[(result['信号列'] == 'kdj_signal') & (result['信号'] == '底背离金叉') & (result['持有天数'] == 5)].iloc[0]
+    assert row['事件数'] == len(picked) and np.isclose(row['平均收益'], picked.mean())
+    assert np.isclose(row['收益中位数'], picked.median()) and np.isclose(row['胜率'], (picked > 0).mean())
+    print("[INFO] 向量化统计与逐事件计算一致。")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='信号事件研究：报告信号的前瞻收益统计')
+    parser.add_argument('start_date', nargs='?', help='归档起始日期 YYYY-MM-DD')
+    parser.add_argument('end_date', nargs='?', help='归档截止日期 YYYY-MM-DD')
+    parser.add_argument('--horizons', default=','.join(map(str, DEFAULT_HORIZONS)), help='前瞻交易日数，逗号分隔')
+    parser.add_argument('--confidence', type=float, default=0.95, help='平均收益置信区间的置信水平')
+    parser.add_argument('--output', default='signal_event_study.xlsx', help='结果 Excel 路径')
+    parser.add_argument('--self-check', action='store_true', help='用合成行情运行自检')
+    args = parser.parse_args()
+
+    if args.self_check:
+        _self_check()
+    else:
+        if not (args.start_date and args.end_date):
+            parser.error('需要 start_date 与 end_date')
+        from sqlalchemy import create_engine
+        from ConfigParser import Config
+
+        config = Config()
+        db_engine = create_engine(config.get_db_connection_string())
+        event_study = SignalEventStudy([int(h) for h in args.horizons.split(',')], args.confidence)
+        report_rows = load_reports(db_engine, args.start_date, args.end_date)
+        # 行情多取一段，覆盖截止日之后最长持有期的交易日
+        kline_end = (pd.Timestamp(args.end_date) + pd.Timedelta(days=event_study.horizons[-1] * 2 + 10)).date()
+        panel = StrategySignalLoader(db_engine).load_market(args.start_date, str(kline_end))
+        summary = event_study.run(panel, report_rows)
+        summary.to_excel(args.output, sheet_name='事件研究', index=False)
+        print(f"[INFO] 信号事件研究结果已保存: {args.output}")
@@ -0,0 +1,72 @@
+from typing import Dict, Iterable, List, Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+class FeatureAssembler:
+    """
+    汇总报告的特征拼装层
+    以股票池为基准行（按股票代码定位），每个数据源只按连接键建一次索引（同键保留首条），
+    一次对齐到全部基准行后按列登记；所有列拼装完成后才生成一张 DataFrame，
+    避免逐个 merge 时每一步都复制一遍不断变宽的汇总表。
+    数据源也可按其他基准列（如股票简称）对齐，语义与以该列左连接相同。
+    """
+
+    def __init__(self, codes: Sequence[str], key: str = '股票代码'):
+        self.key = key
+        self.codes = pd.Index(pd.Series(list(codes), dtype=str).str.zfill(6), name=key)
+        self._columns: Dict[str, pd.Series] = {key: pd.Series(self.codes, dtype=str)}
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._columns
+
+    def __getitem__(self, name: str) -> pd.Series:
+        return self._columns[name]
+
+    def __setitem__(self, name: str, values):
+        """登记一列：标量广播到全部基准行，数组须与基准行等长"""
+        if np.isscalar(values):
+            values = pd.Series([values] * len(self.codes))
+        elif not isinstance(values, pd.Series):
+            values = pd.Series(values)
+        self._columns[name] = values.reset_index(drop=True)
+
+    def align(self, source: pd.DataFrame, columns: Iterable[str], on: str = None,
+              by: str = None) -> pd.DataFrame:
+        """
+        把 source 的 columns 对齐到基准行：source 以 on 列（默认股票代码）为键去重建索引，
+        按基准行的 by 列（默认股票代码）取值；无匹配的行为缺失值。
+        """
+        on = on or self.key
+        columns = [col for col in columns if col != on]
+        keys = self._columns[by or self.key]
+        indexed = source.drop_duplicates(subset=[on], keep='first').set_index(on)[columns]
+        aligned = indexed.reindex(pd.Index(keys))
+        aligned.index = pd.RangeIndex(len(keys))
+        return aligned
+
+    def add(self, source: pd.DataFrame, columns: Iterable[str], on: str = None, by: str = None,
+            rename: Mapping[str, str] = None) -> List[str]:
+        """对齐并登记 source 的列（可重命名），返回登记的列名"""
+        aligned = self.align(source, columns, on, by)
+        rename = rename or {}
+        added = []
+        for col in aligned.columns:
+            name = rename.get(col, col)
+            self._columns[name] = aligned[col]
+            added.append(name)
+        return added
+
+    def flag(self, name: str, codes: Iterable[str], yes: str = '是', no: str = '否'):
+        """代码在 codes 中的基准行标记为 yes，其余为 no"""
+        hit = self._columns[self.key].isin(set(codes))
+        self._columns[name] = pd.Series(np.where(hit, yes, no))
+
+    def frame(self, columns: Iterable[str] = None) -> pd.DataFrame:
+        """一次性生成汇总表（默认全部已登记的列，按登记顺序）"""
+        names = list(self._columns) if columns is None else [col for col in columns if col in self._columns]
+        return pd.DataFrame({name: self._columns[name] for name in names})
@@ -1,7 +1,7 @@
 import os
-import akshare as ak
+from DataManager.VendorRecorder import ak, vendor_recorder
+from DataManager.FetchCache import fetch_cache
 import pandas as pd
-import datetime
 import time
 from DataManager.CalendarManager import TradingCalendarAnalyzer
 
@@ -9,22 +9,35 @@ import urllib3.util
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import URL
 import tushare as ts
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import json
-from typing import List, Set, Optional
+from typing import Dict, List, Set, Optional
 from FormatManager.ShareCodeFormatMgr import format_stock_code
 from ConfigParser import Config
+from DataManager.KlineBulkLoader import KlineBulkLoader
+from DataManager.AdjFactorStore import AdjFactorStore
+from DataManager.FetchScheduler import FetchScheduler, EndpointPolicy
+from DataManager.KlineParquetStore import KlineParquetStore
+from DataManager.FetchJournal import FetchJournal
+from DataManager.RunManifest import RunManifest
+from DataManager.DataProvider import DataProvider, create_provider
 
 
 class StockSyncEngine:
     AKSHARE_RETRIES = 3
     AKSHARE_DELAY = 5
+    KLINE_ENDPOINT = 'stock_zh_a_hist_tx'
+    MANIFEST_JOB = 'kline_sync'
+    # 同步逻辑或落库口径变化时递增，使旧的运行清单失效
+    SYNC_VERSION = 1
 
-    def __init__(self, config_file: str = "config.ini"):
+    def __init__(self, config_file: str = "config.ini", provider: DataProvider = None):
 
         self.config_file = config_file
         self.config = Config(config_file=config_file)
         self.token = self.config.TUSHARE_TOKEN
+        vendor_recorder.configure_from_config(self.config)
+        fetch_cache.configure_from_config(self.config)
+        # 行情数据源（akshare / tushare / 本地合成），可由调用方传入以共用同一实例
+        self.provider = provider or create_provider(self.config)
 
         url_object = URL.create(
             "postgresql+psycopg2",
@@ -54,9 +67,21 @@ class StockSyncEngine:
             print(f"  - 错误详情: {type(e).__name__}: {e}")
             raise RuntimeError("数据库引擎初始化失败，程序无法继续。") from e
 
+        self.kline_loader = KlineBulkLoader(self.db, workers=self.config.DB_COPY_WORKERS)
+        # K线与复权因子下载统一经调度器限速、自适应并发与重试
+        self.fetch_scheduler = FetchScheduler.from_config(self.config, name='kline')
+        kline_policy = EndpointPolicy(retries=self.config.DATA_FETCH_RETRIES, base_delay=1.0)
+        self.fetch_scheduler.register_endpoint(self.KLINE_ENDPOINT, kline_policy)
+        self.fetch_scheduler.register_endpoint(AdjFactorStore.FACTOR_ENDPOINT, kline_policy)
+        self.factor_store = AdjFactorStore(self.db, scheduler=self.fetch_scheduler, provider=self.provider)
+        self.run_manifest = RunManifest(self.db)
+
         self.global_start = "20250301"
-        self.today = datetime.datetime.now().strftime("%Y%m%d")
-        self.today_dt = pd.to_datetime(self.today).normalize()
+        # 缓存与输出文件统一按最近交易日命名：周末、节假日运行沿用上一交易日的缓存与文件
+        self.calendar = TradingCalendarAnalyzer(provider=self.provider)
+        self._set_session(self.calendar.get_last_trading_day())
+        vendor_recorder.use_session(self.today_str)
+        self.sync_mode = self.config.KLINE_SYNC_MODE
 
         # 修复路径初始化问题：使用配置中的临时目录而不是URL对象
         self.base_data_dir = self.config.TEMP_DATA_DIRECTORY
@@ -68,20 +93,15 @@ class StockSyncEngine:
             f"主力研报盈利预测_完整数据_{self.today}_已处理.csv"
         )
 
-        self.report_filtered_symbols_cache_path = os.path.join(
-            self.base_data_dir,
-            f"report_qualified_pure_symbols_{self.today}.json"
-        )
-
-        self.raw_report_cache_path = os.path.join(
-            self.base_data_dir,
-            f"主力研报盈利预测_经清洗_{self.today}.txt"
-        )
+        # 本地K线列式库（Parquet，按 symbol/year 分区），替代每日整表 CSV 缓存
+        self.kline_store = KlineParquetStore(self.config.KLINE_STORE_DIR)
 
-        self.kline_cache_path = os.path.join(
-            self.base_data_dir,
-            f"股票K线数据_已处理_{self.today}.csv"
-        )
+    def _set_session(self, session_date: str):
+        """设定运行所属交易日：today_str 为 YYYY-MM-DD（与 StockAnalyzer 一致），today / end_date 为 YYYYMMDD"""
+        self.today_dt = pd.to_datetime(session_date).normalize()
+        self.today_str = self.today_dt.strftime("%Y-%m-%d")
+        self.today = self.today_dt.strftime("%Y%m%d")
+        self.end_date = self.today
 
     def get_main_board_pool(self) -> pd.DataFrame:
         """
@@ -94,8 +114,8 @@ class StockSyncEngine:
             print("[ERROR] 无法导入 Ts_GetStockBasicinfo 模块")
             return pd.DataFrame(columns=['ts_code', 'name', 'industry', '股票代码'])
 
-        date_suffix = self.today
-        filename = f"StockIndes_{date_suffix}.txt"
+        # 与 StockAnalyzer 读取行业字典时的文件名一致
+        filename = f"StockIndes_{self.today_str}.txt"
         dict_file_path = os.path.join(self.base_data_dir, filename)
 
         stock_index_df = pd.DataFrame()
@@ -104,7 +124,7 @@ class StockSyncEngine:
         if not os.path.exists(dict_file_path):
             print(f"[INFO] 未发现本地文件: {dict_file_path}，尝试通过 Tushare 获取。")
             try:
-                manager = TushareStockManager(self.token)
+                manager = TushareStockManager(self.token, provider=self.provider)
                 stock_index_df = manager.get_basic_data(list_status='L', market='主板', save_path=dict_file_path)
                 print(f"[INFO] 股票字典保存至: {dict_file_path}")
             except Exception as e:
@@ -153,9 +173,9 @@ class StockSyncEngine:
 
         return stock_index_df[required_cols]
 
-    def _safe_ak_fetch(self, fetch_func: callable, description: str, cleaned_file_path: str = None,
+    def _safe_ak_fetch(self, fetch_func: callable, description: str, cache_source: str = None,
                        **kwargs) -> pd.DataFrame:
-        """带重试、缓存、清洗的 Akshare 数据获取。"""
+        """带重试、清洗的 Akshare 数据获取；给出 cache_source 时经统一缓存按 (数据源, 当日) 缓存清洗后的数据。"""
 
         def _standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
             if df.empty:
@@ -167,83 +187,57 @@ class StockSyncEngine:
                 df.rename(columns={'名称': '股票简称'}, inplace=True)
             return df
 
-        # 1. 尝试加载清洗后的缓存
-        if cleaned_file_path and os.path.exists(cleaned_file_path):
-            try:
-                df = pd.read_csv(
-                    cleaned_file_path,
-                    sep='|',
-                    encoding='utf-8-sig',
-                    dtype={
-                        '股票代码': str, '股票简称': str,
-                        '机构投资评级(近六个月)-买入': float,
-                        '2024预测每股收益': float, '2025预测每股收益': float
-                    }
-                )
-                df = _standardize_columns(df)
-                print(f"  -  从缓存加载: {os.path.basename(cleaned_file_path)}")
-                return df
-            except Exception as e:
-                print(f"[WARN] 加载缓存失败: {e}，将重试获取")
-
-        df = pd.DataFrame()
-        for i in range(self.AKSHARE_RETRIES):
-            try:
-                print(f"  - 正在尝试第 {i + 1}/{self.AKSHARE_RETRIES} 次: {description}...")
-                df = fetch_func(**kwargs)
-                if df is not None and not df.empty:
-                    df = _standardize_columns(df)
-                    break
-                time.sleep(self.AKSHARE_DELAY)
-            except Exception as e:
-                print(f"[ERROR] 获取 {description} 失败: {e}，将在 {self.AKSHARE_DELAY} 秒后重试")
-                time.sleep(self.AKSHARE_DELAY)
-
-        if df.empty:
-            print(f"[CRITICAL] 所有重试失败，未能获取 {description}")
-            return pd.DataFrame()
-
-        # 清洗 + 保存到缓存
-        if '股票代码' in df.columns:
-            df['股票代码'] = df['股票代码'].astype(str).str.zfill(6)
-            df = df.drop_duplicates(subset=['股票代码'])
-
-        if cleaned_file_path and not df.empty:
-            try:
-                df.to_csv(cleaned_file_path, sep='|', index=False, encoding='utf-8-sig')
-                print(f"  -  保存 {description} 至缓存: {os.path.basename(cleaned_file_path)}")
-            except Exception as e:
-                print(f"[ERROR] 保存缓存失败: {e}")
+        def fetch_and_clean() -> pd.DataFrame:
+            df = pd.DataFrame()
+            for i in range(self.AKSHARE_RETRIES):
+                try:
+                    print(f"  - 正在尝试第 {i + 1}/{self.AKSHARE_RETRIES} 次: {description}...")
+                    df = fetch_func(**kwargs)
+                    if df is not None and not df.empty:
+                        df = _standardize_columns(df)
+                        break
+                    time.sleep(self.AKSHARE_DELAY)
+                except Exception as e:
+                    print(f"[ERROR] 获取 {description} 失败: {e}，将在 {self.AKSHARE_DELAY} 秒后重试")
+                    time.sleep(self.AKSHARE_DELAY)
+
+            if df is None or df.empty:
+                print(f"[CRITICAL] 所有重试失败，未能获取 {description}")
+                return pd.DataFrame()
+
+            # 清洗
+            if '股票代码' in df.columns:
+                df['股票代码'] = df['股票代码'].astype(str).str.zfill(6)
+                df = df.drop_duplicates(subset=['股票代码'])
+            return df
 
-        return df
+        if not cache_source:
+            return fetch_and_clean()
+        df = fetch_cache.fetch(cache_source, self.today_str, fetch_and_clean)
+        return df if df is not None else pd.DataFrame()
 
     def _get_research_report_filtered_symbols(self) -> Set[str]:
         """
         获取研报"机构投资评级(近六个月)-买入" > 1 的股票代码集合。
-        返回纯数字代码（如 '000001'）。
+        返回纯数字代码（如 '000001'）。过滤结果按当日缓存，未取到研报数据时不缓存。
         """
         print("\n>>> 正在获取主力研报盈利预测并进行过滤...")
+        cached = fetch_cache.fetch("研报买入过滤", self.today_str, self._filter_research_report_symbols, codec='json')
+        if cached is None:
+            print("[WARNING] 未获取到研报数据，返回空集合")
+            return set()
+        return set(cached)
 
-        # 1. 从缓存加载过滤结果
-        if os.path.exists(self.report_filtered_symbols_cache_path):
-            try:
-                with open(self.report_filtered_symbols_cache_path, 'r', encoding='utf-8') as f:
-                    cached = set(json.load(f))
-                print(f"[INFO] 从缓存加载 {len(cached)} 只符合条件的股票。")
-                return cached
-            except Exception as e:
-                print(f"[WARN] 加载缓存失败: {e}")
-
-        # 2. 获取原始数据
+    def _filter_research_report_symbols(self) -> Optional[List[str]]:
+        # 1. 获取原始数据
         report_df = self._safe_ak_fetch(
-            fetch_func=ak.stock_profit_forecast_em,
+            fetch_func=self.provider.profit_forecast,
             description="主力研报盈利预测",
-            cleaned_file_path=self.raw_report_cache_path
+            cache_source="主力研报盈利预测"
         )
 
         if report_df.empty:
-            print("[WARNING] 未获取到研报数据，返回空集合")
-            return set()
+            return None
 
         # 标准化列名
         if '股票代码' not in report_df.columns:
@@ -260,62 +254,218 @@ class StockSyncEngine:
                                                                  errors='coerce').fillna(0)
         qualified = report_df[report_df['机构投资评级(近六个月)-买入'] > 1]['股票代码'].unique()
 
-        result = set(qualified)
+        result = sorted(set(qualified))
         print(f"[INFO] 过滤后剩余 {len(result)} 只符合条件的股票。")
-
-        # 保存缓存
-        try:
-            with open(self.report_filtered_symbols_cache_path, 'w', encoding='utf-8') as f:
-                json.dump(list(result), f, ensure_ascii=False, indent=4)
-            print(f"[INFO] 研报过滤结果已保存至: {self.report_filtered_symbols_cache_path}")
-        except Exception as e:
-            print(f"[ERROR] 保存缓存失败: {e}")
-
         return result
 
-    def _fetch_kline_for_symbol(self, symbol: str) -> pd.DataFrame:
-        """获取单个股票的前复权 + 不复权数据，合并输出"""
+    def _fetch_raw_kline(self, symbol: str, start_date: str = None) -> Optional[pd.DataFrame]:
+        """获取单个股票的不复权K线（start_date 为空时从 global_start 全量获取），前复权价格由复权因子推导。"""
+        start_date = start_date or self.global_start
         try:
-            df_qfq = ak.stock_zh_a_hist_tx(symbol=symbol, start_date=self.global_start, end_date=self.today,
-                                           adjust="qfq")
-            time.sleep(0.05)
-            if df_qfq.empty:
+            df = self.fetch_scheduler.call(self.KLINE_ENDPOINT, self.provider.kline,
+                                           symbol=symbol, start_date=start_date, end_date=self.end_date, adjust="")
+            if df is None or df.empty:
                 return None
 
             expected_cols = ['date', 'open', 'close', 'high', 'low']
-            missing = [c for c in expected_cols if c not in df_qfq.columns]
+            missing = [c for c in expected_cols if c not in df.columns]
             if missing:
-                print(f"[ERROR] QFQ 数据缺失列: {missing}")
-                return None
-
-            df_norm = ak.stock_zh_a_hist_tx(symbol=symbol, start_date=self.global_start, end_date=self.today, adjust="")
-            time.sleep(0.05)
-            if df_norm.empty:
-                return None
-
-            df_norm = df_norm[['date', 'close']].rename(columns={'close': 'close_normal'})
-            df = pd.merge(df_qfq, df_norm, on='date', how='inner')
-            if df.empty:
+                print(f"[ERROR] 不复权数据缺失列: {missing}")
                 return None
 
-            df['close'] = pd.to_numeric(df['close'])
-            df['close_normal'] = pd.to_numeric(df['close_normal'])
-            df['adj_ratio'] = df['close'] / df['close_normal'].replace(0, pd.NA)
-            df.dropna(subset=['adj_ratio'], inplace=True)
+            for col in ['open', 'close', 'high', 'low']:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+            df = df[df['close'] > 0].copy()
 
             df['symbol'] = format_stock_code(symbol)
-            df['date'] = pd.to_datetime(df['date'])
+            df['date'] = pd.to_datetime(df['date']).dt.normalize()
             df.rename(columns={'date': 'trade_date'}, inplace=True)
-
-            final_cols = [
-                'trade_date', 'symbol', 'open', 'close', 'high', 'low',
-                'close_normal', 'adj_ratio'
-            ]
-            return df[final_cols]
+            return df[['trade_date', 'symbol', 'open', 'close', 'high', 'low']]
         except Exception as e:
             print(f"[ERROR] 获取 {symbol} 数据失败: {e}")
             return None
 
+    def _load_last_kline_state(self, symbols: List[str]) -> Dict[str, dict]:
+        """读取每只股票在库内最后一根K线的交易日与不复权收盘价，用于增量同步与除权检测。"""
+        if not symbols:
+            return {}
+        query = text("""
+            SELECT DISTINCT ON (symbol) symbol, trade_date, close_normal
+            FROM stock_daily_kline
+            WHERE symbol = ANY(:symbols)
+            ORDER BY symbol, trade_date DESC
+        """)
+        try:
+            with self.db.connect() as conn:
+                rows = conn.execute(query, {'symbols': list(symbols)}).fetchall()
+        except Exception as e:
+            print(f"[WARN] 读取库内最后交易日失败: {e}，本次按全量获取。")
+            return {}
+
+        return {
+            symbol: {'trade_date': pd.to_datetime(trade_date).normalize(), 'close_normal': float(close_normal)}
+            for symbol, trade_date, close_normal in rows if close_normal is not None
+        }
+
+    def _load_prev_close_map(self) -> Dict[str, float]:
+        """
+        一次请求获取全市场实时行情的"昨收"（已按当日除权除息调整），用于判断哪些股票今日除权。
+        返回 {akshare 代码: 昨收}，获取失败返回空字典（此时所有增量股票都会重新下载因子）。
+        """
+        spot_df = self._safe_ak_fetch(self.provider.spot, "A股实时行情（除权检测）")
+        if spot_df.empty or '昨收' not in spot_df.columns or '股票代码' not in spot_df.columns:
+            return {}
+        prev_close = pd.to_numeric(spot_df['昨收'], errors='coerce')
+        symbols = spot_df['股票代码'].astype(str).str.zfill(6).map(format_stock_code)
+        return {sym: float(pc) for sym, pc in zip(symbols, prev_close) if pd.notna(pc) and pc > 0}
+
+    def _is_factor_unchanged(self, new_bars: pd.DataFrame, last_state: dict, prev_close: Optional[float]) -> bool:
+        """
+        库内最后一根K线之后只新增了最新交易日一根K线时，行情"昨收"与库内不复权收盘价一致即说明未除权。
+        其余情况（隔了多根K线、缺行情、非最新交易日运行）无法确认，按已除权处理。
+        """
+        if prev_close is None or len(new_bars) != 1:
+            return False
+        if new_bars['trade_date'].iloc[0] != self.today_dt:
+            return False
+        return abs(prev_close - last_state['close_normal']) < 0.005
+
+    def _sync_symbol_kline(self, symbol: str, last_state: Optional[dict] = None,
+                           prev_close: Optional[float] = None,
+                           factor_df: Optional[pd.DataFrame] = None):
+        """
+        同步单只股票：只下载一次不复权K线（增量时从库内最后交易日开始），按复权因子推导前复权价格。
+        仅当没有库存因子或检测到除权除息时才重新下载因子。
+        返回 (新增K线, 重新下载的因子或 None)；获取失败返回 None。
+        """
+        start_date = last_state['trade_date'].strftime('%Y%m%d') if last_state else None
+        raw_df = self._fetch_raw_kline(symbol, start_date=start_date)
+        if raw_df is None:
+            return None
+
+        new_bars = raw_df[raw_df['trade_date'] > last_state['trade_date']] if last_state else raw_df
+        if new_bars.empty:
+            return new_bars, None
+
+        refreshed = None
+        if factor_df is None or last_state is None or not self._is_factor_unchanged(new_bars, last_state, prev_close):
+            refreshed = self.factor_store.fetch(symbol)
+            if refreshed is None:
+                return None
+            if last_state is not None and factor_df is not None:
+                print(f"[INFO] {symbol} 可能发生除权除息，已重新下载复权因子。")
+            factor_df = refreshed
+
+        df = self.factor_store.apply(new_bars, factor_df)
+        final_cols = ['trade_date', 'symbol', 'open', 'close', 'high', 'low', 'close_normal', 'adj_ratio']
+        return df[final_cols], refreshed
+
+    @staticmethod
+    def _record_journal(journal: FetchJournal, symbol: str, result):
+        """单只股票获取完成后立即落盘并记入完成日志；日志写失败只影响续传，不中断同步。"""
+        kline_df, factor_df = result
+        try:
+            journal.record(symbol, kline_df, factor_df)
+        except Exception as e:
+            print(f"[WARN] 写入完成日志失败（{symbol}）: {e}")
+
+    def _write_kline_to_db(self, df: pd.DataFrame, refreshed_factors: Dict[str, pd.DataFrame] = None):
+        """
+        按同步模式写库（COPY 暂存表 + 单事务落表）：
+        incremental 只 ON CONFLICT 合并本次获取的K线；full 整表替换且保留主键/唯一约束。
+        refreshed_factors 的保存与历史重算和K线写入在同一事务内提交：任一步失败整体回滚，
+        不会出现新K线已落库、历史却停留在旧因子上的情况，下次运行这些股票会重新获取并重算。
+        """
+        rescale = (lambda conn: self._rescale_history(refreshed_factors, conn)) if refreshed_factors else None
+        try:
+            if self.sync_mode == 'incremental':
+                written = self.kline_loader.merge(df, then=rescale)
+            else:
+                written = self.kline_loader.swap(df, then=rescale)
+            print(f"[INFO]  成功将 {written} 条记录写入 'stock_daily_kline' 表（模式: {self.sync_mode}）。")
+        except Exception as e:
+            print(f"[ERROR] 写入数据库/重算前复权价格失败: {e}")
+            raise
+
+    def _rescale_history(self, refreshed_factors: Dict[str, pd.DataFrame], conn):
+        """
+        在写库事务 conn 内保存重新下载的复权因子，并把这些股票已存K线换算到最新因子（除权后无需重下历史）。
+        因子未变化的股票不做任何改写，日常同步的开销与历史长度无关。
+        """
+        rescaled = self.factor_store.save_and_rescale(refreshed_factors, list(refreshed_factors), conn=conn)
+        if rescaled:
+            print(f"[INFO] 已按最新复权因子重算 {rescaled} 条历史K线的前复权价格。")
+
+    def _sync_from_local_store(self, symbols: List[str]) -> bool:
+        """
+        所有股票在本地K线库中都已到目标交易日时，按需部分读取写库并返回 True；否则返回 False 走接口获取。
+        incremental 只读取库内最后交易日之后的K线；full 读取 global_start 起的全部历史。
+        """
+        if not symbols:
+            return False
+        try:
+            store_last = self.kline_store.last_dates(symbols)
+        except Exception as e:
+            print(f"[WARN] 读取本地K线库失败: {e}，改为接口获取。")
+            return False
+        if any(store_last.get(sym) is None or store_last[sym] < self.today_dt for sym in symbols):
+            return False
+
+        print(f"  - ✅ 本地K线库已同步至 {self.today_dt.date()}，直接读取写库。")
+        if self.sync_mode == 'incremental':
+            last_states = self._load_last_kline_state(symbols)
+            if len(last_states) == len(symbols):
+                start_date = min(state['trade_date'] for state in last_states.values())
+            else:
+                start_date = pd.to_datetime(self.global_start)
+            df = self.kline_store.read(symbols, start_date=start_date, end_date=self.today_dt)
+            db_last = df['symbol'].map({sym: state['trade_date'] for sym, state in last_states.items()})
+            df = df[db_last.isna() | (df['trade_date'] > db_last)]
+        else:
+            df = self.kline_store.read(symbols, start_date=self.global_start, end_date=self.today_dt)
+
+        if df.empty:
+            print("[INFO] 库内数据已是最新，无需写入。")
+            return True
+        self._write_kline_to_db(df)
+        print(f"  - 写入数据库条数: {len(df)}")
+        return True
+
+    def _append_to_local_store(self, df: pd.DataFrame, refreshed_factors: Dict[str, pd.DataFrame]):
+        """
+        把本次写库的K线追加进本地K线库；本地库中还没有的股票先从数据库补齐历史，保证本地库是库表的完整镜像。
+        本地库只是加速读取的副本，失败不影响主流程。
+        """
+        try:
+            symbols = sorted(df['symbol'].astype(str).unique())
+            store_last = self.kline_store.last_dates(symbols)
+            missing = [sym for sym in symbols if sym not in store_last]
+            if missing and self.sync_mode == 'incremental':
+                with self.db.connect() as conn:
+                    history = pd.read_sql(text("""
+                        SELECT trade_date, symbol, "open", "close", high, low, close_normal, adj_ratio
+                        FROM stock_daily_kline
+                        WHERE symbol = ANY(:symbols)
+                    """), conn, params={'symbols': missing})
+                for col in ['open', 'close', 'high', 'low', 'close_normal', 'adj_ratio']:
+                    history[col] = history[col].astype(float)
+                self.kline_store.append(history)
+            self.kline_store.append(df)
+            self.kline_store.rescale(refreshed_factors)
+            print(f"[INFO] 本地K线库已追加 {len(df)} 条记录（{len(missing)} 只股票从数据库补齐历史）。")
+        except Exception as e:
+            print(f"[WARN] 写入本地K线库失败: {e}")
+
+    def _save_final_codes(self, codes: Set[str]):
+        final_output_path = os.path.join(self.base_data_dir, f"final_filtered_stocks_{self.today}.txt")
+        try:
+            with open(final_output_path, 'w', encoding='utf-8') as f:
+                for code in sorted(codes):
+                    f.write(f"{code}\n")
+            print(f"[INFO] 最终筛选代码已保存至: {final_output_path}")
+        except Exception as e:
+            print(f"[ERROR] 保存最终代码列表失败: {e}")
+
     def _clear_stock_daily_kline_table(self):
         """清空 stock_daily_kline 表"""
         if self.db is None:
@@ -330,19 +480,18 @@ class StockSyncEngine:
             print(f"[ERROR] 清空失败: {e}")
             raise
 
-    def run_engine(self, target_date: str = None):
-        """主运行函数：研报过滤 + K线数据同步"""
-
-        if target_date is None:
-            target_date = TradingCalendarAnalyzer().get_last_trading_day()
-            pass
-        if target_date is None:
-            target_date = datetime.datetime.now().strftime("%Y%m%d")
+    def run_engine(self, target_date: str = None, resume: bool = None):
+        """
+        主运行函数：研报过滤 + K线数据同步
+        resume 为 True 时跳过上次中断前已落盘的股票（默认取配置 KLINE_FETCH_RESUME）。
+        """
+        if resume is None:
+            resume = self.config.KLINE_FETCH_RESUME
 
-        self.today_str = target_date
-        self.today_dt = pd.to_datetime(target_date).normalize()
+        latest_session = self.calendar.get_last_trading_day()
+        self._set_session(target_date or latest_session)
 
-        print(f"[DEBUG] 数据引擎运行日期: {self.today_str}")
+        print(f"[DEBUG] 数据引擎运行日期: {self.today_str}（同步模式: {self.sync_mode}）")
 
         # Step 1: 获取 Tushare 基础池
         tushare_df = self.get_main_board_pool()
@@ -355,6 +504,9 @@ class StockSyncEngine:
         # Step 2: 获取研报符合条件的股票
         report_codes = self._get_research_report_filtered_symbols()
         if not report_codes:
+            if self.sync_mode == 'incremental':
+                print("[WARNING] 研报过滤后无股票，增量模式下保留库内历史K线，停止任务")
+                return
             print("[WARNING] 研报过滤后无股票，数据库将清空")
             self._clear_stock_daily_kline_table()
             return
@@ -366,59 +518,10 @@ class StockSyncEngine:
             return
         print(f"[INFO] 双重过滤后保留 {len(final_codes)} 只股票。")
 
-        #  Step 4: 缓存检查 → 决定是否重取
-
-        if os.path.exists(self.kline_cache_path):
-            print(f"  - ✅ 缓存文件存在: {os.path.basename(self.kline_cache_path)}")
-            try:
-                df = pd.read_csv(self.kline_cache_path, sep='|', encoding='utf-8-sig')
-                # 确保字段存在
-                expected_cols = ['trade_date', 'symbol', 'open', 'close', 'high', 'low', 'close_normal', 'adj_ratio']
-                missing = [c for c in expected_cols if c not in df.columns]
-                if missing:
-                    print(f"[WARN] 缓存缺少列: {missing}，将重取")
-                    df = pd.DataFrame()
-                else:
-                    # 将 symbol 明确转换为 sh/sz/bj 格式（可选）
-                    df['symbol'] = df['symbol'].astype(str)
-                    print(f"  - ✅ 成功加载缓存，共 {len(df)} 条记录。")
-
-                    try:
-                        df.to_sql(
-                            name='stock_daily_kline',
-                            con=self.db,
-                            if_exists='replace',
-                            index=False,
-                            method='multi',
-                            chunksize=5000
-                        )
-                        print(f"[INFO] ✅ 成功将 {len(df)} 条记录写入 'stock_daily_kline' 表。")
-                    except Exception as e:
-                        print(f"[ERROR] 写入数据库失败: {e}")
-                        raise
-
-                    final_output_path = os.path.join(self.base_data_dir, f"final_filtered_stocks_{self.today}.txt")
-                    try:
-                        with open(final_output_path, 'w', encoding='utf-8') as f:
-                            for code in sorted(final_codes):
-                                f.write(f"{code}\n")
-                        print(f"[INFO] 最终筛选代码已保存至: {final_output_path}")
-                    except Exception as e:
-                        print(f"[ERROR] 保存最终代码列表失败: {e}")
-
-                    print(f"  - 今日日期: {self.today}")
-                    print(f"  - 筛选股票数: {len(final_codes)}")
-                    print(f"  - 写入数据库条数: {len(df)}")
-
-                    return
-
-            except Exception as e:
-                print(f"[WARN] 缓存加载失败: {e}")
-
         filtered_codes = final_codes  # ←  这才是真正的"最终要处理的股票"
         print(f"[INFO]  将获取 {len(filtered_codes)} 只股票的 K 线（基于交集结果）。")
 
-        #  Step 6: 获取最终 Akshare 格式代码
+        #  Step 4: 获取最终 Akshare 格式代码
         akshare_symbols = []
         for code in filtered_codes:
             code_str = code.zfill(6)
@@ -431,65 +534,133 @@ class StockSyncEngine:
             else:
                 print(f"[WARN] 无法识别代码: {code_str}，跳过。")
 
-        #  Step 7: 并发获取 K 线数据（多线程）
-        print(f"[INFO] 正在并发获取 {len(akshare_symbols)} 只股票的 K 线数据...")
+        #  Step 5: 运行清单：同一交易日、同一输入指纹的同步已完成时直接返回，重复/重叠调用不再请求接口与写库
+        fingerprint = self._input_fingerprint(akshare_symbols)
+        if self.run_manifest.is_complete(self.MANIFEST_JOB, self.today_dt, fingerprint):
+            print(f"[INFO] {self.today_dt.date()} 的K线同步已完成（输入指纹 {fingerprint[:12]}），跳过。")
+            self._save_final_codes(filtered_codes)
+            return
+
+        with self.run_manifest.lock(self.MANIFEST_JOB, self.today_dt):
+            # 等锁期间可能已有其他进程完成同一同步
+            if self.run_manifest.is_complete(self.MANIFEST_JOB, self.today_dt, fingerprint):
+                print(f"[INFO] {self.today_dt.date()} 的K线同步已由其他进程完成，跳过。")
+                self._save_final_codes(filtered_codes)
+                return
+
+            self.run_manifest.mark(self.MANIFEST_JOB, self.today_dt, fingerprint, 'running')
+            complete = self._sync_universe(akshare_symbols, filtered_codes, resume, latest_session)
+            status = 'complete' if complete else 'partial'
+            self.run_manifest.mark(self.MANIFEST_JOB, self.today_dt, fingerprint, status,
+                                   detail=f"symbols={len(akshare_symbols)}, mode={self.sync_mode}")
+
+    def _input_fingerprint(self, symbols: List[str]) -> str:
+        """同步输入指纹：股票池 + 同步参数 + 数据源版本。"""
+        return self.run_manifest.fingerprint({
+            'symbols': sorted(symbols),
+            'sync_mode': self.sync_mode,
+            'global_start': self.global_start,
+            'provider': self.provider.name,
+            'sources': {'akshare': getattr(ak, '__version__', 'unknown')},
+            'sync_version': self.SYNC_VERSION,
+        })
+
+    def _sync_universe(self, akshare_symbols: List[str], filtered_codes: Set[str], resume: bool,
+                       latest_session: Optional[str]) -> bool:
+        """
+        同步给定股票池的K线（本地库 → 断点续传 → 接口获取 → 写库）。
+        返回是否全部股票同步成功；有股票获取失败时返回 False，运行清单不记为完成。
+        """
+        #  Step 6: 本地K线库已同步到目标交易日时（如同日重跑），直接从本地库部分读取写库，不再请求接口
+        if self._sync_from_local_store(akshare_symbols):
+            self._save_final_codes(filtered_codes)
+            return True
+
+        #  Step 7: 增量模式下按库内最后交易日决定每只股票的获取区间，已是最新的股票不再请求
+        last_states = self._load_last_kline_state(akshare_symbols) if self.sync_mode == 'incremental' else {}
+        stored_factors = self.factor_store.load(akshare_symbols)
+        # 实时行情的"昨收"只对应最新交易日，补跑历史日期时不用它做除权检测
+        is_latest_session = latest_session is not None and pd.to_datetime(latest_session).normalize() == self.today_dt
+        prev_close_map = self._load_prev_close_map() if last_states and is_latest_session else {}
+        fetch_tasks = {}
+        up_to_date_count, incremental_count = 0, 0
+        for sym in akshare_symbols:
+            state = last_states.get(sym)
+            if state is not None and state['trade_date'] >= self.today_dt:
+                up_to_date_count += 1
+                continue
+            fetch_tasks[sym] = (sym, state, prev_close_map.get(sym), stored_factors.get(sym))
+            if state is not None:
+                incremental_count += 1
+        if self.sync_mode == 'incremental':
+            print(f"[INFO] 增量同步：{up_to_date_count} 只已是最新，{incremental_count} 只增量补齐，"
+                  f"{len(fetch_tasks) - incremental_count} 只首次全量获取。")
+
+        #  Step 7.5: 断点续传：本交易日同模式下已落盘的股票直接从完成日志加载
+        journal = FetchJournal(os.path.join(self.base_data_dir, 'kline_journal'), f"{self.end_date}_{self.sync_mode}")
+        collected = {}
+        if resume:
+            for sym, entry in journal.completed().items():
+                if sym in fetch_tasks:
+                    collected[sym] = journal.load(entry)
+                    del fetch_tasks[sym]
+            if collected:
+                print(f"[INFO] 断点续传：{len(collected)} 只股票已在上次运行中完成，跳过获取。")
+        else:
+            journal.clear()
+
+        #  Step 8: 经调度器并发获取 K 线数据（令牌桶限速 + 自适应并发），每只股票完成即写入完成日志
+        task_symbols = list(fetch_tasks.keys())
+        results = self.fetch_scheduler.map(
+            task_symbols,
+            lambda sym: self._sync_symbol_kline(*fetch_tasks[sym]),
+            desc=f"获取 {len(task_symbols)} 只股票的 K 线",
+            on_result=lambda sym, result: self._record_journal(journal, sym, result)
+        )
+        failed_count = 0
+        for symbol, result in zip(task_symbols, results):
+            if result is None:
+                print(f"[WARN] 获取 {symbol} 的 K 线失败，跳过。")
+                failed_count += 1
+            else:
+                collected[symbol] = result
+
         kline_dfs = []
-        with ThreadPoolExecutor(max_workers=12) as executor:
-            futures = {executor.submit(self._fetch_kline_for_symbol, sym): sym for sym in akshare_symbols}
-            for future in as_completed(futures):
-                result = future.result()
-                symbol = futures[future]
-                if result is not None and not result.empty:
-                    kline_dfs.append(result)
-                else:
-                    print(f"[WARN] 获取 {symbol} 的 K 线失败，跳过。")
-
-        #  Step 8: 合并所有 K 线数据
+        refreshed_factors = {}
+        no_new_bar_count = 0
+        for symbol, (kline_df, factor_df) in collected.items():
+            if factor_df is not None:
+                refreshed_factors[symbol] = factor_df
+            if kline_df.empty:
+                no_new_bar_count += 1
+            else:
+                kline_dfs.append(kline_df)
+        print(f"[INFO] 复权因子：{len(refreshed_factors)} 只重新下载，其余沿用库存因子。")
+
+        #  Step 9: 合并所有 K 线数据
         if not kline_dfs:
+            if self.sync_mode == 'incremental':
+                print(f"[INFO] 无新增 K 线（{no_new_bar_count} 只暂无新数据），库内数据已是最新。")
+                if failed_count == 0:
+                    journal.clear()
+                return failed_count == 0
             print("[WARNING] 所有股票 K 线获取失败，数据库将清空。")
             self._clear_stock_daily_kline_table()
-            return
+            return False
 
         combined_kline_df = pd.concat(kline_dfs, ignore_index=True)
         print(f"[INFO] 成功合并 {len(combined_kline_df)} 条 K 线记录。")
-        try:
-            # 保存为 CSV，不包含 index
-            combined_kline_df.to_csv(
-                self.kline_cache_path,
-                sep='|',
-                index=False,
-                encoding='utf-8-sig'
-            )
-            print(f"[INFO]  K线数据已保存至本地缓存: {os.path.basename(self.kline_cache_path)}")
-        except Exception as e:
-            print(f"[ERROR] 保存 K线数据缓存失败: {e}")
 
-        #  Step 9: 写入数据库
-        try:
-            combined_kline_df.to_sql(
-                name='stock_daily_kline',
-                con=self.db,
-                if_exists='replace',  # 替换已有表
-                index=False,
-                method='multi',
-                chunksize=5000
-            )
-            print(f"[INFO]  成功将 {len(combined_kline_df)} 条记录写入 'stock_daily_kline' 表。")
-        except Exception as e:
-            print(f"[ERROR] 写入数据库失败: {e}")
-            raise
+        #  Step 10: 同一事务内写入K线、保存新因子并重算已存历史的前复权价格，最后同步到本地K线库
+        self._write_kline_to_db(combined_kline_df, refreshed_factors)
+        self._append_to_local_store(combined_kline_df, refreshed_factors)
+        journal.clear()
 
-        print(f"  - 今日日期: {self.today}")
+        print(f"  - 交易日: {self.today_str}")
         print(f"  - 筛选股票数: {len(filtered_codes)}")
-        print(f"  - 成功获取 K 线股票: {len(kline_dfs)}")
+        print(f"  - 成功获取 K 线股票: {len(kline_dfs)}（失败 {failed_count} 只）")
         print(f"  - 写入数据库条数: {len(combined_kline_df)}")
 
         #  可选：保存最终过滤列表
-        final_output_path = os.path.join(self.base_data_dir, f"final_filtered_stocks_{self.today}.txt")
-        try:
-            with open(final_output_path, 'w', encoding='utf-8') as f:
-                for code in sorted(filtered_codes):
-                    f.write(f"{code}\n")
-            print(f"[INFO] 最终筛选代码已保存至: {final_output_path}")
-        except Exception as e:
-            print(f"[ERROR] 保存最终代码列表失败: {e}")
+        self._save_final_codes(filtered_codes)
+        return failed_count == 0
@@ -0,0 +1,310 @@
+import math
+
+import numpy as np
+from numba import njit
+
+# 技术指标编译内核
+# 输入均为 (T, N) 的 C 连续 float64 矩阵：行是K线序号，列是股票（单只股票传入 reshape(-1, 1) 即可）。
+# 外层按行、内层按列遍历，访问连续内存；列首 NaN 视为该股票尚无数据。
+# 口径与 pandas ewm / pandas_ta 默认实现一致，golden 测试见文件末尾。
+
+
+@njit(cache=True, error_model='numpy')
+def ewm_alpha(span: float, alpha: float) -> float:
+    """按 pandas 的换算路径（经 center of mass）得到平滑系数；span 与 alpha 二选一，另一个传 0"""
+    if span > 0:
+        com = (span - 1) / 2.0
+    else:
+        com = (1.0 - alpha) / alpha
+    return 1.0 / (1.0 + com)
+
+
+@njit(cache=True, error_model='numpy')
+def ema(values: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    EMA（adjust=False），运算次序与 pandas ewm 相同：
+    首个有效值作为初值，中途缺失时权重照常衰减、输出沿用上一个值。
+    """
+    n_rows, n_cols = values.shape
+    out = np.empty((n_rows, n_cols))
+    weighted = np.full(n_cols, np.nan)
+    old_wt = np.ones(n_cols)
+    old_wt_factor = 1.0 - alpha
+    for t in range(n_rows):
+        for j in range(n_cols):
+            cur = values[t, j]
+            w = weighted[j]
+            if not math.isnan(w):
+                old_wt[j] *= old_wt_factor
+                if not math.isnan(cur):
+                    w = (old_wt[j] * w + alpha * cur) / (old_wt[j] + alpha)
+                    old_wt[j] = 1.0
+            elif not math.isnan(cur):
+                w = cur
+            weighted[j] = w
+            out[t, j] = w
+    return out
+
+
+@njit(cache=True, error_model='numpy')
+def ema_step(weighted: np.ndarray, values: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    EMA 递推一步（按列）：在上一根的 EMA 上折入新值，与 ema() 连续计算逐位一致
+    （前提是上一根有观测值，此时 pandas 的旧权重已重置为 1）。新值为 NaN 时沿用旧值。
+    """
+    out = np.empty_like(weighted)
+    old_wt = 1.0 - alpha
+    for j in range(weighted.shape[0]):
+        w, cur = weighted[j], values[j]
+        if math.isnan(cur):
+            out[j] = w
+        elif math.isnan(w):
+            out[j] = cur
+        else:
+            out[j] = (old_wt * w + alpha * cur) / (old_wt + alpha)
+    return out
+
+
+@njit(cache=True, error_model='numpy')
+def macd(close: np.ndarray, fast: int, slow: int, signal: int):
+    """返回 (DIF, DEA)：DIF = EMA(fast) - EMA(slow)，DEA = EMA(DIF, signal)"""
+    dif = ema(close, ewm_alpha(fast, 0.0)) - ema(close, ewm_alpha(slow, 0.0))
+    return dif, ema(dif, ewm_alpha(signal, 0.0))
+
+
+@njit(cache=True, error_model='numpy')
+def _rolling_extreme(values: np.ndarray, window: int, take_max: bool) -> np.ndarray:
+    n_rows, n_cols = values.shape
+    out = np.full((n_rows, n_cols), np.nan)
+    for t in range(window - 1, n_rows):
+        for j in range(n_cols):
+            best = values[t, j]
+            for k in range(1, window):
+                v = values[t - k, j]
+                if math.isnan(v) or math.isnan(best):
+                    best = np.nan
+                    break
+                if (v > best) if take_max else (v < best):
+                    best = v
+            out[t, j] = best
+    return out
+
+
+@njit(cache=True, error_model='numpy')
+def rolling_min(values: np.ndarray, window: int) -> np.ndarray:
+    """滚动最小值（窗口内有 NaN 即为 NaN）"""
+    return _rolling_extreme(values, window, False)
+
+
+@njit(cache=True, error_model='numpy')
+def rolling_max(values: np.ndarray, window: int) -> np.ndarray:
+    """滚动最大值（窗口内有 NaN 即为 NaN）"""
+    return _rolling_extreme(values, window, True)
+
+
+@njit(cache=True, error_model='numpy')
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    滚动均值（窗口内有 NaN 即为 NaN）。
+    窗口内数值全部相同时直接取该值（同 pandas），避免求和舍入让收盘价与均线的比较翻转。
+    """
+    n_rows, n_cols = values.shape
+    out = np.full((n_rows, n_cols), np.nan)
+    for t in range(window - 1, n_rows):
+        for j in range(n_cols):
+            cur = values[t, j]
+            total = 0.0
+            flat = True
+            for k in range(window):
+                v = values[t - k, j]
+                total += v
+                if v != cur:
+                    flat = False
+            if not math.isnan(total):
+                out[t, j] = cur if flat else total / window
+    return out
+
+
+@njit(cache=True, error_model='numpy')
+def rolling_nanmean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    滚动均值（忽略 NaN，窗口不满时取已有的行，全为 NaN 时为 NaN）。
+    按时间先后逐行累加，与 numpy 沿第 0 轴求和的次序相同。
+    """
+    n_rows, n_cols = values.shape
+    out = np.full((n_rows, n_cols), np.nan)
+    for t in range(n_rows):
+        first = max(0, t - window + 1)
+        for j in range(n_cols):
+            total = 0.0
+            count = 0
+            for i in range(first, t + 1):
+                v = values[i, j]
+                if not math.isnan(v):
+                    total += v
+                    count += 1
+            if count:
+                out[t, j] = total / count
+    return out
+
+
+@njit(cache=True, error_model='numpy')
+def rolling_std(values: np.ndarray, window: int, ddof: int = 1) -> np.ndarray:
+    """滚动标准差（两遍法，窗口内有 NaN 即为 NaN）"""
+    mean = rolling_mean(values, window)
+    n_rows, n_cols = values.shape
+    out = np.full((n_rows, n_cols), np.nan)
+    for t in range(window - 1, n_rows):
+        for j in range(n_cols):
+            m = mean[t, j]
+            if math.isnan(m):
+                continue
+            total = 0.0
+            for k in range(window):
+                dev = values[t - k, j] - m
+                total += dev * dev
+            out[t, j] = math.sqrt(total / (window - ddof))
+    return out
+
+
+@njit(cache=True, error_model='numpy')
+def stoch_raw(high: np.ndarray, low: np.ndarray, close: np.ndarray, k: int) -> np.ndarray:
+    """
+    未平滑的随机值 100 * (C - 最低) / (最高 - 最低)。
+    区间在某列出现 0 时整列加 epsilon（同 pandas_ta.utils.non_zero_range）。
+    """
+    lowest = rolling_min(low, k)
+    highest = rolling_max(high, k)
+    spread = highest - lowest
+    n_rows, n_cols = close.shape
+    eps = np.finfo(np.float64).eps
+    for j in range(n_cols):
+        has_zero = False
+        for t in range(n_rows):
+            if spread[t, j] == 0:
+                has_zero = True
+                break
+        if has_zero:
+            for t in range(n_rows):
+                spread[t, j] += eps
+    return 100 * (close - lowest) / spread
+
+
+@njit(cache=True, error_model='numpy')
+def stoch_kdj(high: np.ndarray, low: np.ndarray, close: np.ndarray, k: int, d: int, smooth_k: int):
+    """随机指标，返回 (K, D, J)，J = 3K - 2D"""
+    k_line = rolling_mean(stoch_raw(high, low, close, k), smooth_k)
+    d_line = rolling_mean(k_line, d)
+    return k_line, d_line, 3 * k_line - 2 * d_line
+
+
+@njit(cache=True, error_model='numpy')
+def cci(high: np.ndarray, low: np.ndarray, close: np.ndarray, length: int, c: float) -> np.ndarray:
+    """
+    CCI，计算式与 pandas_ta 0.4.71b0 一致（除数只作用于均值：tp - mean / (c * mad)），
+    以保证信号与原 df.ta.cci 的输出相同。
+    """
+    typical = (high + low + close) / 3.0
+    mean = rolling_mean(typical, length)
+    n_rows, n_cols = typical.shape
+    out = np.full((n_rows, n_cols), np.nan)
+    for t in range(length - 1, n_rows):
+        for j in range(n_cols):
+            m = mean[t, j]
+            if math.isnan(m):
+                continue
+            total = 0.0
+            for k in range(length):
+                total += abs(typical[t - k, j] - m)
+            out[t, j] = typical[t, j] - m / (c * (total / length))
+    return out
+
+
+@njit(cache=True, error_model='numpy')
+def rsi(close: np.ndarray, length: int) -> np.ndarray:
+    """Wilder RSI：涨跌幅分别做 alpha = 1/length 的 EMA（即 pandas_ta 的 rma）"""
+    gain_avg, loss_avg = rsi_averages(close, length)
+    return 100 * gain_avg / (gain_avg + np.abs(loss_avg))
+
+
+@njit(cache=True, error_model='numpy')
+def rsi_averages(close: np.ndarray, length: int):
+    """返回 RSI 的 (上涨均值, 下跌均值)，下跌均值为非正数"""
+    n_rows, n_cols = close.shape
+    gain = np.full((n_rows, n_cols), np.nan)
+    loss = np.full((n_rows, n_cols), np.nan)
+    for t in range(1, n_rows):
+        for j in range(n_cols):
+            change = close[t, j] - close[t - 1, j]
+            if not math.isnan(change):
+                gain[t, j] = change if change > 0 else 0.0
+                loss[t, j] = change if change < 0 else 0.0
+    alpha = ewm_alpha(0.0, 1.0 / length)
+    return ema(gain, alpha), ema(loss, alpha)
+
+
+# 测试代码：与 pandas / pandas_ta 的输出逐点比对（MACD 需与同花顺保持小数点后 4 位一致）
+if __name__ == "__main__":
+    import pandas as pd
+    import pandas_ta  # noqa: F401  注册 df.ta
+    from MACDAnalyzer import MACDAnalyzer
+
+    rng = np.random.default_rng(2026)
+    n = 400
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    close[150:170] = close[149]  # 一字板/停牌式的平台，覆盖零区间与窗口全同的情形
+    high = close * (1 + rng.uniform(0, 0.03, n))
+    low = close * (1 - rng.uniform(0, 0.03, n))
+    high[150:170] = low[150:170] = close[150:170]
+    df = pd.DataFrame({'open': close, 'high': high, 'low': low, 'close': close})
+
+    def as_matrix(series):
+        return np.ascontiguousarray(series, dtype=np.float64).reshape(-1, 1)
+
+    H, L, C = as_matrix(high), as_matrix(low), as_matrix(close)
+    checks = {}
+
+    macd_df = MACDAnalyzer._custom_macd(None, df.copy())
+    for name, (fast, slow, signal) in MACDAnalyzer.MACD_PERIODS.items():
+        dif, dea = macd(C, fast, slow, signal)
+        checks[f'DIF_{name}'] = (dif[:, 0], macd_df[f'DIF_{name}'].to_numpy())
+        checks[f'DEA_{name}'] = (dea[:, 0], macd_df[f'DEA_{name}'].to_numpy())
+
+    stoch_df = df.ta.stoch(high='high', low='low', close='close', k=14, d=3, smooth_k=3)
+    k_line, d_line, j_line = stoch_kdj(H, L, C, 14, 3, 3)
+    checks['STOCHk'] = (k_line[:, 0], stoch_df['STOCHk_14_3_3'].to_numpy())
+    checks['STOCHd'] = (d_line[:, 0], stoch_df['STOCHd_14_3_3'].to_numpy())
+    checks['KDJ_J'] = (j_line[:, 0], 3 * stoch_df['STOCHk_14_3_3'].to_numpy() - 2 * stoch_df['STOCHd_14_3_3'].to_numpy())
+
+    checks['CCI'] = (cci(H, L, C, 14, 0.015)[:, 0],
+                     df.ta.cci(high='high', low='low', close='close', length=14).to_numpy())
+    checks['RSI'] = (rsi(C, 14)[:, 0], df.ta.rsi(close='close', length=14).to_numpy())
+
+    bbands_df = df.ta.bbands(close='close', length=20, std=2)
+    mid, std = rolling_mean(C, 20)[:, 0], rolling_std(C, 20, 1)[:, 0]
+    checks['BBL'] = (mid - 2 * std, bbands_df.filter(like='BBL_').iloc[:, 0].to_numpy())
+    checks['BBU'] = (mid + 2 * std, bbands_df.filter(like='BBU_').iloc[:, 0].to_numpy())
+    checks['ROLL_MIN'] = (rolling_min(L, 14)[:, 0], df['low'].rolling(14).min().to_numpy())
+    checks['ROLL_MAX'] = (rolling_max(H, 14)[:, 0], df['high'].rolling(14).max().to_numpy())
+    checks['MA5'] = (rolling_mean(C, 5)[:, 0], df['close'].rolling(5).mean().to_numpy())
+
+    failed = []
+    for name, (got, expected) in checks.items():
+        same_nan = np.array_equal(np.isnan(got), np.isnan(expected))
+        valid = ~np.isnan(expected)
+        # 整个窗口价格完全相同时 CCI 的平均偏差理论上为 0：pandas_ta 得到由舍入误差决定的极大值，
+        # 内核得到 -inf，两者同号且分类相同，只核对符号
+        degenerate = valid & (np.abs(expected) > 1e10)
+        same_nan &= np.array_equal(np.sign(got[degenerate]), np.sign(expected[degenerate])) \
+            and bool(np.all(np.abs(got[degenerate]) > 1e10))
+        valid &= ~degenerate
+        max_diff = float(np.max(np.abs(got[valid] - expected[valid]))) if valid.any() else 0.0
+        # 保留 4 位小数后一致
+        ok = same_nan and np.array_equal(np.round(got[valid], 4), np.round(expected[valid], 4))
+        print(f"{'[OK]  ' if ok else '[FAIL]'} {name:<10} 最大误差 {max_diff:.3e}")
+        if not ok:
+            failed.append(name)
+
+    if failed:
+        raise SystemExit(f"[ERROR] 与 pandas_ta 不一致的指标: {failed}")
+    print("[INFO] 全部指标与 pandas_ta 保持小数点后 4 位一致。")
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import pickle
+import uuid
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+
+from PanelSignalEngine import KlinePanel
+
+# 缓存文件结构版本，结构、键或信号快照字段变化时递增，旧缓存自动作废
+MEMO_VERSION = 3
+
+# 缓存键覆盖指标所用的整段预热窗口（EMA 收敛、BOLL 基线都依赖较早的K线，较早K线被复权修订或重写时键随之变化），
+# 但留出最早 N 根不计入：加载窗口按交易日历逐日前移，停牌股票每天丢掉最早的一根，停牌不超过 N 个交易日时键保持不变
+MEMO_SUSPENSION_BARS = 20
+
+
+class IndicatorMemoCache:
+    """
+    技术指标结果的持久化备忘缓存
+    键为 (股票代码, 预热窗口内K线的内容哈希, 指标参数指纹)，值为该股票的最新信号快照
+    （PanelSignalEngine.latest 的一行，含信号文字、DIF 与动能）。没有新K线的股票（停牌、同日重跑）直接取缓存，
+    只有输入变化的股票才进入指标计算。条目数超过上限时按最近使用顺序淘汰。
+    只用于全量计算路径（TASignalProcessor.process_signals），增量模式复用的是指标状态。
+    """
+
+    FILE_NAME = 'indicator_memo.pkl'
+
+    def __init__(self, cache_dir: str, max_entries: int = 50000):
+        """
+        Args:
+            cache_dir: 缓存文件目录
+            max_entries: 最多保留的条目数（约为 股票数 × 保留天数），0 表示不缓存
+        """
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, self.FILE_NAME)
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Dict]' = None
+        self._dirty = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def digests(panel: KlinePanel, params: Dict, lookback: int) -> List[str]:
+        """
+        各列最后 lookback - MEMO_SUSPENSION_BARS 根有效K线（交易日 + OHLC）与指标参数的内容哈希，
+        与面板行数、列顺序及加载窗口起点无关。lookback 为指标所需的交易日数（TASignalProcessor.required_lookback）。
+        """
+        tail = max(lookback - MEMO_SUSPENSION_BARS, 1)
+        seed = json.dumps({'version': MEMO_VERSION, 'params': params}, sort_keys=True, default=str).encode('utf-8')
+        layers = [panel.dates.view(np.int64)] + [panel[field] for field in KlinePanel.FIELDS]
+        n_rows = panel.shape[0]
+        result = []
+        for i, length in enumerate(panel.lengths):
+            h = hashlib.blake2b(seed, digest_size=16)
+            for layer in layers:
+                h.update(np.ascontiguousarray(layer[n_rows - min(length, tail):, i]).tobytes())
+            result.append(h.hexdigest())
+        return result
+
+    def _load(self) -> 'OrderedDict[str, Dict]':
+        if self._entries is not None:
+            return self._entries
+        self._entries = OrderedDict()
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'rb') as f:
+                    data = pickle.load(f)
+                if data.get('version') == MEMO_VERSION:
+                    self._entries = data['entries']
+            except Exception as e:
+                print(f"[WARN] 读取指标缓存失败: {e}，本次全部重新计算。")
+        return self._entries
+
+    def get_many(self, codes: List[str], digests: List[str]) -> Dict[str, Dict]:
+        """返回命中的 代码 -> 信号快照，命中条目移到最近使用端"""
+        if not self.enabled:
+            return {}
+        entries = self._load()
+        hits = {}
+        for code, digest in zip(codes, digests):
+            key = f"{code}:{digest}"
+            row = entries.get(key)
+            if row is not None:
+                entries.move_to_end(key)
+                hits[code] = row
+        self._dirty = self._dirty or bool(hits)
+        return hits
+
+    def put_many(self, rows: Dict[str, Dict], digests: Dict[str, str]):
+        if not self.enabled or not rows:
+            return
+        entries = self._load()
+        for code, row in rows.items():
+            key = f"{code}:{digests[code]}"
+            entries[key] = row
+            entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        self._dirty = True
+
+    def save(self):
+        """写回缓存文件（临时文件 + 原子替换），未变化时跳过"""
+        if not self.enabled or not self._dirty:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'version': MEMO_VERSION, 'entries': self._entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except Exception as e:
+            print(f"[WARN] 保存指标缓存失败: {e}")
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import IndicatorKernels as kernels
+from PanelSignalEngine import CCI_CONSTANT, KlinePanel, PanelSignalEngine
+
+# 状态文件结构版本，结构变化时递增，旧文件自动作废
+STATE_VERSION = 1
+# 锚点K线复权比例的比较容差（与 AdjFactorStore 重算时的判断一致）
+ADJ_TOLERANCE = 1e-9
+
+
+def _tail(matrix: np.ndarray, rows: int) -> np.ndarray:
+    """取矩阵末尾 rows 行，不足时在前面补 NaN"""
+    out = np.full((rows, matrix.shape[1]), np.nan)
+    n = min(rows, matrix.shape[0])
+    if n:
+        out[-n:] = matrix[-n:]
+    return out
+
+
+def _push(tail: np.ndarray, values: np.ndarray, active: np.ndarray):
+    """环形缓冲前移一行并写入新值（只动 active 列）"""
+    tail[:-1, active] = tail[1:, active]
+    tail[-1, active] = values[active]
+
+
+class IndicatorState:
+    """
+    增量指标状态（每只股票一列）
+    保存各股票最后一根K线处的递推量（EMA、DEA、RSI 涨跌均值）与窗口类指标所需的末尾若干行
+    （价格、随机值、K/D/J、RSI、BOLL 带宽等，行数由 PanelSignalEngine.tail_lengths 决定）。
+    新K线到来时只在这些缓冲上折算一步，耗时与历史长度无关；信号直接在缓冲上用 PanelSignalEngine.latest 判定。
+    """
+
+    def __init__(self, codes: List[str], tails: Dict[str, np.ndarray], lengths: np.ndarray,
+                 last_date: np.ndarray, adj_ratio: np.ndarray):
+        """
+        Args:
+            codes: 股票代码（6 位）
+            tails: 名称 -> (行数, N) 末尾缓冲，递推量为 1 行
+            lengths: (N,) 已折算的有效K线数
+            last_date: (N,) 最后一根K线的交易日
+            adj_ratio: (N,) 最后一根K线的复权比例（用于识别除权后历史被重算）
+        """
+        self.codes = list(codes)
+        self.tails = tails
+        self.lengths = lengths
+        self.last_date = last_date
+        self.adj_ratio = adj_ratio
+        self.column_of = {code: i for i, code in enumerate(self.codes)}
+
+    @classmethod
+    def from_panel(cls, engine: PanelSignalEngine, panel: KlinePanel, ind: Dict[str, np.ndarray],
+                   adj_ratio: np.ndarray) -> 'IndicatorState':
+        """由全量计算的面板与指标矩阵生成状态"""
+        tails = {name: _tail(panel[name] if name in KlinePanel.FIELDS else ind[name], rows)
+                 for name, rows in engine.tail_lengths().items()}
+        last_date = panel.dates[-1].copy() if panel.shape[0] else np.array([], dtype='datetime64[ns]')
+        return cls(panel.codes, tails, panel.lengths.copy(), last_date, np.asarray(adj_ratio, dtype=np.float64))
+
+    @classmethod
+    def concat(cls, states: List['IndicatorState'], engine: PanelSignalEngine) -> 'IndicatorState':
+        if not states:
+            return cls([], {name: np.empty((rows, 0)) for name, rows in engine.tail_lengths().items()},
+                       np.array([], dtype=np.int64), np.array([], dtype='datetime64[ns]'), np.array([]))
+        return cls(
+            [code for state in states for code in state.codes],
+            {name: np.hstack([state.tails[name] for state in states]) for name in states[0].tails},
+            np.concatenate([state.lengths for state in states]),
+            np.concatenate([state.last_date for state in states]),
+            np.concatenate([state.adj_ratio for state in states]),
+        )
+
+    def take(self, codes: List[str]) -> 'IndicatorState':
+        idx = np.array([self.column_of[code] for code in codes], dtype=np.int64)
+        return IndicatorState(codes, {name: tail[:, idx] for name, tail in self.tails.items()},
+                              self.lengths[idx], self.last_date[idx], self.adj_ratio[idx])
+
+    def panel(self) -> KlinePanel:
+        """以末尾缓冲构造的面板（供 PanelSignalEngine.latest 判定信号）"""
+        return KlinePanel(self.codes, self.last_date[None, :],
+                          {field: self.tails[field] for field in KlinePanel.FIELDS}, self.lengths)
+
+    def advance(self, engine: PanelSignalEngine, bars: pd.DataFrame) -> Tuple['IndicatorState', List[str]]:
+        """
+        把 bars（含 股票代码、date、OHLC、adj_ratio，需包含各股票状态中的最后一根K线作为锚点）中
+        晚于状态的新K线逐根折入。锚点缺失或复权比例已变的股票不折算，返回 (推进后的状态, 需全量重算的代码)。
+        """
+        bars = bars[bars['股票代码'].isin(self.column_of)]
+        col = bars['股票代码'].map(self.column_of).to_numpy(dtype=np.int64)
+        dates = bars['date'].to_numpy(dtype='datetime64[ns]')
+        is_anchor = dates == self.last_date[col]
+        same_adj = np.isclose(bars['adj_ratio'].to_numpy(dtype=np.float64), self.adj_ratio[col],
+                              rtol=0, atol=ADJ_TOLERANCE, equal_nan=True)
+        valid = np.zeros(len(self.codes), dtype=bool)
+        valid[col[is_anchor & same_adj]] = True
+        stale = [code for code, ok in zip(self.codes, valid) if not ok]
+        state = self.take([code for code, ok in zip(self.codes, valid) if ok])
+
+        new = bars[(dates > self.last_date[col]) & bars['close'].notna()]
+        new = new[new['股票代码'].isin(state.column_of)]
+        if new.empty:
+            return state, stale
+
+        col = new['股票代码'].map(state.column_of).to_numpy(dtype=np.int64)
+        order = np.lexsort((new['date'].to_numpy(dtype='datetime64[ns]'), col))
+        col = col[order]
+        counts = np.bincount(col, minlength=len(state.codes))
+        step_of_row = np.arange(len(col)) - (np.cumsum(counts) - counts)[col]
+        fields = {name: new[name].to_numpy(dtype=np.float64)[order] for name in KlinePanel.FIELDS + ('adj_ratio',)}
+        new_dates = new['date'].to_numpy(dtype='datetime64[ns]')[order]
+
+        # 每一步同时推进所有仍有新K线的股票
+        for step in range(int(counts.max())):
+            rows = np.flatnonzero(step_of_row == step)
+            active = np.zeros(len(state.codes), dtype=bool)
+            active[col[rows]] = True
+            values = {}
+            for name, data in fields.items():
+                values[name] = np.full(len(state.codes), np.nan)
+                values[name][col[rows]] = data[rows]
+            state._step(engine, values, active)
+            state.last_date[col[rows]] = new_dates[rows]
+            state.adj_ratio[col[rows]] = fields['adj_ratio'][rows]
+        return state, stale
+
+    def _step(self, engine: PanelSignalEngine, values: Dict[str, np.ndarray], active: np.ndarray):
+        """在 active 列上折入一根新K线，各指标的计算与全量计算的最后一行相同"""
+        params = engine.params
+        tails = self.tails
+        for field in KlinePanel.FIELDS:
+            _push(tails[field], values[field], active)
+        close = tails['close'][-1]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for name, (fast, slow, signal) in params['MACD'].items():
+                ema_fast = kernels.ema_step(tails[f'EMA_FAST_{name}'][-1], close, kernels.ewm_alpha(fast, 0.0))
+                ema_slow = kernels.ema_step(tails[f'EMA_SLOW_{name}'][-1], close, kernels.ewm_alpha(slow, 0.0))
+                dif = ema_fast - ema_slow
+                dea = kernels.ema_step(tails[f'DEA_{name}'][-1], dif, kernels.ewm_alpha(signal, 0.0))
+                _push(tails[f'EMA_FAST_{name}'], ema_fast, active)
+                _push(tails[f'EMA_SLOW_{name}'], ema_slow, active)
+                _push(tails[f'DIF_{name}'], dif, active)
+                _push(tails[f'DEA_{name}'], dea, active)
+
+            kdj = params['KDJ']
+            _push(tails['STOCH'], kernels.stoch_raw(tails['high'], tails['low'], tails['close'], kdj['k'])[-1], active)
+            k_value = kernels.rolling_mean(tails['STOCH'], kdj['smooth_k'])[-1]
+            _push(tails['KDJ_K'], k_value, active)
+            d_value = kernels.rolling_mean(tails['KDJ_K'][-kdj['d']:], kdj['d'])[-1]
+            _push(tails['KDJ_D'], d_value, active)
+            _push(tails['KDJ_J'], 3 * k_value - 2 * d_value, active)
+
+            cci = kernels.cci(tails['high'], tails['low'], tails['close'], params['CCI']['length'], CCI_CONSTANT)
+            _push(tails['CCI'], cci[-1], active)
+
+            change = close - tails['close'][-2]
+            gain = np.where(np.isnan(change), np.nan, np.where(change > 0, change, 0.0))
+            loss = np.where(np.isnan(change), np.nan, np.where(change < 0, change, 0.0))
+            alpha = kernels.ewm_alpha(0.0, 1.0 / params['RSI']['length'])
+            gain_avg = kernels.ema_step(tails['RSI_GAIN_AVG'][-1], gain, alpha)
+            loss_avg = kernels.ema_step(tails['RSI_LOSS_AVG'][-1], loss, alpha)
+            _push(tails['RSI_GAIN_AVG'], gain_avg, active)
+            _push(tails['RSI_LOSS_AVG'], loss_avg, active)
+            _push(tails['RSI'], 100 * gain_avg / (gain_avg + np.abs(loss_avg)), active)
+
+            boll = params['BOLL']
+            mid = kernels.rolling_mean(tails['close'], boll['length'])[-1]
+            std = kernels.rolling_std(tails['close'], boll['length'], 1)[-1]
+            _push(tails['BOLL_BANDWIDTH'], ((mid + boll['std'] * std) - (mid - boll['std'] * std)) / close, active)
+            _push(tails['MA5'], kernels.rolling_mean(tails['close'], 5)[-1], active)
+
+        self.lengths[active] += 1
+
+
+class IndicatorStateStore:
+    """指标状态的本地持久化（单个 npz 文件，写入走临时文件 + 原子替换）"""
+
+    FILE_NAME = 'indicator_state.npz'
+
+    def __init__(self, state_dir: str):
+        self.state_dir = state_dir
+        self.path = os.path.join(state_dir, self.FILE_NAME)
+
+    @staticmethod
+    def fingerprint(params: Dict) -> str:
+        """状态对应的指标参数指纹，参数变化后旧状态不再可用"""
+        raw = json.dumps({'version': STATE_VERSION, 'params': params}, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def load(self, params: Dict) -> Optional[IndicatorState]:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if str(data['fingerprint']) != self.fingerprint(params):
+                    print("[WARN] 指标参数或状态结构已变化，丢弃旧的指标状态，全部股票将全量计算。")
+                    return None
+                tails = {key[len('tail:'):]: data[key] for key in data.files if key.startswith('tail:')}
+                state = IndicatorState(data['codes'].tolist(), tails, data['lengths'],
+                                       data['last_date'], data['adj_ratio'])
+        except Exception as e:
+            print(f"[WARN] 读取指标状态失败: {e}，全部股票将全量计算。")
+            return None
+        print(f"[INFO] 已加载 {len(state.codes)} 只股票的指标状态。")
+        return state
+
+    def save(self, state: IndicatorState, params: Dict):
+        try:
+            os.makedirs(self.state_dir, exist_ok=True)
+            arrays = {f'tail:{name}': tail for name, tail in state.tails.items()}
+            arrays.update({
+                'fingerprint': np.array(self.fingerprint(params)),
+                'codes': np.array(state.codes, dtype=str),
+                'lengths': state.lengths,
+                'last_date': state.last_date,
+                'adj_ratio': state.adj_ratio,
+            })
+            tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"[WARN] 保存指标状态失败: {e}，下次运行将全量计算。")
@@ -1,18 +1,19 @@
-import os
-from datetime import datetime
 import pandas as pd
-import akshare as ak
+from DataManager.CalendarManager import TradingCalendarAnalyzer
+from DataManager.DataProvider import DataProvider, create_provider
+from DataManager.FetchCache import fetch_cache
 import time
 import numpy as np
 
 
 class IndustryFlowAnalyzer:
 
-    def __init__(self, config):
+    def __init__(self, config, provider: DataProvider = None, trade_date: str = None):
         self.config = config
-        self.today_str = datetime.now().strftime('%Y%m%d')
-        self.cache_filename = f"行业权重趋势_{self.today_str}.txt"
-        self.cache_path = os.path.join(self.config.TEMP_DATA_DIRECTORY, self.cache_filename)
+        self.provider = provider or create_provider(config)
+        fetch_cache.configure_from_config(config)
+        # 缓存按交易日存放（YYYY-MM-DD），未指定时取最近交易日，周末运行沿用上一交易日的结果
+        self.today_str = trade_date or TradingCalendarAnalyzer(provider=self.provider).get_last_trading_day()
 
     def _normalize_amount(self, val):
         if pd.isna(val): return 0.0
@@ -38,7 +39,7 @@ class IndustryFlowAnalyzer:
     def _fetch_and_clean(self, period_name):
         """抓取同花顺行业资金流接口"""
         try:
-            df = ak.stock_fund_flow_industry(symbol=period_name)
+            df = self.provider.industry_fund_flow(symbol=period_name)
             if df is None or df.empty: return pd.DataFrame()
             df = df.rename(columns={'行业': '行业名称'})
             # 清洗百分比和金额
@@ -60,7 +61,7 @@ class IndustryFlowAnalyzer:
     def _fetch_market_turnover(self):
         """抓取东方财富行业接口以补全【换手率】"""
         try:
-            df = ak.stock_board_industry_name_em()
+            df = self.provider.industry_boards()
             # 统一列名以备 merge
             df = df[['板块名称', '换手率']]
             df.columns = ['行业名称', '换手率']
@@ -72,7 +73,7 @@ class IndustryFlowAnalyzer:
     def _fetch_big_deal_logic(self):
         """抓取大单追踪以增强潜入识别"""
         try:
-            df = ak.stock_fund_flow_big_deal()
+            df = self.provider.big_deal()
             if df.empty: return set()
             # 只统计买入的大单
             buy_stocks = set(df[df['大单性质'].str.contains('买入', na=False)]['股票简称'].tolist())
@@ -81,13 +82,10 @@ class IndustryFlowAnalyzer:
             return set()
 
     def run_analysis(self) -> pd.DataFrame:
-        if os.path.exists(self.cache_path):
-            print(f">>> 发现本地缓存：{self.cache_filename}，正在加载...")
-            try:
-                return pd.read_csv(self.cache_path, sep='|', encoding='utf-8')
-            except Exception as e:
-                print(f"[WARN] 缓存加载失败: {e}")
+        result = fetch_cache.fetch("行业权重趋势", self.today_str, self._analyze)
+        return result if result is not None else pd.DataFrame()
 
+    def _analyze(self) -> pd.DataFrame:
         print(f"\n>>> 获取行业趋势")
         period_map = {"即时": "now", "3日排行": "3d", "5日排行": "5d", "10日排行": "10d", "20日排行": "20d"}
         dfs = {}
@@ -143,12 +141,5 @@ class IndustryFlowAnalyzer:
         main['行业信号'] = np.select(conds, ['资金主攻', '退潮预警', '黄金坑潜入', '低位强异动'], default='观望区间')
 
         result = main.sort_values('趋势得分', ascending=False)
-
-        try:
-            if not os.path.exists(self.config.TEMP_DATA_DIRECTORY): os.makedirs(self.config.TEMP_DATA_DIRECTORY)
-            result.to_csv(self.cache_path, sep='|', index=False, encoding='utf-8')
-            print(f">>> 深度分析完成，结果存至: {self.cache_filename}")
-        except Exception as e:
-            print(f"[WARN] 保存失败: {e}")
-
+        print(f">>> 深度分析完成，共 {len(result)} 个行业。")
         return result
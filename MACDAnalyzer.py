@@ -5,6 +5,12 @@ import pandas_ta as ta  # 确保导入pandas_ta
 
 
 class MACDAnalyzer:
+    # MACD 周期 (fast, slow, signal)
+    MACD_PERIODS = {
+        '12269': (12, 26, 9),  # 标准中长线周期
+        '6135': (6, 13, 5)  # 短线/加速周期
+    }
+
     def _custom_macd(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         [自定义实现] 同时计算 MACD 标准周期 (12, 26, 9) 和加速周期 (6, 13, 5) 的快慢线金叉信号。
@@ -15,12 +21,7 @@ class MACDAnalyzer:
 
         close = df['close']
 
-        macd_periods = {
-            '12269': (12, 26, 9),  # 标准中长线周期
-            '6135': (6, 13, 5)  # 短线/加速周期
-        }
-
-        for name, (fast, slow, signal) in macd_periods.items():
+        for name, (fast, slow, signal) in MACDAnalyzer.MACD_PERIODS.items():
             ema_fast_col = f'EMA_{fast}_{name}'
             ema_slow_col = f'EMA_{slow}_{name}'
 
@@ -4,16 +4,24 @@ import time
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Callable, Dict, Any, List
-import akshare as ak
+from DataManager.VendorRecorder import vendor_recorder
+from DataManager.FetchCache import fetch_cache
+import numpy as np
 import pandas as pd
 import pandas_ta as ta  # 勿删
 from sqlalchemy import text, create_engine
 import Industrytrending as industry
 from DataManager import DatabaseWriter
-from DataManager import ParallelUtils as utils
+from DataManager.FetchScheduler import FetchScheduler, EndpointPolicy
+from DataManager.DataProvider import create_provider
+from DataManager.KlineHistoryLoader import KlineHistoryLoader
+from DataManager.StagePipeline import StagePipeline, PipelineAbort
+from FeatureAssembler import FeatureAssembler
 from DataManager import QuantDataPerformer
 from FormatManager import Parse_Currency
 from SignalManager import TASignalProcessor
+from IndicatorState import IndicatorStateStore
+from IndicatorMemo import IndicatorMemoCache
 from HistDataEngine import StockSyncEngine
 from LoggerManager import LoggerManager
 import os
@@ -31,11 +39,20 @@ class StockAnalyzer:
     def __init__(self, config_file: str = "config.ini"):
         self.config_file = config_file
         self.config = Config(config_file=config_file)
-        self.calendar_mgr = TradingCalendarAnalyzer()
+        vendor_recorder.configure_from_config(self.config)
+        fetch_cache.configure_from_config(self.config)
+        # 行情数据源（akshare / tushare / 本地合成），同步引擎、日历、行业与主力成本模块共用同一实例
+        self.provider = create_provider(self.config)
+        self.calendar_mgr = TradingCalendarAnalyzer(provider=self.provider)
         self.today_str = self.calendar_mgr.get_last_trading_day()
+        vendor_recorder.use_session(self.today_str)
         self.temp_dir = self.config.TEMP_DATA_DIRECTORY
         os.makedirs(self.temp_dir, exist_ok=True)
         self.executor = ThreadPoolExecutor(max_workers=self.config.MAX_WORKERS)
+        # 逐板块接口请求统一经调度器限速与自适应并发；成分股接口返回空表也视为失败重试
+        self.fetch_scheduler = FetchScheduler.from_config(self.config, name='board')
+        self.fetch_scheduler.register_endpoint('stock_board_industry_cons_em', EndpointPolicy(
+            retries=self.config.DATA_FETCH_RETRIES, base_delay=self.config.DATA_FETCH_DELAY, retry_on_empty=True))
         self.start_time = time.time()
         self.logger = LoggerManager(
             log_dir=self.config.LOG_DIR,
@@ -44,8 +61,12 @@ class StockAnalyzer:
         )
 
         try:
-            self.sync_engine = StockSyncEngine()
+            self.sync_engine = StockSyncEngine(provider=self.provider)
             self.db_engine = self.sync_engine.db
+            self.history_loader = KlineHistoryLoader(self.db_engine, self.calendar_mgr)
+            self.indicator_state_store = IndicatorStateStore(self.config.INDICATOR_STATE_DIR)
+            self.indicator_memo_cache = IndicatorMemoCache(self.config.INDICATOR_STATE_DIR,
+                                                           self.config.INDICATOR_MEMO_MAX_ENTRIES)
         except Exception as e:
             self.logger.critical(
                 f"[CRITICAL] Corenews_Main: Failed to initialize StockSyncEngine or its database engine. Error: {e}")
@@ -54,72 +75,39 @@ class StockAnalyzer:
         # 初始化主力成本数据管理器
         self.cost_manager = MainCostDataManager(
             cache_enabled=True,
-            cache_dir=os.path.join(self.config.TEMP_DATA_DIRECTORY, "cost_data_cache")
+            cache_dir=os.path.join(self.config.TEMP_DATA_DIRECTORY, "cost_data_cache"),
+            provider=self.provider
         )
 
-    def _get_file_path(self, base_name: str, cleaned: bool = False) -> str:
+    def _safe_ak_fetch(self, fetch_func: Callable, file_base_name: str, **kwargs: Any) -> pd.DataFrame:
         """
-        生成临时数据文件的完整路径。如果 cleaned=True, 则添加 "_经清洗" 后缀。
+        经统一缓存获取接口数据：缓存键为 (数据源名称, 业务日期)，缓存的是清洗后的数据；
+        未命中时按配置重试获取并清洗，全部失败时返回空 DataFrame（有旧缓存则退回旧值）。
         """
-        suffix = "_经清洗" if cleaned else ""
-        file_name = f"{base_name}{suffix}_{self.today_str}.txt"
-        return os.path.join(self.temp_dir, file_name)
-
-    def _load_data_from_cache(self, file_path: str) -> pd.DataFrame:
-        """从缓存加载数据。"""
-        if os.path.exists(file_path):
-            try:
-                df = pd.read_csv(file_path, sep='|', encoding='utf-8', dtype={'股票代码': str, 'symbol': str})
-                # 统一列名为 '股票代码'
-                if 'symbol' in df.columns and '股票代码' not in df.columns:
-                    df.rename(columns={'symbol': '股票代码'}, inplace=True)
-                print(f"  - 发现缓存，加载: {os.path.basename(file_path)}")
-                return df
-            except Exception as e:
-                self.logger.warning(f"[WARN] 加载缓存 {os.path.basename(file_path)} 失败: {e}，将重新获取。")
-        return pd.DataFrame()
-
-    def _save_data_to_cache(self, df: pd.DataFrame, file_path: str):
-        """保存数据到缓存。"""
-        try:
-            df.to_csv(file_path, sep='|', index=False, encoding='utf-8')
-        except Exception as e:
-            self.logger.error(f"[ERROR] 保存数据到缓存 {os.path.basename(file_path)} 失败: {e}")
-
-    def _safe_ak_fetch(self, fetch_func: Callable, file_base_name: str, **kwargs: Any) -> pd.DataFrame:
-
-        # 1. 尝试从【清洗后的缓存】加载数据
-        cleaned_file_path = self._get_file_path(file_base_name, cleaned=True)
-        cached_df = self._load_data_from_cache(cleaned_file_path)
-        if not cached_df.empty:
-            return cached_df
 
-        # 2. 如果清洗后的缓存不存在，则尝试从原始获取
-        df = pd.DataFrame()
-        for i in range(self.config.DATA_FETCH_RETRIES):
-            try:
-                print(f"  - 正在尝试第 {i + 1}/{self.config.DATA_FETCH_RETRIES} 次获取数据: {file_base_name}...")
-                df = fetch_func(**kwargs)
-                if df is not None and not df.empty:
-                    break
-                else:
-                    self.logger.warning(f"[WARN] 数据返回为空或无效: {file_base_name}，重试中。")
+        def fetch_and_clean() -> pd.DataFrame:
+            df = pd.DataFrame()
+            for i in range(self.config.DATA_FETCH_RETRIES):
+                try:
+                    print(f"  - 正在尝试第 {i + 1}/{self.config.DATA_FETCH_RETRIES} 次获取数据: {file_base_name}...")
+                    df = fetch_func(**kwargs)
+                    if df is not None and not df.empty:
+                        break
+                    else:
+                        self.logger.warning(f"[WARN] 数据返回为空或无效: {file_base_name}，重试中。")
+                        time.sleep(self.config.DATA_FETCH_DELAY)
+                except Exception as e:
+                    self.logger.error(
+                        f"[ERROR] 获取 {file_base_name} 时出错: {e}，将在 {self.config.DATA_FETCH_DELAY} 秒后重试。")
                     time.sleep(self.config.DATA_FETCH_DELAY)
-            except Exception as e:
-                self.logger.error(
-                    f"[ERROR] 获取 {file_base_name} 时出错: {e}，将在 {self.config.DATA_FETCH_DELAY} 秒后重试。")
-                time.sleep(self.config.DATA_FETCH_DELAY)
 
-        if df.empty:
-            self.logger.critical(f"[FATAL] 所有重试均失败，返回空 DataFrame: {file_base_name}")
-            return pd.DataFrame()
-
-        # 3. 清洗数据并保存到带有 "_经清洗" 后缀的缓存文件
-        cleaned_df = self._clean_and_standardize(df, file_base_name)
-        if not cleaned_df.empty:
-            self._save_data_to_cache(cleaned_df, cleaned_file_path)
+            if df is None or df.empty:
+                self.logger.critical(f"[FATAL] 所有重试均失败，返回空 DataFrame: {file_base_name}")
+                return pd.DataFrame()
+            return self._clean_and_standardize(df, file_base_name)
 
-        return cleaned_df
+        df = fetch_cache.fetch(file_base_name, self.today_str, fetch_and_clean)
+        return df if df is not None else pd.DataFrame()
 
     def _clean_and_standardize(self, df: pd.DataFrame, df_name: str) -> pd.DataFrame:
         """通用数据清洗和列名标准化（已移除财务数据特殊逻辑）"""
@@ -299,98 +287,94 @@ class StockAnalyzer:
 
         return final_industry_df
 
+    # 互不依赖的行情/排名接口：产出名 -> (数据源方法名, 缓存文件名, 接口参数)
+    RAW_FETCHES = {
+        'spot_data_all': ('spot', "A股实时行情", {}),
+        'market_fund_flow_raw': ('fund_flow_individual', "5日市场资金流向", {'symbol': "5日排行"}),
+        'market_fund_flow_raw_10': ('fund_flow_individual', "10日市场资金流向", {'symbol': "10日排行"}),
+        'market_fund_flow_raw_20': ('fund_flow_individual', "20日市场资金流向", {'symbol': "20日排行"}),
+        'consecutive_rise_raw': ('rank_lxsz', "连续上涨", {}),
+        'ljqs_raw': ('rank_ljqs', "量价齐升", {}),
+        'cxfl_raw': ('rank_cxfl', "持续放量", {}),
+        # 均线突破数据 (接口参数不同，需分开获取)
+        'xstp_10_raw': ('rank_xstp', "向上突破10日均线", {'symbol': "10日均线"}),
+        'xstp_30_raw': ('rank_xstp', "向上突破30日均线", {'symbol': "30日均线"}),
+        'xstp_60_raw': ('rank_xstp', "向上突破60日均线", {'symbol': "60日均线"}),
+    }
+
+    def _add_raw_data_stages(self, pipeline: StagePipeline):
+        """
+        把原始数据获取登记为流程阶段：各接口、行业板块、主力成本互不依赖，并发获取；
+        前十板块成分股依赖行业板块；最后汇总为 raw_data。
+        """
+        for key, (method, cache_name, kwargs) in self.RAW_FETCHES.items():
+            pipeline.add(key, lambda m=method, c=cache_name, kw=kwargs: self._safe_ak_fetch(
+                getattr(self.provider, m), c, **kw))
+        pipeline.add('strong_stocks_raw', lambda: self._safe_ak_fetch(
+            self.provider.zt_pool_strong, "强势股池", date=self.today_str.replace('-', '')))
+
+        pipeline.add('industry_board_df', self._get_industry_boards)
+        pipeline.add('top_industry_cons_df', lambda industry_board_df: self._get_top_industry_constituents(
+            industry_board_df), inputs=['industry_board_df'])
+        pipeline.add('main_cost_data', self._get_main_cost_data)
+
+        raw_keys = list(self.RAW_FETCHES) + ['strong_stocks_raw', 'top_industry_cons_df', 'industry_board_df', 'main_cost_data']
+        pipeline.add('raw_data', lambda **data: data, inputs=raw_keys)
+
     def _get_all_raw_data(self) -> Dict[str, pd.DataFrame]:
         """集中获取所有数据源 (包括主力研报盈利预测)，并支持缓存机制"""
         print("\n>>> 正在初始化数据获取和缓存检查...")
+        pipeline = StagePipeline(self.executor, name='原始数据获取')
+        self._add_raw_data_stages(pipeline)
+        return pipeline.run(['raw_data'])['raw_data']
 
-        data = {
-            'spot_data_all': self._safe_ak_fetch(ak.stock_zh_a_spot_em, "A股实时行情"),
-
-            'market_fund_flow_raw': self._safe_ak_fetch(ak.stock_fund_flow_individual, "5日市场资金流向",
-                                                        symbol="5日排行"),
-            'market_fund_flow_raw_10': self._safe_ak_fetch(ak.stock_fund_flow_individual, "10日市场资金流向",
-                                                           symbol="10日排行"),
-            'market_fund_flow_raw_20': self._safe_ak_fetch(ak.stock_fund_flow_individual, "20日市场资金流向",
-                                                           symbol="20日排行"),
-            'strong_stocks_raw': self._safe_ak_fetch(ak.stock_zt_pool_strong_em, "强势股池",
-                                                     date=datetime.now().strftime('%Y%m%d')),
-            'consecutive_rise_raw': self._safe_ak_fetch(ak.stock_rank_lxsz_ths, "连续上涨"),
-            'ljqs_raw': self._safe_ak_fetch(ak.stock_rank_ljqs_ths, "量价齐升"),
-            'cxfl_raw': self._safe_ak_fetch(ak.stock_rank_cxfl_ths, "持续放量"),
-        }
-
-        # 均线突破数据 (Akshare接口参数不同，需分开获取)
-        data['xstp_10_raw'] = self._safe_ak_fetch(ak.stock_rank_xstp_ths, "向上突破10日均线", symbol="10日均线")
-        data['xstp_30_raw'] = self._safe_ak_fetch(ak.stock_rank_xstp_ths, "向上突破30日均线", symbol="30日均线")
-        data['xstp_60_raw'] = self._safe_ak_fetch(ak.stock_rank_xstp_ths, "向上突破60日均线", symbol="60日均线")
+    def _get_industry_boards(self) -> pd.DataFrame:
+        """行业板块名称与涨跌幅，当日已获取过则读取缓存"""
+        print("\n>>> 正在获取行业板块名称...")
 
-        # 行业板块数据
-        print("\n>>> 正在获取行业板块名称并保存至本地...")
-        industry_info_filename = f"行业板块信息_{self.today_str}.txt"
-        industry_info_path = os.path.join(self.temp_dir, industry_info_filename)
-        industry_board_df = pd.DataFrame()
-
-        if os.path.exists(industry_info_path):
-            try:
-                print(f"  - 发现本地缓存文件，正在读取: {industry_info_filename}")
-                industry_board_df = pd.read_csv(industry_info_path, sep='|', encoding='utf-8-sig')
-            except Exception as e:
-                self.logger.warning(f"  - [WARN] 读取本地缓存失败: {e}，将尝试重新获取...")
-        else:
-            print(f"  - 本地无有效缓存，正在通过 Akshare 接口获取...")
-            try:
-                industry_board_df = ak.stock_board_industry_name_em()
-                if not industry_board_df.empty:
-                    try:
-                        industry_board_df.to_csv(industry_info_path, sep='|', index=False, encoding='utf-8-sig')
-                        print(f"  - 获取成功并已保存至: {industry_info_filename}")
-                    except Exception as e:
-                        self.logger.error(f"  - [ERROR] 保存文件失败: {e}")
-            except Exception as e:
-                self.logger.error(f"  - [ERROR] 调用行业板块接口失败: {e}")
+        def fetch_boards() -> pd.DataFrame:
+            print(f"  - 本地无有效缓存，正在通过 {self.provider.name} 数据源获取...")
+            return self.provider.industry_boards()
 
-        data['top_industry_cons_df'] = self._get_top_industry_constituents(industry_board_df)
-        data['industry_board_df'] = industry_board_df
+        industry_board_df = fetch_cache.fetch("行业板块信息", self.today_str, fetch_boards)
+        return industry_board_df if industry_board_df is not None else pd.DataFrame()
 
+    def _get_main_cost_data(self) -> pd.DataFrame:
         # 获取主力成本数据（使用新的管理类）
         print("\n>>> 正在获取主力成本数据...")
-        main_cost_df = self.cost_manager.get_main_cost_data()
+        main_cost_df = self.cost_manager.get_main_cost_data(trade_date=self.today_str)
         main_cost_df = self.cost_manager.analyze_cost_data(main_cost_df)
-        data['main_cost_data'] = main_cost_df
 
         # 打印主力成本数据摘要
         self.cost_manager.print_cost_summary(main_cost_df)
 
-        return data
+        # 代码列统一为补零的 股票代码，汇总报告与“主力成本分析”页签直接使用
+        if not main_cost_df.empty and '代码' in main_cost_df.columns:
+            main_cost_df = main_cost_df.rename(columns={'代码': '股票代码'})
+            main_cost_df['股票代码'] = main_cost_df['股票代码'].astype(str).str.zfill(6)
+        return main_cost_df
 
     def _safe_fetch_constituents(self, symbol: str) -> pd.DataFrame:
         """
         带重试机制获取单个行业板块的成分股。
         """
-        df = pd.DataFrame()
-        for i in range(self.config.DATA_FETCH_RETRIES):
-            try:
-                df = ak.stock_board_industry_cons_em(symbol=symbol)
-                if df is not None and not df.empty:
-                    return df
-                else:
-                    time.sleep(self.config.DATA_FETCH_DELAY)
-            except Exception:
-                time.sleep(self.config.DATA_FETCH_DELAY)
-        return pd.DataFrame()
+        try:
+            df = self.fetch_scheduler.call('stock_board_industry_cons_em', self.provider.industry_constituents,
+                                           symbol=symbol)
+        except Exception:
+            return pd.DataFrame()
+        return df if df is not None else pd.DataFrame()
 
     def _get_top_industry_constituents(self, industry_board_df: pd.DataFrame) -> pd.DataFrame:
         """重构：获取涨幅前10板块的成分股"""
         if industry_board_df.empty or '板块名称' not in industry_board_df.columns:
             return pd.DataFrame()
 
-        # 1. 缓存检查
-        cache_name = "前十板块成分股"
-        cleaned_file_path = self._get_file_path(cache_name, cleaned=True)
-        cached_df = self._load_data_from_cache(cleaned_file_path)
-        if not cached_df.empty:
-            return cached_df
+        constituents = fetch_cache.fetch("前十板块成分股", self.today_str,
+                                         lambda: self._fetch_top_industry_constituents(industry_board_df))
+        return constituents if constituents is not None else pd.DataFrame()
 
+    def _fetch_top_industry_constituents(self, industry_board_df: pd.DataFrame) -> pd.DataFrame:
         top_industries = industry_board_df.sort_values(by='涨跌幅', ascending=False).head(10)
 
         # --- 修复点 1：强制构建纯 Python 字典列表，避免 Pandas Series 混入线程 ---
@@ -435,10 +419,9 @@ class StockAnalyzer:
                 self.logger.error(f"[WORKER ERROR] 处理板块 {row.get('板块名称', 'Unknown')} 时出错: {e}")
                 return None
 
-        results = utils.run_with_thread_pool(
+        results = self.fetch_scheduler.map(
             items=industry_list,
-            worker_func=fetch_worker,
-            max_workers=self.config.MAX_WORKERS,
+            worker=fetch_worker,
             desc="获取板块成分股"
         )
 
@@ -446,9 +429,7 @@ class StockAnalyzer:
             # 过滤掉 None 结果
             valid_results = [df for df in results if df is not None and not df.empty]
             if valid_results:
-                final_df = pd.concat(valid_results, ignore_index=True).drop_duplicates(subset=['股票代码'])
-                self._save_data_to_cache(final_df, cleaned_file_path)
-                return final_df
+                return pd.concat(valid_results, ignore_index=True).drop_duplicates(subset=['股票代码'])
 
         return pd.DataFrame()
 
@@ -531,120 +512,90 @@ class StockAnalyzer:
         # 这个方法现在主要委托给MainCostDataManager
         return main_cost_df
 
+    # 技术指标信号列：结果键 -> (信号列, 报告列名)
+    TA_SIGNAL_COLUMNS = {
+        'MACD_12269': ('MACD_12269_Signal', 'MACD_12269'),
+        'MACD_6135': ('MACD_6135_Signal', 'MACD_6135'),
+        'KDJ': ('KDJ_Signal', 'KDJ_Signal'),
+        'CCI': ('CCI_Signal', 'CCI_Signal'),
+        'RSI': ('RSI_Signal', 'RSI_Signal'),
+        'BOLL': ('BOLL_Signal', 'BOLL_Signal'),
+    }
+
     def _consolidate_data(self, processed_data: Dict[str, pd.DataFrame],
                           base_stock_codes_pure: List[str]) -> pd.DataFrame:
         """
         合并所有数据源和信号，生成最终汇总报告。
         参数 base_stock_codes_pure 是最终报告的基准股票代码列表（纯数字）。
+        各数据源经 FeatureAssembler 按股票代码（资金流按股票简称）各建一次索引、对齐到基准股票后登记为列，
+        全部就绪后一次生成汇总表，再做信号筛选与排序。
         """
         print("\n>>> 正在汇总所有数据和信号 (技术指标作为独立列)...")
 
-        final_df = pd.DataFrame(base_stock_codes_pure, columns=['股票代码'])
-        final_df['股票代码'] = final_df['股票代码'].astype(str)
+        features = FeatureAssembler(base_stock_codes_pure)
 
         spot_df = processed_data.get('spot_data_all', pd.DataFrame())
         file_industry_df = processed_data.get('individual_industry', pd.DataFrame())
 
-        if '股票代码' in spot_df.columns:
-            spot_df['股票代码'] = spot_df['股票代码'].astype(str)
-
-        name_source_spot = spot_df[['股票代码', '股票简称']].drop_duplicates(
-            subset=['股票代码']) if '股票简称' in spot_df.columns else pd.DataFrame()
-
-        all_names = pd.concat([name_source_spot, file_industry_df[['股票代码', '股票简称']]]).drop_duplicates(
-            # 调整 concat
-            subset=['股票代码'], keep='first')
-        final_df = pd.merge(final_df, all_names, on='股票代码', how='left')
+        # 1. 股票简称：实时行情优先，行业字典补充
+        name_sources = [df[['股票代码', '股票简称']] for df in (spot_df, file_industry_df)
+                        if '股票代码' in df.columns and '股票简称' in df.columns]
+        if name_sources:
+            all_names = pd.concat(name_sources)
+            all_names['股票代码'] = all_names['股票代码'].astype(str)
+            features.add(all_names, ['股票简称'])
+        else:
+            features['股票简称'] = pd.Series([np.nan] * len(features), dtype=object)
 
+        # 2. 最新价
         if '股票简称' not in spot_df.columns:
             self.logger.critical("[FATAL] 实时行情数据中缺少 '股票简称' 列，无法按要求按简称关联。回退到按代码关联。")
             price_source_key = '股票代码'
-            price_source = spot_df[['股票代码', '最新价']].copy()
+            price_source = spot_df[['股票代码', '最新价']].copy() if '股票代码' in spot_df.columns else pd.DataFrame()
         else:
             price_source_key = '股票简称'
-
             price_source = spot_df[['股票代码', '股票简称', '最新价']].copy()
             price_source['最新价'] = pd.to_numeric(price_source['最新价'], errors='coerce')
-            price_source = price_source[
-                (price_source['最新价'].notna()) &
-                (price_source['最新价'] > 0)
-                ].copy()
-
+            price_source = price_source[(price_source['最新价'].notna()) & (price_source['最新价'] > 0)]
             price_source = price_source.drop_duplicates(subset=[price_source_key], keep='first')
 
-        final_df.drop(columns=['最新价'], errors='ignore', inplace=True)
-
-        if '股票代码' in price_source.columns and '股票代码' in final_df.columns:
-
-            def extract_pure_code(code_str):
-                code_str = str(code_str).strip().upper()
-                # 去掉常见前缀
-                for prefix in ['SH', 'SZ', 'BJ', 'sh', 'sz', 'bj']:
-                    if code_str.startswith(prefix):
-                        code_str = code_str[2:]
-                        break
-                # 补齐6位
-                return code_str.zfill(6)
-
-            price_source['股票代码_纯'] = price_source['股票代码'].apply(extract_pure_code)
-            final_df['股票代码'] = final_df['股票代码'].astype(str).str.zfill(6)
-
-            # 按纯数字代码合并
-            final_df = pd.merge(final_df, price_source[['股票代码_纯', '最新价']],
-                                left_on='股票代码', right_on='股票代码_纯', how='left')
-            final_df.drop(columns=['股票代码_纯'], errors='ignore', inplace=True)
-
+        if '股票代码' in price_source.columns:
+            # 去掉常见前缀并补齐6位后按纯数字代码对齐
+            price_source = price_source.assign(股票代码=price_source['股票代码'].astype(str).str.strip().str.upper()
+                                               .str.replace(r'^(SH|SZ|BJ)', '', regex=True).str.zfill(6))
+            features.add(price_source, ['最新价'])
         else:
             print("[WARN] '股票代码' 不存在于价格源中，跳过最新价合并。")
+            features['最新价'] = pd.Series([np.nan] * len(features), dtype=object)
 
-        valid_prices_count = final_df['最新价'].notna().sum() if '最新价' in final_df.columns else 0
+        valid_prices_count = features['最新价'].notna().sum()
         print(
-            f"  - 实时行情数据 (最新价) 成功通过 '{price_source_key}' 关联的有效价格数量: {valid_prices_count} / {len(final_df)}")
+            f"  - 实时行情数据 (最新价) 成功通过 '{price_source_key}' 关联的有效价格数量: {valid_prices_count} / {len(features)}")
 
-        final_df['股票简称'] = final_df['股票简称'].fillna('N/A')
-        final_df['最新价'] = final_df['最新价'].fillna('N/A')
+        features['股票简称'] = features['股票简称'].fillna('N/A')
+        features['最新价'] = features['最新价'].fillna('N/A')
 
+        # 3. 均线多头排列
         xstp_df = processed_data['processed_xstp_df']
-        xstp_cols = ['股票代码', '完全多头排列', '当前价格', '10日均线价', '30日均线价', '60日均线价']
-
+        xstp_cols = ['完全多头排列', '当前价格', '10日均线价', '30日均线价', '60日均线价']
         if not xstp_df.empty and '股票代码' in xstp_df.columns:
-            cols_present = [col for col in xstp_cols if col in xstp_df.columns]
-            merge_df = xstp_df[cols_present].drop_duplicates(subset=['股票代码'])
-            final_df = pd.merge(final_df, merge_df, on='股票代码', how='left')
+            features.add(xstp_df, [col for col in xstp_cols if col in xstp_df.columns])
+        features['完全多头排列'] = features['完全多头排列'].fillna('否') if '完全多头排列' in features else '否'
 
-        if '完全多头排列' not in final_df.columns:
-            final_df['完全多头排列'] = '否'
-        else:
-            final_df['完全多头排列'] = final_df['完全多头排列'].fillna('否')
-
-        fund_flow_df = processed_data.get('market_fund_flow_raw', pd.DataFrame())
-        if not fund_flow_df.empty and '股票简称' in fund_flow_df.columns and '资金流入净额' in fund_flow_df.columns:
-            merge_df = fund_flow_df[['股票简称', '资金流入净额']].drop_duplicates(subset=['股票简称'])
-            final_df = pd.merge(final_df, merge_df, on='股票简称', how='left')
-            final_df['5日资金流入'] = final_df['资金流入净额']
-            final_df.drop(columns=['资金流入净额'], errors='ignore', inplace=True)
-
-        fund_flow_df_10 = processed_data.get('market_fund_flow_raw_10', pd.DataFrame())
-        if not fund_flow_df_10.empty and '股票简称' in fund_flow_df_10.columns and '资金流入净额' in fund_flow_df_10.columns:
-            merge_df_10 = fund_flow_df_10[['股票简称', '资金流入净额']].drop_duplicates(subset=['股票简称'])
-            final_df = pd.merge(final_df, merge_df_10, on='股票简称', how='left')
-            final_df['10日资金流入'] = final_df['资金流入净额']
-            final_df.drop(columns=['资金流入净额'], errors='ignore', inplace=True)
-
-        fund_flow_df_20 = processed_data.get('market_fund_flow_raw_20', pd.DataFrame())
-        if not fund_flow_df_20.empty and '股票简称' in fund_flow_df_20.columns and '资金流入净额' in fund_flow_df_20.columns:
-            merge_df_20 = fund_flow_df_20[['股票简称', '资金流入净额']].drop_duplicates(subset=['股票简称'])
-            final_df = pd.merge(final_df, merge_df_20, on='股票简称', how='left')
-            final_df['20日资金流入'] = final_df['资金流入净额']
-            final_df.drop(columns=['资金流入净额'], errors='ignore', inplace=True)
+        # 4. 5/10/20 日资金流向（按股票简称关联）
+        for key, label in [('market_fund_flow_raw', '5日资金流入'), ('market_fund_flow_raw_10', '10日资金流入'),
+                           ('market_fund_flow_raw_20', '20日资金流入')]:
+            fund_flow_df = processed_data.get(key, pd.DataFrame())
+            if not fund_flow_df.empty and '股票简称' in fund_flow_df.columns and '资金流入净额' in fund_flow_df.columns:
+                features.add(fund_flow_df, ['资金流入净额'], on='股票简称', by='股票简称',
+                             rename={'资金流入净额': label})
 
         f5_col, f10_col, f20_col = '5日资金流入', '10日资金流入', '20日资金流入'
-        if all(col in final_df.columns for col in [f5_col, f10_col, f20_col]):
-            def calculate_trend(row):
-                v5 = Parse_Currency.Parse_Currency.parse_money_str(row[f5_col])
-                v10 = Parse_Currency.Parse_Currency.parse_money_str(row[f10_col])
-                v20 = Parse_Currency.Parse_Currency.parse_money_str(row[f20_col])
+        if all(col in features for col in [f5_col, f10_col, f20_col]):
+            parse = Parse_Currency.Parse_Currency.parse_money_str
 
+            def calculate_trend(v5, v10, v20):
+                v5, v10, v20 = parse(v5), parse(v10), parse(v20)
                 if (v5 > v10 or v5 > v20) and v5 > 0:
                     return "动能增强"
                 elif v5 > 0:
@@ -652,168 +603,76 @@ class StockAnalyzer:
                 else:
                     return ""
 
-            final_df['资金动能'] = final_df.apply(calculate_trend, axis=1)
-
-            cols = list(final_df.columns)
-            if '资金动能' in cols:
-                target_idx = cols.index(f5_col)
-                cols.insert(target_idx + 1, cols.pop(cols.index('资金动能')))
-                final_df = final_df[cols]
-
-        if not processed_data['strong_stocks_raw'].empty:
-            strong_codes = processed_data['strong_stocks_raw']['股票代码'].tolist()
-            final_df['强势股'] = final_df['股票代码'].apply(lambda x: '是' if x in strong_codes else '否')
-        else:
-            final_df['强势股'] = '否'
-
-        rise_df = processed_data['consecutive_rise_raw']
-        if not rise_df.empty:
-            rise_df = rise_df[['股票代码', '连涨天数']].drop_duplicates(subset=['股票代码'])
-            final_df = pd.merge(final_df, rise_df, on='股票代码', how='left').fillna({'连涨天数': 0})
-        else:
-            final_df['连涨天数'] = 0
-
-        final_df['连涨天数'] = final_df['连涨天数'].astype(int)
-
-        if not processed_data['ljqs_raw'].empty:
-            ljqs_codes = processed_data['ljqs_raw']['股票代码'].tolist()
-            final_df['量价齐升'] = final_df['股票代码'].apply(lambda x: '是' if x in ljqs_codes else '否')
-        else:
-            final_df['量价齐升'] = '否'
-
-        cxfl_df = processed_data['cxfl_raw']
-        if not cxfl_df.empty:
-            cxfl_df = cxfl_df[['股票代码', '放量天数']].drop_duplicates(subset=['股票代码'])
-            final_df = pd.merge(final_df, cxfl_df, on='股票代码', how='left').fillna({'放量天数': 0})
-        else:
-            final_df['放量天数'] = 0
-
-        final_df['放量天数'] = final_df['放量天数'].astype(int)
+            features['资金动能'] = [calculate_trend(*values) for values in
+                                    zip(features[f5_col], features[f10_col], features[f20_col])]
 
-        ta_dfs_to_merge = []
+        # 5. 每日排名类数据
+        strong_df = processed_data['strong_stocks_raw']
+        features.flag('强势股', strong_df['股票代码'] if not strong_df.empty else [])
+        ljqs_df = processed_data['ljqs_raw']
+        features.flag('量价齐升', ljqs_df['股票代码'] if not ljqs_df.empty else [])
 
-        macd_df_standard = processed_data.get('MACD_12269', pd.DataFrame())
-        if not macd_df_standard.empty:
-            ta_dfs_to_merge.append(macd_df_standard[['股票代码', 'MACD_12269_Signal']].rename(
-                columns={'MACD_12269_Signal': 'MACD_12269'}))
-
-        macd_df_fast = processed_data.get('MACD_6135', pd.DataFrame())
-        if not macd_df_fast.empty:
-            ta_dfs_to_merge.append(macd_df_fast[['股票代码', 'MACD_6135_Signal']].rename(
-                columns={'MACD_6135_Signal': 'MACD_6135'}))
-
-        kdj_df = processed_data.get('KDJ', pd.DataFrame())
-        if not kdj_df.empty:
-            ta_dfs_to_merge.append(kdj_df[['股票代码', 'KDJ_Signal']].rename(
-                columns={'KDJ_Signal': 'KDJ_Signal'}))
-
-        cci_df = processed_data.get('CCI', pd.DataFrame())
-        if not cci_df.empty:
-            ta_dfs_to_merge.append(cci_df[['股票代码', 'CCI_Signal']].rename(
-                columns={'CCI_Signal': 'CCI_Signal'}))
-
-        rsi_df = processed_data.get('RSI', pd.DataFrame())
-        if not rsi_df.empty:
-            rsi_df['RSI_Signal'] = rsi_df['RSI_Signal'].astype(str).str.split(' ').str[0]
-            ta_dfs_to_merge.append(rsi_df[['股票代码', 'RSI_Signal']].rename(
-                columns={'RSI_Signal': 'RSI_Signal'}))
-
-        boll_df = processed_data.get('BOLL', pd.DataFrame())
-        if not boll_df.empty:
-            ta_dfs_to_merge.append(boll_df[['股票代码', 'BOLL_Signal']].rename(
-                columns={'BOLL_Signal': 'BOLL_Signal'}))
+        for key, col in [('consecutive_rise_raw', '连涨天数'), ('cxfl_raw', '放量天数')]:
+            days_df = processed_data[key]
+            if not days_df.empty:
+                features.add(days_df, [col])
+                features[col] = features[col].fillna(0)
+            else:
+                features[col] = 0
+            features[col] = features[col].astype(int)
 
-        for ta_df in ta_dfs_to_merge:
-            final_df = pd.merge(final_df, ta_df.drop_duplicates(subset=['股票代码']), on='股票代码', how='left')
+        # 6. 技术指标信号与 MACD 动能
+        for key, (signal_col, report_col) in self.TA_SIGNAL_COLUMNS.items():
+            ta_df = processed_data.get(key, pd.DataFrame())
+            if ta_df.empty:
+                continue
+            if key == 'RSI':
+                ta_df = ta_df.assign(RSI_Signal=ta_df['RSI_Signal'].astype(str).str.split(' ').str[0])
+            features.add(ta_df, [signal_col], rename={signal_col: report_col})
 
         momentum_df = processed_data.get('MACD_DIF_MOMENTUM', pd.DataFrame())
         if not momentum_df.empty and '股票代码' in momentum_df.columns:
-            final_df = pd.merge(final_df, momentum_df, on='股票代码', how='left')
+            features.add(momentum_df, [col for col in momentum_df.columns if col not in features])
             for col in ['MACD_12269_动能', 'MACD_6135_动能']:
-                if col in final_df.columns:
-                    final_df[col] = final_df[col].fillna('')
+                if col in features:
+                    features[col] = features[col].fillna('')
 
-        for col in ['MACD_12269', 'MACD_6135', 'KDJ_Signal', 'CCI_Signal', 'RSI_Signal', 'BOLL_Signal']:
-            if col in final_df.columns:
-                final_df[col] = final_df[col].fillna('')
-            else:
-                final_df[col] = ''
+        for _, report_col in self.TA_SIGNAL_COLUMNS.values():
+            features[report_col] = features[report_col].fillna('') if report_col in features else ''
+
+        # 7. 前十板块与行业
         top_ind_df = processed_data.get('top_industry_cons_df', pd.DataFrame())
-        if not top_ind_df.empty:
-            top_codes = set(top_ind_df['股票代码'].astype(str).unique())
-            final_df['TOP10行业'] = final_df['股票代码'].apply(lambda x: '是' if str(x) in top_codes else '否')
-        else:
-            final_df['TOP10行业'] = '否'
+        features.flag('TOP10行业', top_ind_df['股票代码'].astype(str) if not top_ind_df.empty else [])
 
         industry_df = processed_data.get('individual_industry', pd.DataFrame())
         if not industry_df.empty:
             # 确保 industry_df 包含 '股票代码' 和 '行业' 列再合并
             if '股票代码' in industry_df.columns and '行业' in industry_df.columns:
-                final_df = pd.merge(final_df, industry_df[['股票代码', '行业']], on='股票代码', how='left')  # 只合并相关列
-                final_df['行业'] = final_df['行业'].fillna('N/A')
+                features.add(industry_df, ['行业'])
+                features['行业'] = features['行业'].fillna('N/A')
                 print(f"  - 行业数据已成功合并到最终报告。")
             else:
                 self.logger.warning(f"[WARN] 从 processed_data 获取的行业数据缺少 '股票代码' 或 '行业' 列，跳过合并。")
-                if '行业' not in final_df.columns:  # 确保即使跳过合并，列也存在
-                    final_df['行业'] = 'N/A'
+                features['行业'] = 'N/A'
         else:
             self.logger.info("[INFO] 从 processed_data 获取的行业数据为空，跳过合并。")
-            if '行业' not in final_df.columns:  # 确保即使数据为空，列也存在
-                final_df['行业'] = 'N/A'
+            features['行业'] = 'N/A'
 
-        # 合并主力成本数据
+        # 8. 主力成本数据（代码列已在获取时统一为补零的 股票代码）
+        cost_cols = ['主力成本', '机构参与度', '主力成本差价', '主力成本差价百分比', '成本位置', '机构参与度等级', '主力控盘强度']
         main_cost_df = processed_data.get('main_cost_data', pd.DataFrame())
-        if not main_cost_df.empty:
-            # 重命名列以匹配我们的标准
-            main_cost_df.rename(columns={'代码': '股票代码'}, inplace=True)
-            # 格式化股票代码为纯数字格式
-            main_cost_df['股票代码'] = main_cost_df['股票代码'].astype(str).str.zfill(6)
-
-            # 合并到最终数据框 - 包含所有分析后的字段
-            final_df = pd.merge(final_df,
-                                main_cost_df[
-                                    ['股票代码', '主力成本', '机构参与度', '主力成本差价', '主力成本差价百分比',
-                                     '成本位置', '机构参与度等级', '主力控盘强度']],
-                                on='股票代码',
-                                how='left')
-            final_df['主力成本'] = final_df['主力成本'].fillna('N/A')
-            final_df['主力成本差价'] = final_df['主力成本差价'].fillna('N/A')
-            final_df['成本位置'] = final_df['成本位置'].fillna('N/A')
-            final_df['主力控盘强度'] = final_df['主力控盘强度'].fillna('N/A')
-        else:
-            # 添加默认值
-            final_df['主力成本'] = 'N/A'
-            final_df['主力成本差价'] = 'N/A'
-            final_df['成本位置'] = 'N/A'
-            final_df['主力控盘强度'] = 'N/A'
-
-        def has_any_signal(row):
-            # 研报买入次数条件已移除
-            return (row['完全多头排列'] == '是' or
-                    row['强势股'] == '是' or
-                    row['量价齐升'] == '是' or
-                    row.get('TOP10行业') == '是' or
-                    row['MACD_12269'] != '' or
-                    row['MACD_6135'] != '' or
-                    row['KDJ_Signal'] != '' or
-                    row['CCI_Signal'] != '' or
-                    row['RSI_Signal'] != '' or
-                    row['BOLL_Signal'] != ''
-                    )
-
-        final_df = final_df[final_df.apply(has_any_signal, axis=1)].copy()
-
-        final_df.sort_values(by=['连涨天数', '放量天数'], ascending=[False, False], inplace=True)
-        final_df.reset_index(drop=True, inplace=True)
-
-        # 这里传入纯数字的股票代码，format_stock_code 会自动添加前缀
-        final_df['完整股票代码'] = final_df['股票代码'].apply(format_stock_code)
-        final_df['股票链接'] = "https://hybrid.gelonghui.com/stock-check/" + final_df['完整股票代码']
-
-        final_df.drop(columns=['完整股票代码'], inplace=True, errors='ignore')
-
-        if '当前价格' in final_df.columns and '最新价' in final_df.columns:
-            final_df.drop(columns=['当前价格'], inplace=True, errors='ignore')
+        if not main_cost_df.empty and '股票代码' in main_cost_df.columns:
+            features.add(main_cost_df, [col for col in cost_cols if col in main_cost_df.columns])
+        for col in ['主力成本', '主力成本差价', '成本位置', '主力控盘强度']:
+            features[col] = features[col].fillna('N/A') if col in features else 'N/A'
+
+        # 9. 至少有一个信号的股票才进入报告（研报买入次数条件已移除）
+        has_any_signal = (
+                (features['完全多头排列'] == '是') | (features['强势股'] == '是') | (features['量价齐升'] == '是') |
+                (features['TOP10行业'] == '是') |
+                (features['MACD_12269'] != '') | (features['MACD_6135'] != '') | (features['KDJ_Signal'] != '') |
+                (features['CCI_Signal'] != '') | (features['RSI_Signal'] != '') | (features['BOLL_Signal'] != '')
+        )
 
         base_cols = ['股票代码', '股票简称', '行业', '最新价', '主力成本', '主力成本差价', '成本位置', '主力控盘强度']  # 移除主力成本相关列
         signal_cols = [
@@ -827,9 +686,13 @@ class StockAnalyzer:
             '完全多头排列', '10日均线价', '30日均线价', '60日均线价',
             '资金动能', '5日资金流入', '10日资金流入', '20日资金流入'
         ]
-        final_cols = base_cols + signal_cols + report_cols + ['股票链接']
-        final_df = final_df[[col for col in final_cols if col in final_df.columns]]
+        final_df = features.frame(base_cols + signal_cols + report_cols)[has_any_signal.to_numpy()]
+
+        final_df = final_df.sort_values(by=['连涨天数', '放量天数'], ascending=[False, False])
+        final_df.reset_index(drop=True, inplace=True)
 
+        # 这里传入纯数字的股票代码，format_stock_code 会自动添加前缀
+        final_df['股票链接'] = "https://hybrid.gelonghui.com/stock-check/" + final_df['股票代码'].map(format_stock_code)
         return final_df
 
     def _merge_industry_signal_to_stocks(self, stock_df: pd.DataFrame, industry_df: pd.DataFrame) -> pd.DataFrame:
@@ -890,87 +753,77 @@ class StockAnalyzer:
             self.logger.critical(f"[FATAL] 致命错误：生成 Excel 报告失败。原因: {e}")
             raise
 
-    def run(self):
-
-        print(f"[INFO]  股票分析程序启动 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"[INFO] 识别的业务日期(最后一个交易日)为: {self.today_str}") # 日志提示
-
+    def _load_universe(self) -> List[str]:
+        """同步完成后，以数据库最新交易日有K线的股票作为分析股票池（带市场前缀）"""
+        synced_codes_df_from_db = pd.DataFrame(columns=['symbol'])  # 初始化为空，以防查询失败
 
         try:
+            # 确保 self.db_engine 已经被成功初始化
+            if self.db_engine is None:
+                raise RuntimeError("数据库引擎未成功初始化，无法从数据库获取数据。")
+
+            with self.db_engine.connect() as conn:
+                # 1. 查询数据库中最新的一个交易日期
+                latest_date_query = text("SELECT MAX(trade_date) FROM stock_daily_kline;")
+                latest_db_date_result = conn.execute(latest_date_query).scalar_one_or_none()
+                if latest_db_date_result is None:
+                    raise PipelineAbort(
+                        "[FATAL] 数据库中 'stock_daily_kline' 表没有K线数据，无法获取股票代码列表，流程终止。")
+                # 2. 查询在该最新交易日期有数据的股票代码
+                query_symbols = text(f"""
+                                SELECT DISTINCT symbol
+                                FROM stock_daily_kline
+                                WHERE trade_date = :latest_date
+                            """)
+                synced_codes_df_from_db = pd.read_sql(query_symbols, conn,
+                                                      params={'latest_date': latest_db_date_result})
+                print(
+                    f">>> 已从数据库获取 {len(synced_codes_df_from_db)} 只股票代码，基于最新交易日  ")
+        except PipelineAbort:
+            raise
+        except Exception as e:
+            raise PipelineAbort(f"[FATAL] 查询数据库获取股票代码失败: {e}，流程终止。")
 
-            self.sync_engine.run_engine()
-            self.sync_engine.run_engine(target_date=self.today_str)
-            synced_codes_df_from_db = pd.DataFrame(columns=['symbol'])  # 初始化为空，以防查询失败
+        if synced_codes_df_from_db.empty:
+            raise PipelineAbort("[FATAL] 从数据库获取已同步股票代码列表失败，流程终止。")
 
+        final_analysis_codes_prefixed = synced_codes_df_from_db['symbol'].tolist()
+        print(
+            f">>> HistDataWatchDog 成功同步 {len(final_analysis_codes_prefixed)} 只股票数据到数据库，并作为分析基础。")
+        return final_analysis_codes_prefixed
+
+    def _compute_ta_signals(self, final_analysis_codes_prefixed: List[str],
+                            spot_df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        signal_processor = TASignalProcessor(self, workers=self.config.SIGNAL_WORKERS,
+                                             memo_cache=self.indicator_memo_cache)
+        ta_signals = None
+        if final_analysis_codes_prefixed and self.config.INDICATOR_INCREMENTAL:
+            # 增量模式：按上次保存的指标状态只折算新增K线，无状态或复权比例变化的股票才全量计算
             try:
-                # 确保 self.db_engine 已经被成功初始化
-                if self.db_engine is None:
-                    raise RuntimeError("数据库引擎未成功初始化，无法从数据库获取数据。")
-
-                with self.db_engine.connect() as conn:
-                    # 1. 查询数据库中最新的一个交易日期
-                    latest_date_query = text("SELECT MAX(trade_date) FROM stock_daily_kline;")
-                    latest_db_date_result = conn.execute(latest_date_query).scalar_one_or_none()
-                    if latest_db_date_result is None:
-                        self.logger.critical(
-                            "[FATAL] 数据库中 'stock_daily_kline' 表没有K线数据，无法获取股票代码列表，流程终止。")
-                        return
-                    # 2. 查询在该最新交易日期有数据的股票代码
-                    query_symbols = text(f"""
-                                    SELECT DISTINCT symbol
-                                    FROM stock_daily_kline
-                                    WHERE trade_date = :latest_date
-                                """)
-                    synced_codes_df_from_db = pd.read_sql(query_symbols, conn,
-                                                          params={'latest_date': latest_db_date_result})
-                    print(
-                        f">>> 已从数据库获取 {len(synced_codes_df_from_db)} 只股票代码，基于最新交易日  ")
+                ta_signals = signal_processor.process_signals_incremental(
+                    final_analysis_codes_prefixed, self.history_loader, self.today_str,
+                    self.indicator_state_store, spot_df)
             except Exception as e:
-                self.logger.critical(f"[FATAL] 查询数据库获取股票代码失败: {e}，流程终止。")
-                return  # 异常时也终止流程
-
-            if synced_codes_df_from_db.empty:
-                self.logger.critical("[FATAL] 从数据库获取已同步股票代码列表失败，流程终止。")
-                return
-
-            final_analysis_codes_prefixed = synced_codes_df_from_db['symbol'].tolist()
-
-            final_analysis_codes_pure = [code[2:] for code in final_analysis_codes_prefixed]
-
-            print(
-                f">>> HistDataWatchDog 成功同步 {len(final_analysis_codes_prefixed)} 只股票数据到数据库，并作为分析基础。")
-
-            # 预处理行业权重数据
-            industry_analyzer = industry.IndustryFlowAnalyzer(self.config)
-            industry_analysis_df = industry_analyzer.run_analysis()
-            raw_data = self._get_all_raw_data()
-            processed_main_report = pd.DataFrame()
+                print(f"[ERROR] 增量技术分析失败: {e}，改为按预热窗口全量计算。")
 
+        if ta_signals is None:
             # 构造查询语句
             if not final_analysis_codes_prefixed:
                 print("[WARN] 待分析股票代码列表为空，跳过历史数据查询。")
                 hist_df_all = pd.DataFrame()
             else:
-                # 构造 IN 子句
-                symbols_str = ','.join([f"'{s}'" for s in final_analysis_codes_prefixed])
-                query = text(f"""
-                    SELECT *
-                    FROM stock_daily_kline
-                    WHERE symbol IN ({symbols_str})
-                    ORDER BY trade_date
-                """)
-
+                # 只加载指标预热所需的最近 N 个交易日，股票池以数组参数绑定
+                lookback = TASignalProcessor.required_lookback()
                 hist_df_all = pd.DataFrame()  # 初始化为空
                 try:
-                    with self.db_engine.connect() as conn:
+                    hist_df_all = self.history_loader.load(final_analysis_codes_prefixed, lookback,
+                                                           end_date=self.today_str)
 
-                        hist_df_all = pd.read_sql(query, conn)
-
-                        if not hist_df_all.empty:
-                            print(
-                                f"[INFO] 数据日期范围: {hist_df_all['trade_date'].min()} 至 {hist_df_all['trade_date'].max()}")
-                        else:
-                            print("[ERROR] 查询结果为空！可能是股票代码不匹配或日期条件过滤了所有数据。")
+                    if not hist_df_all.empty:
+                        print(
+                            f"[INFO] 数据日期范围: {hist_df_all['trade_date'].min()} 至 {hist_df_all['trade_date'].max()}")
+                    else:
+                        print("[ERROR] 查询结果为空！可能是股票代码不匹配或日期条件过滤了所有数据。")
 
                 except Exception as e:
                     # except 必须紧贴 try 块
@@ -980,151 +833,185 @@ class StockAnalyzer:
             if hist_df_all.empty:
                 print("[WARN] 由于历史数据为空，将跳过所有技术指标计算。")
                 # 这里可能需要处理空数据的情况，防止后续报错
-            else:
-                # 正常调用信号处理
-                pass
 
-            signal_processor = TASignalProcessor(self)
             ta_signals = signal_processor.process_signals(
 
                 final_analysis_codes_prefixed,
                 hist_df_all,
-                raw_data['spot_data_all']
+                spot_df
             )
-            self._save_ta_signals_to_txt(ta_signals)
-            print(">>> 股票历史数据和技术指标分析完成。")
-
-            # 行业信息获取，注意这里需要纯数字的代码
-            industry_info_df = self._load_industry_info_from_generated_file(final_analysis_codes_pure)
-            universe_codes_set_pure = set(final_analysis_codes_pure)
-
-            def filter_df_by_universe(df, universe_set):
-                if df is None or df.empty or '股票代码' not in df.columns:
-                    return pd.DataFrame()
-                df['股票代码'] = df['股票代码'].astype(str).str.zfill(6)
-                return df[df['股票代码'].isin(universe_set)].copy()
-
-            # 均线突破数据处理
-            processed_xstp_df = self._process_xstp_and_filter(raw_data, raw_data['spot_data_all'])
-            processed_xstp_df = filter_df_by_universe(processed_xstp_df, universe_codes_set_pure)
-
-            # 过滤其他每日排名数据
-            raw_data['market_fund_flow_raw'] = filter_df_by_universe(raw_data['market_fund_flow_raw'],
-                                                                     universe_codes_set_pure)
-            raw_data['market_fund_flow_raw_10'] = filter_df_by_universe(raw_data['market_fund_flow_raw_10'],
-                                                                        universe_codes_set_pure)
-            raw_data['market_fund_flow_raw_20'] = filter_df_by_universe(raw_data['market_fund_flow_raw_20'],
-                                                                        universe_codes_set_pure)
-            raw_data['strong_stocks_raw'] = filter_df_by_universe(raw_data['strong_stocks_raw'],
-                                                                  universe_codes_set_pure)
-            raw_data['consecutive_rise_raw'] = filter_df_by_universe(raw_data['consecutive_rise_raw'],
-                                                                     universe_codes_set_pure)
-            raw_data['ljqs_raw'] = filter_df_by_universe(raw_data['ljqs_raw'], universe_codes_set_pure)
-            raw_data['cxfl_raw'] = filter_df_by_universe(raw_data['cxfl_raw'], universe_codes_set_pure)
-
-            # 5. 合并所有数据源和信号
-            processed_data = {
-                **raw_data,
-                **ta_signals,
-                'processed_xstp_df': processed_xstp_df,
-                'processed_main_report': processed_main_report,  # 此时为空DataFrame
-                'individual_industry': industry_info_df
-            }
-
-            # 调用 _consolidate_data 时，传入基础的纯数字股票代码列表
-            consolidated_report = self._consolidate_data(processed_data, final_analysis_codes_pure)
-            consolidated_report = self._merge_industry_signal_to_stocks(consolidated_report, industry_analysis_df)
-
-            cols = list(consolidated_report.columns)
-            if '所属行业信号' in cols and '行业' in cols:
-                cols.remove('所属行业信号')
-                idx = cols.index('行业')
-                cols.insert(idx + 1, '所属行业信号')
-                consolidated_report = consolidated_report[cols]
-
-            print(">>> 正在执行最终数据清洗：剔除弱势且加速下跌的个股...")
-
-            if not consolidated_report.empty:
-                # 为了安全比较，确保 DIF 列被正确解析为数字，非数字转为 NaN
-                dif_12269 = pd.to_numeric(consolidated_report.get('MACD_12269_DIF'), errors='coerce')
-                dif_6135 = pd.to_numeric(consolidated_report.get('MACD_6135_DIF'), errors='coerce')
-                kdj_col = consolidated_report.get('KDJ_Signal',
-                                                  pd.Series([''] * len(consolidated_report),
-                                                            index=consolidated_report.index))
-                kdj_is_empty = kdj_col.isna() | (kdj_col.astype(str).str.strip().str.lower().isin(['', 'nan', 'none']))
-
-                # 定义剔除条件（所有条件需同时满足）
-                drop_condition = (
-                        (consolidated_report.get('强势股') == '否') &
-                        (consolidated_report.get('量价齐升') == '否') &
-                        (consolidated_report.get('连涨天数') == 0) &
-                        (consolidated_report.get('放量天数') == 0) &
-                        (consolidated_report.get('MACD_12269_动能') == '加速下跌 (绿柱加长)') &
-                        (consolidated_report.get('MACD_6135_动能') == '加速下跌 (绿柱加长)') &
-                        (dif_12269 < 0) &
-                        (dif_6135 < 0) &
-                        kdj_is_empty &
-                        (consolidated_report.get('5日资金流入', pd.Series(dtype=str)).astype(str).str.contains('-',
-                                                                                                               na=False))
-                )
-
-                initial_count = len(consolidated_report)
-                consolidated_report = consolidated_report[~drop_condition].copy()
-                dropped_count = initial_count - len(consolidated_report)
-                print(
-                    f" 排除极度弱势特征的股票。剩余 {len(consolidated_report)} 只。")
-
-            # 6. 准备报告数据
-            sheets_data = {
-                '数据汇总': consolidated_report,
-                '行业深度分析': industry_analysis_df,
-                '主力研报筛选': processed_data['processed_main_report'],
-                '均线多头排列': processed_xstp_df,
-                '5日市场资金流向': raw_data['market_fund_flow_raw'],
-                '10日市场资金流向': raw_data['market_fund_flow_raw_10'],
-                '20日市场资金流向': raw_data['market_fund_flow_raw_20'],
-                '强势股池': raw_data['strong_stocks_raw'],
-                '连续上涨': raw_data['consecutive_rise_raw'],
-                '量价齐升': raw_data['ljqs_raw'],
-                '持续放量': raw_data['cxfl_raw'],
-                'MACD_12269金叉': ta_signals.get('MACD_12269', pd.DataFrame()),
-                'MACD_6135金叉': ta_signals.get('MACD_6135', pd.DataFrame()),
-                'MACD_DIF_动能状态': ta_signals.get('MACD_DIF_MOMENTUM', pd.DataFrame()),
-                'KDJ超卖金叉': ta_signals.get('KDJ', pd.DataFrame()),
-                'CCI专业状态': ta_signals.get('CCI', pd.DataFrame()),
-                'RSI超卖': ta_signals.get('RSI', pd.DataFrame()),
-                'BOLL低波': ta_signals.get('BOLL', pd.DataFrame()),
-                '前十板块成分股': raw_data['top_industry_cons_df'],
-                '主力成本分析': processed_data['main_cost_data'],  # 新增主力成本分析页签
-                'A股实时行情_经清洗': raw_data['spot_data_all'],  # 添加A股实时行情_经清洗的数据到Excel
-            }
-
-            # 7. 生成报告
-            self._generate_report(sheets_data)
+        self._save_ta_signals_to_txt(ta_signals)
+        print(">>> 股票历史数据和技术指标分析完成。")
+        return ta_signals
+
+    def _build_report(self, final_analysis_codes_prefixed: List[str], raw_data: Dict[str, pd.DataFrame],
+                      ta_signals: Dict[str, pd.DataFrame], industry_info_df: pd.DataFrame,
+                      industry_analysis_df: pd.DataFrame) -> Dict[str, Any]:
+        """合并各数据源与信号、剔除弱势个股，返回汇总报告、报告页签与按股票池过滤后的原始数据"""
+        final_analysis_codes_pure = [code[2:] for code in final_analysis_codes_prefixed]
+        universe_codes_set_pure = set(final_analysis_codes_pure)
+        # 过滤后的数据另存一份，不改动流程缓存中的原始数据
+        raw_data = dict(raw_data)
+        processed_main_report = pd.DataFrame()
+
+        def filter_df_by_universe(df, universe_set):
+            if df is None or df.empty or '股票代码' not in df.columns:
+                return pd.DataFrame()
+            df = df.copy()
+            df['股票代码'] = df['股票代码'].astype(str).str.zfill(6)
+            return df[df['股票代码'].isin(universe_set)].copy()
+
+        # 均线突破数据处理
+        processed_xstp_df = self._process_xstp_and_filter(raw_data, raw_data['spot_data_all'])
+        processed_xstp_df = filter_df_by_universe(processed_xstp_df, universe_codes_set_pure)
+
+        # 过滤其他每日排名数据
+        for key in ['market_fund_flow_raw', 'market_fund_flow_raw_10', 'market_fund_flow_raw_20',
+                    'strong_stocks_raw', 'consecutive_rise_raw', 'ljqs_raw', 'cxfl_raw']:
+            raw_data[key] = filter_df_by_universe(raw_data[key], universe_codes_set_pure)
+
+        # 5. 合并所有数据源和信号
+        processed_data = {
+            **raw_data,
+            **ta_signals,
+            'processed_xstp_df': processed_xstp_df,
+            'processed_main_report': processed_main_report,  # 此时为空DataFrame
+            'individual_industry': industry_info_df
+        }
 
-            try:
-                db_manager = DatabaseWriter.QuantDBManager(
-                    user=self.config.DB_USER,
-                    password=self.config.DB_PASSWORD,
-                    host=self.config.DB_HOST,
-                    port=self.config.DB_PORT,
-                    db_name=self.config.DB_NAME
-                )
-
-                sync_task = QuantDataPerformer.QuantDBSyncTask(db_manager)
-
-                sync_task.sync_all(
-                    today_str=self.today_str,
-                    consolidated_report=consolidated_report,
-                    industry_df=industry_analysis_df,
-                    raw_data=raw_data
-                )
-
-                db_manager.close()
-                print("数据库同步成功完成。")
+        # 调用 _consolidate_data 时，传入基础的纯数字股票代码列表
+        consolidated_report = self._consolidate_data(processed_data, final_analysis_codes_pure)
+        consolidated_report = self._merge_industry_signal_to_stocks(consolidated_report, industry_analysis_df)
+
+        cols = list(consolidated_report.columns)
+        if '所属行业信号' in cols and '行业' in cols:
+            cols.remove('所属行业信号')
+            idx = cols.index('行业')
+            cols.insert(idx + 1, '所属行业信号')
+            consolidated_report = consolidated_report[cols]
+
+        print(">>> 正在执行最终数据清洗：剔除弱势且加速下跌的个股...")
+
+        if not consolidated_report.empty:
+            # 为了安全比较，确保 DIF 列被正确解析为数字，非数字转为 NaN
+            dif_12269 = pd.to_numeric(consolidated_report.get('MACD_12269_DIF'), errors='coerce')
+            dif_6135 = pd.to_numeric(consolidated_report.get('MACD_6135_DIF'), errors='coerce')
+            kdj_col = consolidated_report.get('KDJ_Signal',
+                                              pd.Series([''] * len(consolidated_report),
+                                                        index=consolidated_report.index))
+            kdj_is_empty = kdj_col.isna() | (kdj_col.astype(str).str.strip().str.lower().isin(['', 'nan', 'none']))
+
+            # 定义剔除条件（所有条件需同时满足）
+            drop_condition = (
+                    (consolidated_report.get('强势股') == '否') &
+                    (consolidated_report.get('量价齐升') == '否') &
+                    (consolidated_report.get('连涨天数') == 0) &
+                    (consolidated_report.get('放量天数') == 0) &
+                    (consolidated_report.get('MACD_12269_动能') == '加速下跌 (绿柱加长)') &
+                    (consolidated_report.get('MACD_6135_动能') == '加速下跌 (绿柱加长)') &
+                    (dif_12269 < 0) &
+                    (dif_6135 < 0) &
+                    kdj_is_empty &
+                    (consolidated_report.get('5日资金流入', pd.Series(dtype=str)).astype(str).str.contains('-',
+                                                                                                           na=False))
+            )
 
-            except Exception as e:
-                self.logger.error(f"!!! [同步中断] 任务运行异常: {e}")
+            consolidated_report = consolidated_report[~drop_condition].copy()
+            print(
+                f" 排除极度弱势特征的股票。剩余 {len(consolidated_report)} 只。")
+
+        # 6. 准备报告数据
+        sheets_data = {
+            '数据汇总': consolidated_report,
+            '行业深度分析': industry_analysis_df,
+            '主力研报筛选': processed_data['processed_main_report'],
+            '均线多头排列': processed_xstp_df,
+            '5日市场资金流向': raw_data['market_fund_flow_raw'],
+            '10日市场资金流向': raw_data['market_fund_flow_raw_10'],
+            '20日市场资金流向': raw_data['market_fund_flow_raw_20'],
+            '强势股池': raw_data['strong_stocks_raw'],
+            '连续上涨': raw_data['consecutive_rise_raw'],
+            '量价齐升': raw_data['ljqs_raw'],
+            '持续放量': raw_data['cxfl_raw'],
+            'MACD_12269金叉': ta_signals.get('MACD_12269', pd.DataFrame()),
+            'MACD_6135金叉': ta_signals.get('MACD_6135', pd.DataFrame()),
+            'MACD_DIF_动能状态': ta_signals.get('MACD_DIF_MOMENTUM', pd.DataFrame()),
+            'KDJ超卖金叉': ta_signals.get('KDJ', pd.DataFrame()),
+            'CCI专业状态': ta_signals.get('CCI', pd.DataFrame()),
+            'RSI超卖': ta_signals.get('RSI', pd.DataFrame()),
+            'BOLL低波': ta_signals.get('BOLL', pd.DataFrame()),
+            '前十板块成分股': raw_data['top_industry_cons_df'],
+            '主力成本分析': processed_data['main_cost_data'],  # 新增主力成本分析页签
+            'A股实时行情_经清洗': raw_data['spot_data_all'],  # 添加A股实时行情_经清洗的数据到Excel
+        }
+        return {'consolidated_report': consolidated_report, 'sheets_data': sheets_data,
+                'report_raw_data': raw_data}
+
+    def _sync_to_database(self, consolidated_report: pd.DataFrame, industry_analysis_df: pd.DataFrame,
+                          report_raw_data: Dict[str, pd.DataFrame]):
+        try:
+            db_manager = DatabaseWriter.QuantDBManager(
+                user=self.config.DB_USER,
+                password=self.config.DB_PASSWORD,
+                host=self.config.DB_HOST,
+                port=self.config.DB_PORT,
+                db_name=self.config.DB_NAME
+            )
+
+            sync_task = QuantDataPerformer.QuantDBSyncTask(db_manager)
+
+            sync_task.sync_all(
+                today_str=self.today_str,
+                consolidated_report=consolidated_report,
+                industry_df=industry_analysis_df,
+                raw_data=report_raw_data
+            )
+
+            db_manager.close()
+            print("数据库同步成功完成。")
+
+        except Exception as e:
+            self.logger.error(f"!!! [同步中断] 任务运行异常: {e}")
+
+    def build_pipeline(self) -> StagePipeline:
+        """
+        把分析流程表示为依赖图：K线同步 → 股票池 → 技术指标；行业资金分析、各行情/排名接口、
+        行业板块与主力成本与同步并发进行；汇总报告等全部就绪后生成，Excel 报告与数据库同步再并发执行。
+        """
+        pipeline = StagePipeline(self.executor, name='每日分析流程')
+        # 同步引擎按 (交易日, 输入指纹) 记录运行清单，已完成的同步再次调用不会重复请求与写库
+        pipeline.add('sync', lambda: self.sync_engine.run_engine(target_date=self.today_str))
+        pipeline.add('universe', lambda sync: self._load_universe(), inputs=['sync'])
+        # 预处理行业权重数据
+        pipeline.add('industry_analysis', lambda: industry.IndustryFlowAnalyzer(
+            self.config, provider=self.provider, trade_date=self.today_str).run_analysis())
+        self._add_raw_data_stages(pipeline)
+        pipeline.add('ta_signals', lambda universe, spot_data_all: self._compute_ta_signals(universe, spot_data_all),
+                     inputs=['universe', 'spot_data_all'])
+        # 行业信息获取，注意这里需要纯数字的代码（行业字典文件由同步引擎生成）
+        pipeline.add('industry_info', lambda universe: self._load_industry_info_from_generated_file(
+            [code[2:] for code in universe]), inputs=['universe'])
+        pipeline.add('report', lambda universe, raw_data, ta_signals, industry_info, industry_analysis:
+                     self._build_report(universe, raw_data, ta_signals, industry_info, industry_analysis),
+                     inputs=['universe', 'raw_data', 'ta_signals', 'industry_info', 'industry_analysis'],
+                     outputs=['consolidated_report', 'sheets_data', 'report_raw_data'])
+        # 7. 生成报告
+        pipeline.add('excel', lambda sheets_data: self._generate_report(sheets_data), inputs=['sheets_data'])
+        pipeline.add('db_sync', lambda consolidated_report, industry_analysis, report_raw_data:
+                     self._sync_to_database(consolidated_report, industry_analysis, report_raw_data),
+                     inputs=['consolidated_report', 'industry_analysis', 'report_raw_data'])
+        return pipeline
+
+    def run(self):
+
+        print(f"[INFO]  股票分析程序启动 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"[INFO] 识别的业务日期(最后一个交易日)为: {self.today_str}") # 日志提示
+
+        try:
+            self.build_pipeline().run(['excel', 'db_sync'])
+
+        except PipelineAbort as e:
+            self.logger.critical(str(e))
 
         except Exception as e:
             self.logger.critical(f"\n[FATAL] 致命错误：数据分析流程意外终止。原因: {e}")
@@ -1132,6 +1019,7 @@ class StockAnalyzer:
 
         finally:
             end_time = time.time()
+            print(f"[INFO] 接口数据缓存: {fetch_cache.summary()}")
             print(f"\n>>> 流程结束。总耗时: {timedelta(seconds=end_time - self.start_time)}")
 
 
@@ -0,0 +1,293 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+import IndicatorKernels as kernels
+
+# CCI 常数（与 pandas_ta 默认值一致）
+CCI_CONSTANT = 0.015
+
+
+class KlinePanel:
+    """
+    K线面板：把长表K线排成 交易序号 × 股票 的对齐矩阵（float64）。
+    每列按该股票自身的K线序列右对齐——最后一行是各股票最新一根K线，停牌缺失的日期不留空洞，
+    列首不足部分以 NaN 填充；递推/滚动指标按列计算时跳过列首 NaN，结果与逐只股票单独计算一致。
+    """
+
+    FIELDS = ('open', 'high', 'low', 'close')
+
+    def __init__(self, codes: List[str], dates: np.ndarray, values: Dict[str, np.ndarray], lengths: np.ndarray):
+        """
+        Args:
+            codes: 列对应的股票代码
+            dates: (T, N) 交易日矩阵（datetime64[ns]，填充位置为 NaT）
+            values: 字段名 -> (T, N) 价格矩阵
+            lengths: (N,) 各股票的有效K线数
+        """
+        self.codes = codes
+        self.dates = dates
+        self.values = values
+        self.lengths = lengths
+        self.column_of = {code: i for i, code in enumerate(codes)}
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.values[field]
+
+    @property
+    def shape(self):
+        return self.dates.shape
+
+    def take(self, columns: List[int]) -> 'KlinePanel':
+        """取部分列组成新面板，行数截到所选股票的最长历史"""
+        columns = np.asarray(columns, dtype=np.int64)
+        lengths = self.lengths[columns]
+        first = self.shape[0] - (int(lengths.max()) if len(lengths) else 0)
+        return KlinePanel([self.codes[i] for i in columns], self.dates[first:, columns],
+                          {field: matrix[first:, columns] for field, matrix in self.values.items()}, lengths)
+
+    @classmethod
+    def from_long(cls, hist_df: pd.DataFrame, codes: List[str], code_col: str = '股票代码',
+                  date_col: str = 'date', min_rows: int = 0) -> 'KlinePanel':
+        """
+        由长表K线构建面板，列顺序与 codes 一致（无数据的股票不占列）。
+        min_rows：去除收盘价空值之前的最少K线数，不足的股票不参与计算。
+        """
+        codes = list(dict.fromkeys(codes))
+        df = hist_df[hist_df[code_col].isin(set(codes))]
+        counts = df[code_col].value_counts()
+        df = df[df[code_col].isin(counts.index[counts >= min_rows]) & df['close'].notna()]
+
+        present = set(df[code_col].unique())
+        panel_codes = [code for code in codes if code in present]
+        col_idx = pd.Categorical(df[code_col], categories=panel_codes).codes.astype(np.int64)
+        order = np.lexsort((df[date_col].to_numpy(), col_idx))
+        col_idx = col_idx[order]
+
+        n_cols = len(panel_codes)
+        lengths = np.bincount(col_idx, minlength=n_cols)
+        n_rows = int(lengths.max()) if n_cols else 0
+        starts = np.cumsum(lengths) - lengths
+        # 组内序号右对齐到最后一行
+        row_idx = n_rows - lengths[col_idx] + (np.arange(len(col_idx)) - starts[col_idx])
+
+        dates = np.full((n_rows, n_cols), np.datetime64('NaT'), dtype='datetime64[ns]')
+        dates[row_idx, col_idx] = pd.to_datetime(df[date_col]).to_numpy(dtype='datetime64[ns]')[order]
+        values = {}
+        for field in cls.FIELDS:
+            matrix = np.full((n_rows, n_cols), np.nan)
+            matrix[row_idx, col_idx] = df[field].to_numpy(dtype='float64', na_value=np.nan)[order]
+            values[field] = matrix
+        return cls(panel_codes, dates, values, lengths)
+
+
+def _lag(a: np.ndarray, k: int, rows: int) -> np.ndarray:
+    """末尾 rows 个判定行各自往前第 k 行的值 (rows, N)，越过面板首行时为 NaN"""
+    n_rows = a.shape[0]
+    out = np.full((rows, a.shape[1]), np.nan)
+    first = max(n_rows - rows - k, 0)
+    count = n_rows - k - first
+    if count > 0:
+        out[rows - count:] = a[first:first + count]
+    return out
+
+
+def _lag_nanmin(a: np.ndarray, lags: range, rows: int) -> np.ndarray:
+    """各判定行在给定滞后范围内忽略 NaN 的最小值（全为 NaN 时为 NaN，与 pandas min 一致）"""
+    out = np.full((rows, a.shape[1]), np.nan)
+    for k in lags:
+        out = np.fmin(out, _lag(a, k, rows))
+    return out
+
+
+def _trailing_nanmean(a: np.ndarray, window: int, rows: int) -> np.ndarray:
+    """各判定行含自身在内最近 window 行忽略 NaN 的均值（只截取计算末尾 rows 行所需的部分）"""
+    part = np.ascontiguousarray(a[max(a.shape[0] - rows - window + 1, 0):])
+    out = np.full((rows, a.shape[1]), np.nan)
+    result = kernels.rolling_nanmean(part, window)[-rows:] if part.shape[0] else part
+    out[rows - result.shape[0]:] = result
+    return out
+
+
+class PanelSignalEngine:
+    """
+    面板指标引擎
+    对 KlinePanel 的全部股票一次性计算 MACD（双周期）、KDJ、CCI、RSI、BOLL 带宽（IndicatorKernels 编译内核），
+    再在最后一行（历史回补时为每一行）上向量化地判定各类信号，替代逐只股票筛选、逐只调用 pandas_ta 的循环。
+    """
+
+    def __init__(self, params: Dict):
+        self.params = params
+
+    def min_rows(self) -> Dict[str, int]:
+        """各指标在 pandas_ta 中要求的最少K线数，不足时该指标不出结果"""
+        kdj = self.params['KDJ']
+        return {
+            'KDJ': kdj['k'] + kdj['d'] + kdj['smooth_k'],
+            'CCI': self.params['CCI']['length'],
+            'RSI': self.params['RSI']['length'] + 1,
+            'BOLL': self.params['BOLL']['length'],
+        }
+
+    def tail_lengths(self) -> Dict[str, int]:
+        """
+        latest() 判定信号用到的各矩阵末尾行数，以及逐根递推所需的行数（递推量只需最后 1 行）。
+        增量指标状态按此保留缓冲。
+        """
+        window = self.params['DIVERGENCE_WINDOW']
+        kdj = self.params['KDJ']
+        price_rows = max(kdj['k'], self.params['CCI']['length'], self.params['BOLL']['length'], window, 5)
+        tails = {field: price_rows for field in KlinePanel.FIELDS}
+        for name in self.params['MACD']:
+            tails.update({f'EMA_FAST_{name}': 1, f'EMA_SLOW_{name}': 1, f'DIF_{name}': 2, f'DEA_{name}': 2})
+        tails.update({
+            'STOCH': kdj['smooth_k'],
+            'KDJ_K': max(window, kdj['d'], 5),
+            'KDJ_D': 5,
+            'KDJ_J': 2,
+            'CCI': 1,
+            'RSI_GAIN_AVG': 1,
+            'RSI_LOSS_AVG': 1,
+            'RSI': window,
+            'BOLL_BANDWIDTH': self.params['BOLL']['baseline'],
+            'MA5': 1,
+        })
+        return tails
+
+    def compute(self, panel: KlinePanel, cache: Dict[str, np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """
+        计算全部指标矩阵，返回 指标名 -> (T, N) 矩阵。
+        cache：同一面板上的中间量备忘（键如 'EMA:12'、'STOCH:14'、'RSI:14'），参数扫描时
+        不同参数组共用周期相同的 EMA/随机值/RSI 均值，不重复计算；返回的矩阵与不带 cache 时相同。
+        """
+        close, high, low = panel['close'], panel['high'], panel['low']
+        cache = {} if cache is None else cache
+
+        def memo(key, fn):
+            if key not in cache:
+                cache[key] = fn()
+            return cache[key]
+
+        out = {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 递推中间量（快慢线 EMA、随机值、RSI 涨跌均值）一并保留，供增量状态接续
+            for name, (fast, slow, signal) in self.params['MACD'].items():
+                ema_fast = memo(f'EMA:{fast}', lambda: kernels.ema(close, kernels.ewm_alpha(fast, 0.0)))
+                ema_slow = memo(f'EMA:{slow}', lambda: kernels.ema(close, kernels.ewm_alpha(slow, 0.0)))
+                out[f'EMA_FAST_{name}'], out[f'EMA_SLOW_{name}'] = ema_fast, ema_slow
+                out[f'DIF_{name}'] = ema_fast - ema_slow
+                out[f'DEA_{name}'] = kernels.ema(out[f'DIF_{name}'], kernels.ewm_alpha(signal, 0.0))
+
+            kdj = self.params['KDJ']
+            out['STOCH'] = memo(f"STOCH:{kdj['k']}", lambda: kernels.stoch_raw(high, low, close, kdj['k']))
+            out['KDJ_K'] = kernels.rolling_mean(out['STOCH'], kdj['smooth_k'])
+            out['KDJ_D'] = kernels.rolling_mean(out['KDJ_K'], kdj['d'])
+            out['KDJ_J'] = 3 * out['KDJ_K'] - 2 * out['KDJ_D']
+
+            cci_length = self.params['CCI']['length']
+            out['CCI'] = memo(f'CCI:{cci_length}', lambda: kernels.cci(high, low, close, cci_length, CCI_CONSTANT))
+
+            rsi_length = self.params['RSI']['length']
+            gain_avg, loss_avg = memo(f'RSI:{rsi_length}', lambda: kernels.rsi_averages(close, rsi_length))
+            out['RSI_GAIN_AVG'], out['RSI_LOSS_AVG'] = gain_avg, loss_avg
+            out['RSI'] = 100 * gain_avg / (gain_avg + np.abs(loss_avg))
+
+            boll = self.params['BOLL']
+
+            def bandwidth():
+                mid = kernels.rolling_mean(close, boll['length'])
+                std = kernels.rolling_std(close, boll['length'], 1)
+                return ((mid + boll['std'] * std) - (mid - boll['std'] * std)) / close
+
+            out['BOLL_BANDWIDTH'] = memo(f"BOLL:{boll['length']}:{boll['std']}", bandwidth)
+            out['MA5'] = memo('MA5', lambda: kernels.rolling_mean(close, 5))
+        return out
+
+    def latest(self, panel: KlinePanel, ind: Dict[str, np.ndarray]) -> pd.DataFrame:
+        """
+        在各股票最新一根K线上判定信号，返回以股票代码为索引的快照：
+        MACD 金叉详情与动能、KDJ 信号名与 K/J、CCI、RSI 及底背离、BOLL 缩口，以及各指标是否可用（HAS_*）。
+        """
+        snap = self.evaluate(panel, ind, rows=1)
+        return pd.DataFrame({key: value[0] for key, value in snap.items()},
+                            index=pd.Index(panel.codes, name='股票代码'))
+
+    def evaluate(self, panel: KlinePanel, ind: Dict[str, np.ndarray], rows: int = None) -> Dict[str, np.ndarray]:
+        """
+        在面板末尾 rows 行（默认全部行）上逐行判定信号，返回 快照字段 -> (rows, N) 矩阵，字段同 latest()。
+        第 t 行的判定只用到第 t 行及之前的数据，与把面板截到第 t 行后调用 latest() 的结果一致，
+        历史回补可一次得到每个交易日的信号。
+        """
+        n_rows = panel.shape[0]
+        rows = n_rows if rows is None else rows
+        # 各判定行处各股票已有的K线数（右对齐面板，列首填充位置为非正数）
+        n = panel.lengths[None, :] - np.arange(rows - 1, -1, -1)[:, None] if rows else np.empty((0, panel.shape[1]))
+        close, low = panel['close'], panel['low']
+        window = self.params['DIVERGENCE_WINDOW']
+        min_rows = self.min_rows()
+        snap = {}
+
+        with np.errstate(invalid='ignore'):
+            for name in self.params['MACD']:
+                dif, dea = ind[f'DIF_{name}'], ind[f'DEA_{name}']
+                last_dif, last_dea = _lag(dif, 0, rows), _lag(dea, 0, rows)
+                prev_dif, prev_dea = _lag(dif, 1, rows), _lag(dea, 1, rows)
+                cross = (last_dif > last_dea) & (np.where(np.isnan(prev_dif), 0.0, prev_dif)
+                                                 <= np.where(np.isnan(prev_dea), 0.0, prev_dea))
+                snap[f'MACD_{name}_SIGNAL_DETAIL'] = np.where(
+                    cross, np.where((last_dif > 0) & (last_dea > 0), '零轴上金叉', '零轴下金叉'), '')
+                snap[f'DIF_{name}'] = last_dif
+
+                # 与 MACDAnalyzer._calculate_macd_momentum 的判定相同
+                change = last_dif - prev_dif
+                above = last_dif >= last_dea
+                snap[f'MACD_{name}_动能'] = np.select(
+                    [n < 2, above & (change > 0), above & (change <= 0), ~above & (change < 0), ~above & (change >= 0)],
+                    ["N/A (数据不足)", "加速上涨 (红柱加长)", "减速上涨 (红柱缩短)", "加速下跌 (绿柱加长)", "减速下跌 (绿柱缩短)"],
+                    default='')
+
+            # KDJ
+            kdj = self.params['KDJ']
+            k_line, d_line, j_line = ind['KDJ_K'], ind['KDJ_D'], ind['KDJ_J']
+            last_k, last_j = _lag(k_line, 0, rows), _lag(j_line, 0, rows)
+            kdj_cross = (last_k > _lag(d_line, 0, rows)) & (_lag(k_line, 1, rows) <= _lag(d_line, 1, rows))
+            last_low = _lag(low, 0, rows)
+            low_min = _lag_nanmin(low, range(1, window), rows)
+            is_divergence = ((last_low <= low_min * kdj['low_band'])
+                             & (last_k > _lag_nanmin(k_line, range(1, window), rows) * kdj['k_rise']))
+            kd_oversold = np.zeros(last_k.shape, dtype=bool)
+            for k in range(1, 5):
+                kd_oversold |= (_lag(k_line, k, rows) < kdj['oversold']) & (_lag(d_line, k, rows) < kdj['oversold'])
+            above_ma5 = _lag(close, 0, rows) > _lag(ind['MA5'], 0, rows)
+            kdj_signal = np.select(
+                [(_lag(j_line, 1, rows) < kdj['j_low']) & (last_j > kdj['j_rebound']) & kdj_cross,
+                 kdj_cross & is_divergence & (last_k < kdj['k_low']),
+                 kd_oversold & kdj_cross & above_ma5,
+                 kd_oversold & kdj_cross],
+                ["极值J线反转", "底背离金叉", "趋势确认金叉", "低位超卖金叉"],
+                default='')
+            snap['HAS_KDJ'] = n >= min_rows['KDJ']
+            snap['KDJ_SIGNAL'] = np.where(snap['HAS_KDJ'], kdj_signal, '')
+            snap['KDJ_K'] = last_k
+            snap['KDJ_J'] = last_j
+
+            snap['HAS_CCI'] = n >= min_rows['CCI']
+            snap['CCI'] = _lag(ind['CCI'], 0, rows)
+
+            rsi_params = self.params['RSI']
+            rsi = ind['RSI']
+            last_rsi = _lag(rsi, 0, rows)
+            snap['HAS_RSI'] = n >= min_rows['RSI']
+            snap['RSI'] = last_rsi
+            snap['RSI_DIVERGENCE'] = ((last_low <= low_min * rsi_params['low_band'])
+                                      & (last_rsi > _lag_nanmin(rsi, range(1, window), rows) * rsi_params['rise'])
+                                      & (last_rsi < rsi_params['ceiling']))
+
+            # 近 5 日带宽均值低于基准窗口内的带宽均值视为缩口
+            bandwidth = ind['BOLL_BANDWIDTH']
+            snap['HAS_BOLL'] = n >= min_rows['BOLL']
+            snap['BOLL_NARROW'] = (_trailing_nanmean(bandwidth, 5, rows)
+                                   < _trailing_nanmean(bandwidth, self.params['BOLL']['baseline'], rows))
+
+        return snap
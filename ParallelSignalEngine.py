@@ -0,0 +1,132 @@
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from IndicatorState import IndicatorState
+from PanelSignalEngine import KlinePanel, PanelSignalEngine
+
+# 每个分片至少包含的股票数，股票太少时进程启动开销大于并行收益，直接在本进程计算
+MIN_SHARD_SYMBOLS = 500
+
+
+class SharedPanelBlock:
+    """
+    把 KlinePanel 的 OHLC 与交易日矩阵放入一块共享内存（形状 (字段数 + 1, T, N)，交易日按 int64 存放），
+    工作进程按名称挂载后直接切片读取，面板数据不经 pickle 传输。
+    """
+
+    LAYERS = KlinePanel.FIELDS + ('date',)
+
+    def __init__(self, panel: KlinePanel):
+        self.shape = (len(self.LAYERS),) + panel.shape
+        self.shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(self.shape)) * 8, 1))
+        block = np.ndarray(self.shape, dtype=np.float64, buffer=self.shm.buf)
+        for i, field in enumerate(KlinePanel.FIELDS):
+            block[i] = panel[field]
+        block[-1] = panel.dates.view(np.int64).view(np.float64)
+        del block
+
+    @property
+    def spec(self) -> Dict:
+        return {'name': self.shm.name, 'shape': self.shape}
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _compute_shard(spec: Dict, params: Dict, codes: List[str], lengths: np.ndarray, start: int, stop: int,
+                   adj_ratio: Optional[np.ndarray]) -> Tuple[int, pd.DataFrame, Optional[IndicatorState]]:
+    """工作进程：挂载共享面板，计算 [start, stop) 列的指标与信号快照（可选同时生成指标状态）"""
+    shm = shared_memory.SharedMemory(name=spec['name'])
+    try:
+        block = np.ndarray(spec['shape'], dtype=np.float64, buffer=shm.buf)
+        # 面板按全市场最长历史右对齐，分片只取本分片最长历史对应的末尾行
+        rows = int(lengths.max()) if len(lengths) else 0
+        first = spec['shape'][1] - rows
+        values = {field: np.ascontiguousarray(block[i, first:, start:stop])
+                  for i, field in enumerate(KlinePanel.FIELDS)}
+        dates = block[-1, first:, start:stop].copy().view(np.int64).view('datetime64[ns]')
+        del block
+    finally:
+        shm.close()
+
+    panel = KlinePanel(codes, dates, values, lengths)
+    engine = PanelSignalEngine(params)
+    ind = engine.compute(panel)
+    snapshot = engine.latest(panel, ind)
+    state = IndicatorState.from_panel(engine, panel, ind, adj_ratio) if adj_ratio is not None else None
+    return start, snapshot, state
+
+
+class ParallelSignalEngine:
+    """
+    多进程面板指标计算
+    按列（股票）把面板切成连续分片交给进程池，各列指标互不依赖，分片计算与整表计算结果一致；
+    各分片结果按列序合并，输出与股票顺序、工作进程数无关。
+    """
+
+    def __init__(self, params: Dict, workers: int = 1):
+        """
+        Args:
+            params: 指标参数（同 PanelSignalEngine）
+            workers: 工作进程数，0 表示取 CPU 核数，1 为单进程
+        """
+        self.params = params
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+
+    def _shards(self, n_cols: int) -> List[Tuple[int, int]]:
+        n_shards = max(1, min(self.workers, n_cols // MIN_SHARD_SYMBOLS))
+        size = math.ceil(n_cols / n_shards) if n_cols else 0
+        return [(start, min(start + size, n_cols)) for start in range(0, n_cols, size)] if size else []
+
+    def run(self, panel: KlinePanel, adj_ratio: Optional[np.ndarray] = None) -> Tuple[
+            pd.DataFrame, Optional[IndicatorState]]:
+        """
+        计算面板全部股票的最新信号快照（PanelSignalEngine.latest 的输出）；
+        给出 adj_ratio 时同时返回指标状态（IndicatorState.from_panel）。
+        """
+        shards = self._shards(panel.shape[1])
+        if len(shards) > 1:
+            try:
+                return self._run_pool(panel, shards, adj_ratio)
+            except Exception as e:
+                print(f"[WARN] 多进程指标计算失败: {e}，改为单进程计算。")
+
+        engine = PanelSignalEngine(self.params)
+        ind = engine.compute(panel)
+        state = IndicatorState.from_panel(engine, panel, ind, adj_ratio) if adj_ratio is not None else None
+        return engine.latest(panel, ind), state
+
+    def _run_pool(self, panel: KlinePanel, shards: List[Tuple[int, int]],
+                  adj_ratio: Optional[np.ndarray]) -> Tuple[pd.DataFrame, Optional[IndicatorState]]:
+        print(f"[INFO] 多进程指标计算: {panel.shape[1]} 只股票分 {len(shards)} 片，{len(shards)} 个工作进程。")
+        # spawn 启动：主进程中已有线程池与数据库连接，fork 复制这些状态不安全
+        context = multiprocessing.get_context('spawn')
+        with SharedPanelBlock(panel) as block, \
+                ProcessPoolExecutor(max_workers=len(shards), mp_context=context) as executor:
+            futures = [
+                executor.submit(_compute_shard, block.spec, self.params, panel.codes[start:stop],
+                                panel.lengths[start:stop], start, stop,
+                                adj_ratio[start:stop] if adj_ratio is not None else None)
+                for start, stop in shards
+            ]
+            results = sorted((future.result() for future in futures), key=lambda item: item[0])
+
+        snapshot = pd.concat([item[1] for item in results])
+        state = None
+        if adj_ratio is not None:
+            state = IndicatorState.concat([item[2] for item in results], PanelSignalEngine(self.params))
+        return snapshot, state
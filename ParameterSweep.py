@@ -0,0 +1,348 @@
+import argparse
+import copy
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ParallelSignalEngine import SharedPanelBlock
+from PanelSignalEngine import KlinePanel, PanelSignalEngine
+from SignalManager import INDICATOR_PARAMS, MIN_HISTORY_ROWS
+
+# 默认扫描网格：扫描族 -> 参数名 -> 候选值。每个参数组只改动本指标族，其余指标保持 INDICATOR_PARAMS。
+# KDJ 各阈值只控制其中一种信号，按任一 KDJ 信号统计时被其他信号掩盖，因此按信号拆成扫描族：
+# KDJ_J 的 j_low / j_rebound 只统计“极值J线反转”，KDJ_DIV 的 k_low / k_rise 只统计“底背离金叉”
+DEFAULT_GRID = {
+    'MACD': {'fast': [6, 8, 12], 'slow': [13, 17, 26], 'signal': [5, 9]},
+    'KDJ_J': {'k': [9, 14], 'j_low': [-10, -5, 0], 'j_rebound': [0, 5, 10]},
+    'KDJ_DIV': {'k': [9, 14], 'k_low': [20, 30], 'k_rise': [1.05, 1.1]},
+    'RSI': {'length': [6, 14], 'rise': [1.02, 1.05, 1.1], 'ceiling': [40, 50]},
+}
+
+# 各扫描族的信号判定：PanelSignalEngine.evaluate 的输出 -> 布尔矩阵（KDJ 为任一 KDJ 信号）
+FAMILY_SIGNALS = {
+    'MACD': lambda snap: snap['MACD_SWEEP_SIGNAL_DETAIL'] != '',
+    'KDJ': lambda snap: snap['KDJ_SIGNAL'] != '',
+    'KDJ_J': lambda snap: snap['KDJ_SIGNAL'] == '极值J线反转',
+    'KDJ_DIV': lambda snap: snap['KDJ_SIGNAL'] == '底背离金叉',
+    'RSI': lambda snap: snap['RSI_DIVERGENCE'] & snap['HAS_RSI'],
+}
+
+# 按单一信号拆出的扫描族所改动的指标参数族
+PARAM_FAMILY = {'KDJ_J': 'KDJ', 'KDJ_DIV': 'KDJ'}
+
+# 工作进程内按共享块名称保留的面板与中间量备忘，同一进程先后处理的参数组共用
+_WORKER_STATE: Dict[str, Tuple[KlinePanel, Dict[str, np.ndarray]]] = {}
+
+
+def expand_grid(grid: Dict) -> List[Tuple[str, Dict]]:
+    """网格展开为 (指标族, 参数) 列表；MACD 只保留快线周期小于慢线周期的组合"""
+    points = []
+    for family, axes in grid.items():
+        if family not in FAMILY_SIGNALS:
+            raise ValueError(f"不支持扫描的指标族: {family}")
+        names = list(axes)
+        for values in itertools.product(*(axes[name] for name in names)):
+            point = dict(zip(names, values))
+            if family == 'MACD' and point.get('fast', 0) >= point.get('slow', math.inf):
+                continue
+            points.append((family, point))
+    return points
+
+
+def point_params(family: str, point: Dict) -> Dict:
+    """参数组对应的完整指标参数；MACD 参数组以单一周期 'SWEEP' 替换原有的双周期，KDJ_* 扫描族改动 KDJ 参数"""
+    params = copy.deepcopy(INDICATOR_PARAMS)
+    if family == 'MACD':
+        default = INDICATOR_PARAMS['MACD']['12269']
+        params['MACD'] = {'SWEEP': (point.get('fast', default[0]), point.get('slow', default[1]),
+                                    point.get('signal', default[2]))}
+    else:
+        target = PARAM_FAMILY.get(family, family)
+        params[target] = {**params[target], **point}
+    return params
+
+
+def forward_returns(panel: KlinePanel, horizon: int) -> np.ndarray:
+    """第 t 根K线出信号、次日开盘买入、持有到第 t + horizon 根收盘的收益（右对齐面板按行平移即为后续K线）"""
+    n_rows = panel.shape[0]
+    fwd = np.full(panel.shape, np.nan)
+    if horizon < 1 or n_rows <= horizon:
+        return fwd
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fwd[:n_rows - horizon] = panel['close'][horizon:] / panel['open'][1:n_rows - horizon + 1] - 1
+    return fwd
+
+
+def _fold_stats(signal: np.ndarray, fwd: np.ndarray, fold_of: np.ndarray, n_splits: int) -> List[Dict]:
+    """各时间段内的信号次数、平均前瞻收益与胜率"""
+    hit = signal & (fold_of >= 0) & np.isfinite(fwd)
+    folds, returns = fold_of[hit], fwd[hit]
+    counts = np.bincount(folds, minlength=n_splits)
+    sums = np.bincount(folds, weights=returns, minlength=n_splits)
+    wins = np.bincount(folds, weights=(returns > 0).astype(np.float64), minlength=n_splits)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means, rates = sums / counts, wins / counts
+    return [{'count': int(c), 'mean': float(m), 'hit_rate': float(r)} for c, m, r in zip(counts, means, rates)]
+
+
+def _evaluate_points(panel: KlinePanel, cache: Dict[str, np.ndarray], tasks: List[Tuple[int, str, Dict]],
+                     fwd: np.ndarray, fold_of: np.ndarray, n_splits: int) -> List[Tuple[int, List[Dict]]]:
+    results = []
+    for index, family, point in tasks:
+        engine = PanelSignalEngine(point_params(family, point))
+        snap = engine.evaluate(panel, engine.compute(panel, cache))
+        results.append((index, _fold_stats(FAMILY_SIGNALS[family](snap), fwd, fold_of, n_splits)))
+    return results
+
+
+def _sweep_chunk(spec: Dict, codes: List[str], lengths: np.ndarray, tasks: List[Tuple[int, str, Dict]],
+                 horizon: int, fold_of: np.ndarray, n_splits: int) -> List[Tuple[int, List[Dict]]]:
+    """工作进程：挂载共享面板（进程内只复制一次），逐个参数组计算信号并统计各时间段的前瞻收益"""
+    if spec['name'] not in _WORKER_STATE:
+        shm = shared_memory.SharedMemory(name=spec['name'])
+        try:
+            block = np.ndarray(spec['shape'], dtype=np.float64, buffer=shm.buf)
+            values = {field: block[i].copy() for i, field in enumerate(KlinePanel.FIELDS)}
+            dates = block[-1].copy().view(np.int64).view('datetime64[ns]')
+            del block
+        finally:
+            shm.close()
+        _WORKER_STATE.clear()
+        _WORKER_STATE[spec['name']] = (KlinePanel(codes, dates, values, lengths), {})
+    panel, cache = _WORKER_STATE[spec['name']]
+    return _evaluate_points(panel, cache, tasks, forward_returns(panel, horizon), fold_of, n_splits)
+
+
+class ParameterSweep:
+    """
+    技术指标参数扫描
+    在同一K线面板上批量评估 MACD / KDJ / RSI 的参数组：各参数组只替换本指标族的参数，
+    按信号出现后 horizon 日的前瞻收益（次日开盘买入、第 horizon 日收盘卖出）统计次数、均值与胜率。
+    评估区间按交易日切成 n_splits 个连续时间段，输出按各段均值排序的排名表，
+    以及逐段前推的样本外结果（用上一段最优的参数组评估下一段）。
+    参数组分块交给进程池，面板经共享内存传给工作进程，同一进程内周期相同的 EMA/随机值/RSI 均值只算一次。
+    """
+
+    def __init__(self, grid: Dict = None, horizon: int = 5, n_splits: int = 4, workers: int = 1,
+                 min_count: int = 30):
+        """
+        Args:
+            grid: 扫描网格（默认 DEFAULT_GRID）
+            horizon: 前瞻收益的持有交易日数
+            n_splits: 前推检验的时间段数
+            workers: 工作进程数，0 表示取 CPU 核数，1 为单进程
+            min_count: 某段信号次数少于此值时该段不参与排名与前推选择
+        """
+        self.grid = grid or DEFAULT_GRID
+        self.horizon = horizon
+        self.n_splits = max(1, int(n_splits))
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.min_count = min_count
+        self.points = expand_grid(self.grid)
+
+    def fold_index(self, panel: KlinePanel, start_date, end_date) -> np.ndarray:
+        """
+        各 (交易序号, 股票) 格子所属的时间段，区间外或截至当日K线数不足技术分析门槛的为 -1。
+        按区间内的交易日等分（而不是按格子数），同一交易日的信号必在同一段。
+        """
+        dates = panel.dates
+        in_range = ((dates >= np.datetime64(pd.to_datetime(start_date)))
+                    & (dates <= np.datetime64(pd.to_datetime(end_date))))
+        bars_so_far = panel.lengths[None, :] - np.arange(panel.shape[0] - 1, -1, -1)[:, None]
+        valid = in_range & (bars_so_far >= MIN_HISTORY_ROWS)
+        fold_of = np.full(panel.shape, -1, dtype=np.int64)
+        trading_days = np.unique(dates[valid])
+        if not len(trading_days):
+            return fold_of
+        edges = trading_days[np.linspace(0, len(trading_days), self.n_splits + 1).astype(np.int64)[1:-1]]
+        fold_of[valid] = np.searchsorted(edges, dates[valid], side='right')
+        return fold_of
+
+    def _chunks(self) -> List[List[Tuple[int, str, Dict]]]:
+        """参数组按指标族与周期排序后切成连续块，周期相同的参数组尽量落在同一进程以共用中间量"""
+        tasks = [(i, family, point) for i, (family, point) in enumerate(self.points)]
+        tasks.sort(key=lambda task: (task[1], json.dumps(task[2], sort_keys=True)))
+        n_chunks = max(1, min(self.workers, len(tasks)))
+        size = math.ceil(len(tasks) / n_chunks)
+        return [tasks[i:i + size] for i in range(0, len(tasks), size)]
+
+    def run(self, panel: KlinePanel, start_date, end_date) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """返回 (排名表, 前推检验表)"""
+        fold_of = self.fold_index(panel, start_date, end_date)
+        chunks = self._chunks()
+        started = time.time()
+        results = None
+        if len(chunks) > 1:
+            try:
+                results = self._run_pool(panel, chunks, fold_of)
+            except Exception as e:
+                print(f"[WARN] 多进程参数扫描失败: {e}，改为单进程计算。")
+        if results is None:
+            tasks = [task for chunk in chunks for task in chunk]
+            results = _evaluate_points(panel, {}, tasks, forward_returns(panel, self.horizon), fold_of, self.n_splits)
+        results.sort(key=lambda item: item[0])
+        print(f"[INFO] 参数扫描: {len(self.points)} 组参数，{panel.shape[1]} 只股票，耗时 {time.time() - started:.1f}s。")
+
+        folds = [stats for _, stats in results]
+        return self._ranking(folds), self._walk_forward(folds)
+
+    def _run_pool(self, panel: KlinePanel, chunks, fold_of: np.ndarray) -> List[Tuple[int, List[Dict]]]:
+        print(f"[INFO] 多进程参数扫描: {len(self.points)} 组参数分 {len(chunks)} 块。")
+        # spawn 启动：与 ParallelSignalEngine 相同，避免 fork 复制主进程的线程与连接
+        context = multiprocessing.get_context('spawn')
+        with SharedPanelBlock(panel) as block, \
+                ProcessPoolExecutor(max_workers=len(chunks), mp_context=context) as executor:
+            futures = [executor.submit(_sweep_chunk, block.spec, panel.codes, panel.lengths, chunk,
+                                       self.horizon, fold_of, self.n_splits) for chunk in chunks]
+            return [item for future in futures for item in future.result()]
+
+    def _ranking(self, folds: List[List[Dict]]) -> pd.DataFrame:
+        rows = []
+        for (family, point), stats in zip(self.points, folds):
+            counts = np.array([s['count'] for s in stats])
+            means = np.array([s['mean'] for s in stats])
+            rates = np.array([s['hit_rate'] for s in stats])
+            usable = counts >= self.min_count
+            total = counts.sum()
+            row = {
+                '指标': family,
+                '参数': ', '.join(f'{k}={v}' for k, v in point.items()),
+                '信号次数': int(total),
+                '平均收益': float(np.nansum(means * counts) / total) if total else np.nan,
+                '胜率': float(np.nansum(rates * counts) / total) if total else np.nan,
+                '分段平均收益': float(means[usable].mean()) if usable.any() else np.nan,
+                '分段收益标准差': float(means[usable].std(ddof=1)) if usable.sum() > 1 else np.nan,
+                '正收益段数': int((means[usable] > 0).sum()),
+            }
+            for i, s in enumerate(stats):
+                row[f'第{i + 1}段收益'] = s['mean']
+            rows.append(row)
+        ranking = pd.DataFrame(rows)
+        if ranking.empty:
+            return ranking
+        ranking = ranking.sort_values(['分段平均收益', '平均收益'], ascending=False, na_position='last')
+        ranking.insert(0, '排名', ranking.groupby('指标').cumcount() + 1)
+        return ranking.sort_values(['指标', '排名'], ignore_index=True)
+
+    def _walk_forward(self, folds: List[List[Dict]]) -> pd.DataFrame:
+        """每个指标族：第 i - 1 段平均收益最高的参数组（信号次数达标）在第 i 段的表现"""
+        rows = []
+        for family in self.grid:
+            members = [i for i, (f, _) in enumerate(self.points) if f == family]
+            for fold in range(1, self.n_splits):
+                candidates = [i for i in members if folds[i][fold - 1]['count'] >= self.min_count]
+                if not candidates:
+                    continue
+                best = max(candidates, key=lambda i: folds[i][fold - 1]['mean'])
+                rows.append({
+                    '指标': family,
+                    '选参段': fold,
+                    '检验段': fold + 1,
+                    '参数': ', '.join(f'{k}={v}' for k, v in self.points[best][1].items()),
+                    '选参段收益': folds[best][fold - 1]['mean'],
+                    '检验段信号次数': folds[best][fold]['count'],
+                    '检验段收益': folds[best][fold]['mean'],
+                    '检验段胜率': folds[best][fold]['hit_rate'],
+                })
+        return pd.DataFrame(rows)
+
+    @staticmethod
+    def save(ranking: pd.DataFrame, walk_forward: pd.DataFrame, path: str):
+        with pd.ExcelWriter(path) as writer:
+            ranking.to_excel(writer, sheet_name='排名', index=False)
+            walk_forward.to_excel(writer, sheet_name='滚动前推', index=False)
+        print(f"[INFO] 参数扫描结果已保存: {path}")
+
+
+def load_panel(engine, calendar, start_date: str, end_date: str, symbols: List[str] = None) -> KlinePanel:
+    """从 stock_daily_kline 读取 [起始日前的指标预热窗口, 截止日] 的前复权K线并构建面板"""
+    from sqlalchemy import text
+    from DataManager.KlineHistoryLoader import KlineHistoryLoader
+    from SignalManager import TASignalProcessor
+
+    if not symbols:
+        with engine.connect() as conn:
+            symbols = [row[0] for row in conn.execute(
+                text(f"SELECT DISTINCT symbol FROM {KlineHistoryLoader.TABLE_NAME} ORDER BY symbol"))]
+    warmup_start = calendar.get_lookback_start(start_date, TASignalProcessor.required_lookback())
+    hist = KlineHistoryLoader(engine, calendar).read_typed(symbols, warmup_start, end_date)
+    pure_codes = TASignalProcessor._pure_codes(symbols)
+    hist = TASignalProcessor._prepare_history(hist, pure_codes)
+    return KlinePanel.from_long(hist, pure_codes)
+
+
+def _self_check():
+    """测试代码：中间量备忘不改变指标结果；单进程与多进程扫描结果一致"""
+    from DataManager.DataProvider import FakeMarketProvider
+
+    mk = FakeMarketProvider(n_symbols=600, n_days=400, seed=11).market
+    values = {field: mk[field] * mk['adj_ratio'] for field in KlinePanel.FIELDS}
+    dates = np.repeat(np.asarray(mk['dates'], dtype='datetime64[ns]')[:, None], len(mk['codes']), axis=1)
+    panel = KlinePanel(list(mk['codes']), dates, values, np.full(len(mk['codes']), len(mk['dates'])))
+
+    shared = {}
+    for family, point in expand_grid(DEFAULT_GRID)[:6]:
+        engine = PanelSignalEngine(point_params(family, point))
+        plain, memoized = engine.compute(panel), engine.compute(panel, shared)
+        assert all(np.array_equal(plain[k], memoized[k], equal_nan=True) for k in plain), "中间量备忘改变了指标结果"
+    print(f"[INFO] 中间量备忘检查通过（共用 {len(shared)} 个中间量）。")
+
+    first_day, last_day = str(pd.Timestamp(mk['dates'][100]).date()), str(pd.Timestamp(mk['dates'][-1]).date())
+    single = ParameterSweep(workers=1).run(panel, first_day, last_day)
+    pooled = ParameterSweep(workers=2).run(panel, first_day, last_day)
+    pd.testing.assert_frame_equal(single[0], pooled[0])
+    pd.testing.assert_frame_equal(single[1], pooled[1])
+    print("[INFO] 单进程与多进程扫描结果一致。")
+    # J 线阈值只按“极值J线反转”统计，其余参数相同时改动 j_rebound 应改变信号次数
+    j_counts = single[0][single[0]['指标'] == 'KDJ_J'].groupby(
+        single[0]['参数'].str.replace(r'j_rebound=[^,]+', '', regex=True))['信号次数'].nunique()
+    assert (j_counts > 1).all(), "j_rebound 不影响 KDJ_J 的统计结果"
+    print(single[0].head(10).to_string())
+    print(single[1].to_string())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='技术指标参数扫描（前瞻收益 + 分段前推检验）')
+    parser.add_argument('start_date', nargs='?', help='评估起始日期 YYYY-MM-DD')
+    parser.add_argument('end_date', nargs='?', help='评估截止日期 YYYY-MM-DD')
+    parser.add_argument('--horizon', type=int, default=5, help='前瞻收益的持有交易日数')
+    parser.add_argument('--splits', type=int, default=4, help='前推检验的时间段数')
+    parser.add_argument('--min-count', type=int, default=30, help='参与排名的每段最少信号次数')
+    parser.add_argument('--workers', type=int, default=None, help='工作进程数（默认取配置 signal_workers）')
+    parser.add_argument('--grid', help='扫描网格 JSON 文件（格式同 DEFAULT_GRID）')
+    parser.add_argument('--output', default='parameter_sweep.xlsx', help='结果 Excel 路径')
+    parser.add_argument('--self-check', action='store_true', help='用合成行情运行自检')
+    args = parser.parse_args()
+
+    if args.self_check:
+        _self_check()
+    else:
+        if not (args.start_date and args.end_date):
+            parser.error('需要 start_date 与 end_date')
+        from sqlalchemy import create_engine
+        from ConfigParser import Config
+        from DataManager.CalendarManager import TradingCalendarAnalyzer
+        from DataManager.DataProvider import create_provider
+
+        config = Config()
+        grid = None
+        if args.grid:
+            with open(args.grid, 'r', encoding='utf-8') as f:
+                grid = json.load(f)
+        calendar = TradingCalendarAnalyzer(provider=create_provider(config))
+        db_engine = create_engine(config.get_db_connection_string())
+        sweep_panel = load_panel(db_engine, calendar, args.start_date, args.end_date)
+        sweep = ParameterSweep(grid, horizon=args.horizon, n_splits=args.splits, min_count=args.min_count,
+                               workers=config.SIGNAL_WORKERS if args.workers is None else args.workers)
+        ranking_df, walk_forward_df = sweep.run(sweep_panel, args.start_date, args.end_date)
+        print(ranking_df.head(20).to_string())
+        ParameterSweep.save(ranking_df, walk_forward_df, args.output)
@@ -2,6 +2,14 @@
 CREATE TABLE public.stock_daily_kline ( symbol varchar(10) NOT NULL, trade_date date NOT NULL, "open" numeric(16, 4) NULL, "close" numeric(16, 4) NULL, high numeric(16, 4) NULL, low numeric(16, 4) NULL, close_normal numeric(16, 4) NULL, adj_ratio numeric(24, 12) NULL, CONSTRAINT stock_daily_kline_pkey PRIMARY KEY (symbol, trade_date), CONSTRAINT unique_stock_daily_kline_symbol_date UNIQUE (symbol, trade_date));
 
 
+--stock_adj_factor definition（前复权因子分段：自 start_date 起 adj_ratio = 前复权价 / 不复权价）
+CREATE TABLE public.stock_adj_factor ( symbol varchar(10) NOT NULL, start_date date NOT NULL, adj_ratio numeric(24, 12) NOT NULL, updated_at timestamp DEFAULT CURRENT_TIMESTAMP NULL, CONSTRAINT stock_adj_factor_pkey PRIMARY KEY (symbol, start_date));
+
+
+--etl_run_manifest definition（任务运行清单：按交易日与输入指纹记录同步状态）
+CREATE TABLE public.etl_run_manifest ( job_name varchar(50) NOT NULL, session_date date NOT NULL, fingerprint varchar(64) NOT NULL, status varchar(16) NOT NULL, detail text NULL, started_at timestamp DEFAULT CURRENT_TIMESTAMP NULL, finished_at timestamp NULL, CONSTRAINT etl_run_manifest_pkey PRIMARY KEY (job_name, session_date, fingerprint));
+
+
 -- app_stock_strategy_report definition
 CREATE TABLE app_stock_strategy_report ( archive_date date NOT NULL, stock_code varchar(20) NOT NULL, stock_name varchar(50) NULL, industry varchar(50) NULL, close_price numeric(12, 2) NULL, is_strong_stock varchar(10) NULL, is_vol_price_rise varchar(10) NULL, consecutive_up_days int4 DEFAULT 0 NULL, high_vol_days int4 DEFAULT 0 NULL, is_top10_industry varchar(10) NULL, is_full_bullish varchar(10) NULL, macd_12269_signal varchar(50) NULL, macd_12269_momentum varchar(50) NULL, macd_12269_dif numeric(12, 4) NULL, macd_6135_signal varchar(50) NULL, macd_6135_momentum varchar(50) NULL, macd_6135_dif numeric(12, 4) NULL, kdj_signal text NULL, cci_signal varchar(100) NULL, rsi_signal varchar(100) NULL, boll_signal varchar(50) NULL, report_buy_count int4 DEFAULT 0 NULL, fund_flow_trend numeric(18, 2) NULL, fund_inflow_5d numeric(18, 2) NULL, fund_inflow_10d numeric(18, 2) NULL, fund_inflow_20d numeric(18, 2) NULL, stock_link text NULL, created_at timestamp DEFAULT CURRENT_TIMESTAMP NULL, CONSTRAINT app_stock_strategy_report_pkey PRIMARY KEY (archive_date, stock_code));
 CREATE INDEX idx_strategy_report_code ON app_stock_strategy_report USING btree (stock_code);
@@ -0,0 +1,194 @@
+import argparse
+import io
+import os
+from typing import List
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from DataManager.KlineHistoryLoader import KlineHistoryLoader
+from PanelSignalEngine import KlinePanel, PanelSignalEngine
+from SignalManager import INDICATOR_PARAMS, MIN_HISTORY_ROWS, TASignalProcessor
+
+# 回补写入 app_stock_strategy_report 的技术信号列：库表列名 -> TASignalProcessor.signal_texts 的列名
+SIGNAL_COLUMN_MAP = {
+    'macd_12269_signal': 'MACD_12269_Signal',
+    'macd_12269_momentum': 'MACD_12269_动能',
+    'macd_12269_dif': 'MACD_12269_DIF',
+    'macd_6135_signal': 'MACD_6135_Signal',
+    'macd_6135_momentum': 'MACD_6135_动能',
+    'macd_6135_dif': 'MACD_6135_DIF',
+    'kdj_signal': 'KDJ_Signal',
+    'cci_signal': 'CCI_Signal',
+    'rsi_signal': 'RSI_Signal',
+    'boll_signal': 'BOLL_Signal',
+}
+
+REPORT_COLUMNS = ['archive_date', 'stock_code', 'close_price'] + list(SIGNAL_COLUMN_MAP)
+
+
+class SignalBackfill:
+    """
+    技术信号历史回补
+    按股票分块读取 [起始日前的指标预热窗口, 截止日] 的K线，一次计算全部指标矩阵，
+    再用 PanelSignalEngine.evaluate 在每一根K线上判定信号（不再只看最后一行），
+    得到区间内每个交易日的 MACD 金叉/动能、KDJ、CCI、RSI、BOLL 信号，
+    经暂存表按归档日期逐日合并进 app_stock_strategy_report。
+    """
+
+    TABLE_NAME = 'app_stock_strategy_report'
+    KLINE_TABLE = 'stock_daily_kline'
+
+    def __init__(self, engine, calendar, chunk_size: int = 1000):
+        """
+        Args:
+            engine: SQLAlchemy 引擎
+            calendar: TradingCalendarAnalyzer，用于推算预热窗口的起始日
+            chunk_size: 每块计算的股票数（控制指标矩阵占用的内存）
+        """
+        self.engine = engine
+        self.calendar = calendar
+        self.loader = KlineHistoryLoader(engine, calendar)
+        self.chunk_size = max(1, int(chunk_size))
+        self.signal_engine = PanelSignalEngine(INDICATOR_PARAMS)
+
+    def all_symbols(self) -> List[str]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(f"SELECT DISTINCT symbol FROM {self.KLINE_TABLE} ORDER BY symbol"))
+            return [row[0] for row in rows]
+
+    def compute(self, symbols: List[str], start_date: str, end_date: str) -> pd.DataFrame:
+        """计算 symbols 在 [start_date, end_date] 内每个交易日的技术信号，返回按库表列名整理的报告行"""
+        warmup_start = self.calendar.get_lookback_start(start_date, TASignalProcessor.required_lookback())
+        frames = []
+        for i in range(0, len(symbols), self.chunk_size):
+            chunk = symbols[i:i + self.chunk_size]
+            hist = self.loader.read_typed(chunk, warmup_start, end_date,
+                                          columns=KlineHistoryLoader.COLUMNS + ['close_normal'])
+            if hist.empty:
+                continue
+            frames.append(self._compute_chunk(hist, TASignalProcessor._pure_codes(chunk), start_date, end_date))
+            print(f"[INFO] 信号回补: 已计算 {min(i + self.chunk_size, len(symbols))}/{len(symbols)} 只股票。")
+        if not frames:
+            return pd.DataFrame(columns=REPORT_COLUMNS)
+        return pd.concat(frames, ignore_index=True).sort_values(['archive_date', 'stock_code'], ignore_index=True)
+
+    def _compute_chunk(self, hist: pd.DataFrame, pure_codes: List[str], start_date: str, end_date: str) -> pd.DataFrame:
+        hist = TASignalProcessor._prepare_history(hist, pure_codes)
+        panel = KlinePanel.from_long(hist, pure_codes)
+        snap = self.signal_engine.evaluate(panel, self.signal_engine.compute(panel))
+
+        # 每个 (交易序号, 股票) 格子：落在回补区间内、且截至当日K线数达到技术分析门槛的才输出
+        n_rows = panel.shape[0]
+        bars_so_far = panel.lengths[None, :] - np.arange(n_rows - 1, -1, -1)[:, None]
+        mask = ((panel.dates >= np.datetime64(pd.to_datetime(start_date)))
+                & (panel.dates <= np.datetime64(pd.to_datetime(end_date)))
+                & (bars_so_far >= MIN_HISTORY_ROWS))
+        rows, cols = np.nonzero(mask)
+        if not len(rows):
+            return pd.DataFrame(columns=REPORT_COLUMNS)
+
+        texts = TASignalProcessor.signal_texts(pd.DataFrame({key: value[rows, cols] for key, value in snap.items()}))
+        # 与日报合并阶段的口径一致：RSI 只保留首段文字，无动能记为空串
+        texts['RSI_Signal'] = texts['RSI_Signal'].str.split(' ').str[0]
+        report = texts.rename(columns={v: k for k, v in SIGNAL_COLUMN_MAP.items()})[list(SIGNAL_COLUMN_MAP)]
+        report.insert(0, 'stock_code', np.asarray(panel.codes, dtype=object)[cols])
+        report.insert(0, 'archive_date', panel.dates[rows, cols])
+
+        # 收盘价取当日不复权价（与日报的最新价口径相同）
+        closes = hist[['股票代码', 'date', 'close_normal']].rename(
+            columns={'股票代码': 'stock_code', 'date': 'archive_date', 'close_normal': 'close_price'})
+        report = report.merge(closes, on=['stock_code', 'archive_date'], how='left')
+
+        # 日报只保留有信号的股票，这里按其中的技术信号部分筛选
+        signal_cols = ['macd_12269_signal', 'macd_6135_signal', 'kdj_signal', 'cci_signal', 'rsi_signal', 'boll_signal']
+        report = report[(report[signal_cols] != '').any(axis=1)]
+        return report[REPORT_COLUMNS]
+
+    def write(self, report: pd.DataFrame, overwrite: bool = False) -> int:
+        """
+        COPY 进暂存表后按归档日期逐日合并（每个日期一个事务）。
+        已有的 (archive_date, stock_code) 行默认保留不动（当日流水线写入的完整记录优先），
+        overwrite=True 时只覆盖其中的技术信号列。返回写入的行数。
+        """
+        if report.empty:
+            return 0
+        stage = f"{self.TABLE_NAME}_backfill_{os.getpid()}"
+        rows = report.copy()
+        rows['archive_date'] = pd.to_datetime(rows['archive_date']).dt.strftime('%Y-%m-%d')
+
+        with self.engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {stage}"))
+            conn.execute(text(f"CREATE UNLOGGED TABLE {stage} (LIKE {self.TABLE_NAME} INCLUDING DEFAULTS)"))
+
+        written = 0
+        try:
+            self._copy(rows, stage)
+            col_list = ', '.join(f'"{c}"' for c in REPORT_COLUMNS)
+            if overwrite:
+                set_list = ', '.join(f'"{c}" = EXCLUDED."{c}"' for c in SIGNAL_COLUMN_MAP)
+                conflict = f"DO UPDATE SET {set_list}"
+            else:
+                conflict = "DO NOTHING"
+            for archive_date in sorted(rows['archive_date'].unique()):
+                with self.engine.begin() as conn:
+                    result = conn.execute(text(f"""
+                        INSERT INTO {self.TABLE_NAME} ({col_list})
+                        SELECT {col_list} FROM {stage} WHERE archive_date = :archive_date
+                        ON CONFLICT (archive_date, stock_code) {conflict}
+                    """), {'archive_date': archive_date})
+                written += result.rowcount
+                print(f" - [数据库] {self.TABLE_NAME} 回补 {archive_date}: {result.rowcount} 条")
+        finally:
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(text(f"DROP TABLE IF EXISTS {stage}"))
+            except Exception as e:
+                print(f"[WARN] 清理暂存表 {stage} 失败: {e}")
+        return written
+
+    def _copy(self, rows: pd.DataFrame, stage: str):
+        output = io.StringIO()
+        rows[REPORT_COLUMNS].to_csv(output, sep='\t', header=False, index=False, encoding='utf-8')
+        output.seek(0)
+
+        raw_conn = self.engine.raw_connection()
+        cursor = raw_conn.cursor()
+        try:
+            columns = ', '.join(f'"{col}"' for col in REPORT_COLUMNS)
+            cursor.copy_expert(f"COPY {stage} ({columns}) FROM STDIN WITH CSV DELIMITER '\t'", output)
+            raw_conn.commit()
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            raw_conn.close()
+
+    def run(self, start_date: str, end_date: str, symbols: List[str] = None, overwrite: bool = False) -> int:
+        symbols = symbols or self.all_symbols()
+        print(f">>> 技术信号历史回补: {start_date} 至 {end_date}，{len(symbols)} 只股票。")
+        report = self.compute(symbols, start_date, end_date)
+        print(f"[INFO] 共 {report['archive_date'].nunique() if not report.empty else 0} 个交易日、{len(report)} 条信号记录。")
+        written = self.write(report, overwrite=overwrite)
+        print(f">>> 技术信号历史回补完成，写入 {written} 条。")
+        return written
+
+
+if __name__ == "__main__":
+    from ConfigParser import Config
+    from DataManager.CalendarManager import TradingCalendarAnalyzer
+    from DataManager.DataProvider import create_provider
+
+    parser = argparse.ArgumentParser(description='回补 app_stock_strategy_report 的历史技术信号')
+    parser.add_argument('start_date', help='起始日期 YYYY-MM-DD')
+    parser.add_argument('end_date', help='截止日期 YYYY-MM-DD')
+    parser.add_argument('--overwrite', action='store_true', help='覆盖已有记录中的技术信号列')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='每块计算的股票数')
+    args = parser.parse_args()
+
+    config = Config()
+    calendar = TradingCalendarAnalyzer(provider=create_provider(config))
+    backfill = SignalBackfill(create_engine(config.get_db_connection_string()), calendar, chunk_size=args.chunk_size)
+    backfill.run(args.start_date, args.end_date, overwrite=args.overwrite)
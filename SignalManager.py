@@ -1,30 +1,83 @@
+import math
+import numpy as np
 import pandas as pd
 from typing import List, Dict
 from MACDAnalyzer import MACDAnalyzer
+from PanelSignalEngine import KlinePanel, PanelSignalEngine
+from IndicatorState import IndicatorState, IndicatorStateStore
+from ParallelSignalEngine import ParallelSignalEngine
+from IndicatorMemo import IndicatorMemoCache
+from DataManager.KlineHistoryLoader import KlineHistoryLoader
 from FormatManager.ShareCodeFormatMgr import format_stock_code
+
+# 各指标参数（历史加载窗口由此推导）
+INDICATOR_PARAMS = {
+    'MACD': MACDAnalyzer.MACD_PERIODS,
+    # 信号阈值：J 线由 j_low 以下回升到 j_rebound 以上为极值反转；K < k_low 的底背离金叉要求
+    # 最低价不高于前期低点 × low_band 且 K 高于前期 K 低点 × k_rise；K、D 均低于 oversold 为超卖
+    'KDJ': {'k': 14, 'd': 3, 'smooth_k': 3,
+            'j_low': 0, 'j_rebound': 5, 'k_low': 30, 'oversold': 20, 'low_band': 1.02, 'k_rise': 1.1},
+    'CCI': {'length': 14},
+    # RSI 底背离：最低价不高于前期低点 × low_band，RSI 高于前期低点 × rise 且低于 ceiling
+    'RSI': {'length': 14, 'low_band': 1.02, 'rise': 1.05, 'ceiling': 50},
+    # baseline：带宽均值的比较基准窗口（交易日）
+    'BOLL': {'length': 20, 'std': 2, 'baseline': 250},
+    # 底背离判断回看的K线数
+    'DIVERGENCE_WINDOW': 10,
+}
+
+# 参与技术分析的最少K线数
+MIN_HISTORY_ROWS = 30
+
+# 递推类指标（EMA / Wilder RSI）截断历史后，初值残留权重低于该值即视为与全量历史计算一致
+EMA_TOLERANCE = 1e-6
+
+
 class TASignalProcessor:
     """技术指标信号处理类"""
 
-    def __init__(self, analyzer_instance):
+    def __init__(self, analyzer_instance, workers: int = 1, memo_cache: IndicatorMemoCache = None):
+        """
+        Args:
+            analyzer_instance: 所属的分析器实例
+            workers: 指标计算的工作进程数（0 取 CPU 核数，1 单进程）
+            memo_cache: 可选的指标结果缓存，K线未变化的股票直接复用上次的信号快照
+        """
         self.analyzer = analyzer_instance
+        self.workers = workers
+        self.memo_cache = memo_cache
 
-    def _classify_cci_level(self, cci_value: float) -> str:
-        """根据CCI值分类"""
-        if pd.isna(cci_value):
-            return 'N/A'
-        if cci_value > 200: return f'极度超买 ({cci_value:.2f})'
-        elif cci_value >= 100: return f'强势超买 ({cci_value:.2f})'
-        elif cci_value > -100: return ''
-        elif cci_value >= -200: return f'弱势超卖 ({cci_value:.2f})'
-        else: return f'极度超卖 ({cci_value:.2f})'
+    @staticmethod
+    def _ema_warmup(alpha: float) -> int:
+        """EMA 初值残留权重 (1-alpha)^n 降到 EMA_TOLERANCE 以下所需的K线数"""
+        return math.ceil(math.log(EMA_TOLERANCE) / math.log(1.0 - alpha))
 
-    def process_signals(self, all_codes: List[str], hist_df_all: pd.DataFrame, spot_df: pd.DataFrame) -> Dict[
-        str, pd.DataFrame]:
-
-        print(f"\n正在对 {len(all_codes)} 只股票进行技术分析...")
+    @classmethod
+    def required_lookback(cls, params: Dict = None) -> int:
+        """
+        按指标参数推导计算最新信号所需的交易日数：
+        EMA 类取收敛所需预热长度，窗口类取窗口长度加上信号判断回看的K线数，再取最大值。
+        """
+        params = params or INDICATOR_PARAMS
+        divergence = params['DIVERGENCE_WINDOW']
+        needs = []
+        for fast, slow, signal in params['MACD'].values():
+            # DEA 是 DIF 的 EMA：先等慢线收敛，再等信号线收敛；金叉与动能再多看 1 根
+            needs.append(cls._ema_warmup(2.0 / (slow + 1)) + cls._ema_warmup(2.0 / (signal + 1)) + 1)
+        kdj = params['KDJ']
+        # J 线反转看前一根，超卖看最近 5 根
+        needs.append(kdj['k'] + kdj['smooth_k'] + kdj['d'] + max(divergence, 5))
+        needs.append(params['CCI']['length'])
+        rsi_len = params['RSI']['length']
+        needs.append(rsi_len + cls._ema_warmup(1.0 / rsi_len) + divergence)
+        boll = params['BOLL']
+        needs.append(boll['length'] + boll['baseline'])
+        return max(needs)
 
+    @staticmethod
+    def _empty_signals() -> Dict[str, pd.DataFrame]:
         # 初始化为 DataFrame，避免后续转
-        ta_signals = {
+        return {
             'MACD_12269': pd.DataFrame(columns=['股票代码', 'MACD_12269_Signal']),
             'MACD_6135': pd.DataFrame(columns=['股票代码', 'MACD_6135_Signal']),
             'KDJ': pd.DataFrame(columns=['股票代码', 'KDJ_Signal']),
@@ -35,6 +88,37 @@ class TASignalProcessor:
                 columns=['股票代码', 'MACD_12269_DIF', 'MACD_12269_动能', 'MACD_6135_DIF', 'MACD_6135_动能']),
         }
 
+    @staticmethod
+    def _pure_codes(all_codes: List[str]) -> List[str]:
+        return [c[2:] if str(c).startswith(('sh', 'sz', 'bj')) else c for c in all_codes]
+
+    @staticmethod
+    def _prepare_history(hist_df_all: pd.DataFrame, pure_codes_list: List[str]) -> pd.DataFrame:
+        """K线长表整理：提取 6 位代码、统一日期列名、只保留待分析股票、价格列转为 float64"""
+        # 只对去重后的 symbol 提取一次代码，再按类别编码映射回各行（编码 -1 即空值，落到末尾的 'N/A'）
+        symbols = hist_df_all['symbol'].astype('category')
+        categories = pd.Series(symbols.cat.categories.astype(str))
+        extracted_digits = categories.str.extract(r'(\d{6})', expand=False).fillna('N/A').str.zfill(6)
+        hist_df_all['股票代码'] = np.append(extracted_digits.to_numpy(), 'N/A')[symbols.cat.codes.to_numpy()]
+
+        if 'date' not in hist_df_all.columns and 'trade_date' in hist_df_all.columns:
+            hist_df_all.rename(columns={'trade_date': 'date'}, inplace=True)
+
+        hist_df_all = hist_df_all[hist_df_all['股票代码'].isin(set(pure_codes_list))].copy()
+
+        # 价格列整表一次转为 float64（KlineHistoryLoader 读出的已是 float64，直接跳过）
+        for col in ['close', 'open', 'high', 'low']:
+            if col in hist_df_all.columns and not pd.api.types.is_float_dtype(hist_df_all[col]):
+                hist_df_all[col] = pd.to_numeric(hist_df_all[col], errors='coerce').astype('float64')
+        return hist_df_all
+
+    def process_signals(self, all_codes: List[str], hist_df_all: pd.DataFrame, spot_df: pd.DataFrame) -> Dict[
+        str, pd.DataFrame]:
+
+        print(f"\n正在对 {len(all_codes)} 只股票进行技术分析...")
+
+        ta_signals = self._empty_signals()
+
         if hist_df_all.empty:
             print("[WARN] 历史数据为空，跳过技术分析。")
             return {key: pd.DataFrame(columns=['股票代码', f'{key}_Signal']) for key in ta_signals.keys()}
@@ -44,169 +128,245 @@ class TASignalProcessor:
             print("[ERROR] K线数据中缺少 'symbol' 列！")
             return {key: pd.DataFrame(columns=['股票代码', f'{key}_Signal']) for key in ta_signals.keys()}
 
-        symbol_str = hist_df_all['symbol'].astype(str)
-        extracted_digits = symbol_str.str.extract(r'(\d{6})', expand=False).fillna('N/A')
-        hist_df_all['股票代码'] = extracted_digits.str.zfill(6)
+        pure_codes_list = self._pure_codes(all_codes)
+        hist_df_all = self._prepare_history(hist_df_all, pure_codes_list)
 
-        if 'date' not in hist_df_all.columns and 'trade_date' in hist_df_all.columns:
-            hist_df_all.rename(columns={'trade_date': 'date'}, inplace=True)
+        missing = [col for col in ['open', 'high', 'low', 'close'] if col not in hist_df_all.columns]
+        if missing:
+            print(f"[ERROR] K线数据中缺少必要的 OHLC 列 {missing}，跳过技术分析。")
+            return ta_signals
+
+        # 全部股票排成对齐矩阵，一次性计算指标并在最新K线上判定信号
+        panel = KlinePanel.from_long(hist_df_all, pure_codes_list, min_rows=MIN_HISTORY_ROWS)
+        print(f"[INFO] 指标面板: {panel.shape[1]} 只股票 × {panel.shape[0]} 根K线。")
+        return self._build_ta_signals(all_codes, pure_codes_list, self._memoized_snapshot(panel))
+
+    def _memoized_snapshot(self, panel: KlinePanel) -> Dict[str, Dict]:
+        """面板各股票的信号快照：K线内容未变的股票取缓存，其余股票计算后写回缓存"""
+        memo = self.memo_cache
+        if memo is None or not memo.enabled:
+            snapshot, _ = ParallelSignalEngine(INDICATOR_PARAMS, self.workers).run(panel)
+            return snapshot.to_dict('index')
 
-        hist_df_all.sort_values(['股票代码', 'date'], inplace=True)
-        pure_codes_list = [c[2:] if str(c).startswith(('sh', 'sz', 'bj')) else c for c in all_codes]
-        code_set = set(pure_codes_list)
-        hist_df_all = hist_df_all[hist_df_all['股票代码'].isin(code_set)].copy()
-
-        for code in all_codes:
-            # 2. 提取纯数字代码用于单只股票的精确匹配
-            pure_code = code[2:] if str(code).startswith(('sh', 'sz', 'bj')) else code
-            df = hist_df_all[hist_df_all['股票代码'] == pure_code].copy()
-
-            if df.empty or len(df) < 30:
-                continue
-
-            for col in ['close', 'open', 'high', 'low']:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-            df.dropna(subset=['close'], inplace=True)
-            if df.empty:
-                continue
-
-            if 'close' not in df.columns or 'open' not in df.columns:
-                print(f"[ERROR] 股票 {code}: 缺少必要的 OHLC 列，跳过。")
-                continue
-
-            df = MACDAnalyzer._custom_macd(self, df)
-
-            try:
-                latest_row = df.iloc[-1]
-                mom_12269 = MACDAnalyzer._calculate_macd_momentum(df, 'DIF_12269', 'DEA_12269')
-                mom_6135 = MACDAnalyzer._calculate_macd_momentum(df, 'DIF_6135', 'DEA_6135')
-                ta_signals['MACD_DIF_MOMENTUM'] = pd.concat([
-                    ta_signals['MACD_DIF_MOMENTUM'],
-                    pd.DataFrame([{
-                        '股票代码': code,
-                        'MACD_12269_DIF': latest_row.get('DIF_12269', 0),
-                        'MACD_12269_动能': mom_12269,
-                        'MACD_6135_DIF': latest_row.get('DIF_6135', 0),
-                        'MACD_6135_动能': mom_6135,
-                    }])
-                ], ignore_index=True)
-            except Exception as e:
-                print(f"[WARN] {code} 动能计算失败: {e}")
-
-            # MACD 12269
-            detail_col_12269 = 'MACD_12269_SIGNAL_DETAIL'
-            if detail_col_12269 in df.columns and df[detail_col_12269].iloc[-1] != '':
-                signal_detail = df[detail_col_12269].iloc[-1]
-                ta_signals['MACD_12269'] = pd.concat([
-                    ta_signals['MACD_12269'],
-                    pd.DataFrame([{'股票代码': code, 'MACD_12269_Signal': signal_detail}])
-                ], ignore_index=True)
-
-            # MACD 6135
-            detail_col_6135 = 'MACD_6135_SIGNAL_DETAIL'
-            if detail_col_6135 in df.columns and df[detail_col_6135].iloc[-1] != '':
-                signal_detail = df[detail_col_6135].iloc[-1]
-                ta_signals['MACD_6135'] = pd.concat([
-                    ta_signals['MACD_6135'],
-                    pd.DataFrame([{'股票代码': code, 'MACD_6135_Signal': signal_detail}])
-                ], ignore_index=True)
-
-            # KDJ
-            df.ta.stoch(append=True, close='close', high='high', low='low')
-            kdj_cols = [col for col in df.columns if col.startswith('STOCHk_') or col.startswith('STOCHd_')]
-            if len(kdj_cols) >= 2:
-                k_col = kdj_cols[0]
-                d_col = kdj_cols[1]
-                j_col = 'KDJ_J'
-                df[j_col] = 3 * df[k_col] - 2 * df[d_col]
-
-                kdj_cross = (df[k_col] > df[d_col]) & (df[k_col].shift(1) <= df[d_col].shift(1))
-                j_oversold = df[j_col].shift(1).rolling(window=3).min() < 0
-                kd_oversold = (df[k_col] < 20) & (df[d_col] < 20)
-
-                window = 10
-                curr_low = df['low'].iloc[-1]
-                curr_k = df[k_col].iloc[-1]
-                min_k_window = df[k_col].iloc[-window:-1].min()
-                min_low_window = df['low'].iloc[-window:-1].min()
-                is_divergence = (curr_low <= min_low_window * 1.02) & (curr_k > min_k_window * 1.1)
-
-                ma5 = df['close'].rolling(window=5).mean()
-                above_ma5 = df['close'] > ma5
-
-                last_row = df.iloc[-1]
-                prev_row = df.iloc[-2]
-
-                signal_msg = ""
-                if prev_row[j_col] < 0 and last_row[j_col] > 5 and kdj_cross.iloc[-1]:
-                    signal_msg = "极值J线反转"
-                elif kdj_cross.iloc[-1] and is_divergence and last_row[k_col] < 30:
-                    signal_msg = "底背离金叉"
-                elif (kd_oversold.iloc[-5:-1].sum() > 0) and kdj_cross.iloc[-1] and above_ma5.iloc[-1]:
-                    signal_msg = "趋势确认金叉"
-                elif (kd_oversold.iloc[-5:-1].sum() > 0) and kdj_cross.iloc[-1]:
-                    signal_msg = "低位超卖金叉"
-
-                if signal_msg:
-                    ta_signals['KDJ'] = pd.concat([
-                        ta_signals['KDJ'],
-                        pd.DataFrame([{
-                            '股票代码': code,
-                            'KDJ_Signal': f"{signal_msg} (K={last_row[k_col]:.1f}, J={last_row[j_col]:.1f})"
-                        }])
-                    ], ignore_index=True)
-
-            # CCI
-            df.ta.cci(append=True, close='close', high='high', low='low')
-            cci_cols = [col for col in df.columns if col.startswith('CCI_')]
-            if cci_cols:
-                cci_col = cci_cols[0]
-                current_cci = df[cci_col].iloc[-1]
-                cci_signal = self._classify_cci_level(current_cci)
-                if not cci_signal:
-                    cci_signal = f"常态波动 ({current_cci:.2f})"
-                ta_signals['CCI'] = pd.concat([
-                    ta_signals['CCI'],
-                    pd.DataFrame([{'股票代码': code, 'CCI_Signal': cci_signal}])
-                ], ignore_index=True)
-
-            # RSI
-            df.ta.rsi(append=True, close='close', length=14)
-            rsi_cols = [col for col in df.columns if col.startswith('RSI_')]
-            if rsi_cols:
-                rsi_col = rsi_cols[0]
-                curr_rsi = df[rsi_col].iloc[-1]
-                window = 10
-                curr_low = df['low'].iloc[-1]
-                min_low_window = df['low'].iloc[-window:-1].min()
-                min_rsi_window = df[rsi_col].iloc[-window:-1].min()
-                is_price_low = curr_low <= (min_low_window * 1.02)
-                is_rsi_divergence = (is_price_low) and (curr_rsi > min_rsi_window * 1.05) and (curr_rsi < 50)
-                rsi_msg = f"RSI={curr_rsi:.1f}"
-                if is_rsi_divergence:
-                    rsi_msg = f"RSI底背离! ({curr_rsi:.1f})"
-                ta_signals['RSI'] = pd.concat([
-                    ta_signals['RSI'],
-                    pd.DataFrame([{'股票代码': code, 'RSI_Signal': rsi_msg}])
-                ], ignore_index=True)
-
-            # BOLL
-            df.ta.bbands(append=True, length=20, std=2, close='close')
-            boll_cols = [col for col in df.columns if col.startswith('BBL_')]
-            if boll_cols:
-                lower_band = boll_cols[0]
-                upper_band = [col for col in df.columns if col.startswith('BBU_')][0]
-                df['BOLL_BANDWIDTH'] = (df[upper_band] - df[lower_band]) / df['close']
-                is_narrow = df['BOLL_BANDWIDTH'].iloc[-5:].mean() < df['BOLL_BANDWIDTH'].mean()
-                boll_msg = "低波/缩口" if is_narrow else "常态/张口"
-                ta_signals['BOLL'] = pd.concat([
-                    ta_signals['BOLL'],
-                    pd.DataFrame([{'股票代码': code, 'BOLL_Signal': boll_msg}])
-                ], ignore_index=True)
+        digests = memo.digests(panel, INDICATOR_PARAMS, self.required_lookback())
+        snapshot = memo.get_many(panel.codes, digests)
+        missing = [i for i, code in enumerate(panel.codes) if code not in snapshot]
+        print(f"[INFO] 指标缓存命中 {len(snapshot)} 只股票，需计算 {len(missing)} 只。")
+        if missing:
+            computed, _ = ParallelSignalEngine(INDICATOR_PARAMS, self.workers).run(panel.take(missing))
+            computed = computed.to_dict('index')
+            memo.put_many(computed, {panel.codes[i]: digests[i] for i in missing})
+            snapshot.update(computed)
+        memo.save()
+        return snapshot
+
+    def process_signals_incremental(self, all_codes: List[str], history_loader, end_date: str,
+                                    state_store: IndicatorStateStore, spot_df: pd.DataFrame) -> Dict[
+        str, pd.DataFrame]:
+        """
+        增量模式：读取上次运行保存的指标状态，只把之后新增的K线逐根折入；
+        无状态、状态锚点K线缺失或复权比例已变化（除权后历史被重算）的股票才加载预热窗口全量计算。
+        计算结果与 process_signals 相同，保存新状态供下次使用。
+        全量计算的股票须产出指标状态，因此不经过指标结果缓存（memo_cache 只用于 process_signals）。
+        """
+        print(f"\n正在对 {len(all_codes)} 只股票进行技术分析（增量模式）...")
+
+        pure_codes_list = self._pure_codes(all_codes)
+        symbol_of = dict(zip(pure_codes_list, all_codes))
+        columns = KlineHistoryLoader.COLUMNS + ['adj_ratio']
+        engine = PanelSignalEngine(INDICATOR_PARAMS)
+        states = []
+        rebuild = list(dict.fromkeys(pure_codes_list))
+
+        state = state_store.load(INDICATOR_PARAMS)
+        if state is not None:
+            state = state.take([code for code in rebuild if code in state.column_of])
+            frames = []
+            # 按状态最后交易日分组读取（锚点K线及其后的新K线），通常只有一组
+            for last_date in np.unique(state.last_date):
+                group = [code for code, d in zip(state.codes, state.last_date) if d == last_date]
+                frames.append(history_loader.read_typed([symbol_of[code] for code in group], start_date=last_date,
+                                                        end_date=end_date, columns=columns))
+            bars = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+            state, stale = state.advance(engine, self._prepare_history(bars, state.codes))
+            states.append(state)
+            advanced = set(state.codes)
+            rebuild = [code for code in rebuild if code not in advanced]
+            print(f"[INFO] 指标状态增量折算 {len(state.codes)} 只股票；"
+                  f"{len(stale)} 只锚点缺失或复权比例变化，与 {len(rebuild) - len(stale)} 只无状态股票一并全量计算。")
+
+        if rebuild:
+            hist_df = history_loader.load([symbol_of[code] for code in rebuild], self.required_lookback(),
+                                          end_date=end_date, columns=columns)
+            if not hist_df.empty:
+                hist_df = self._prepare_history(hist_df, rebuild)
+                panel = KlinePanel.from_long(hist_df, rebuild, min_rows=MIN_HISTORY_ROWS)
+                # 各股票最后一根有效K线的复权比例，作为下次增量折算的锚点
+                last_bars = hist_df[hist_df['close'].notna()].sort_values('date', kind='stable')
+                adj_ratio = last_bars.drop_duplicates('股票代码', keep='last').set_index('股票代码')['adj_ratio']
+                _, rebuilt = ParallelSignalEngine(INDICATOR_PARAMS, self.workers).run(
+                    panel, adj_ratio.reindex(panel.codes).to_numpy(dtype=np.float64))
+                states.append(rebuilt)
+                print(f"[INFO] 全量计算指标面板: {panel.shape[1]} 只股票 × {panel.shape[0]} 根K线。")
+
+        state = IndicatorState.concat(states, engine)
+        state_store.save(state, INDICATOR_PARAMS)
+        snapshot = engine.latest(state.panel(), state.tails).to_dict('index')
+        return self._build_ta_signals(all_codes, pure_codes_list, snapshot)
+
+    @staticmethod
+    def signal_texts(snapshot: pd.DataFrame) -> pd.DataFrame:
+        """
+        把信号快照（PanelSignalEngine.latest / evaluate 的字段，任意行数）向量化地整理为各指标的信号文字，
+        无信号或指标不可用时为空串；同时带出两组 MACD 的 DIF 与动能。
+        """
+        def fmt(values, spec: str) -> pd.Series:
+            return pd.Series(values, index=snapshot.index, dtype='float64').map(spec.format)
+
+        out = pd.DataFrame(index=snapshot.index)
+        for name in INDICATOR_PARAMS['MACD']:
+            out[f'MACD_{name}_Signal'] = snapshot[f'MACD_{name}_SIGNAL_DETAIL'].astype(str)
+        for name in INDICATOR_PARAMS['MACD']:
+            out[f'MACD_{name}_DIF'] = snapshot[f'DIF_{name}'].astype('float64')
+            out[f'MACD_{name}_动能'] = snapshot[f'MACD_{name}_动能'].astype(str)
+
+        kdj_signal = snapshot['KDJ_SIGNAL'].astype(str)
+        out['KDJ_Signal'] = (kdj_signal + ' (K=' + fmt(snapshot['KDJ_K'], '{:.1f}')
+                             + ', J=' + fmt(snapshot['KDJ_J'], '{:.1f}') + ')').where(kdj_signal != '', '')
+
+        # 与 MACDAnalyzer._classify_cci_level 的分档相同，常态区间显示为“常态波动”
+        cci = snapshot['CCI'].to_numpy(dtype='float64')
+        with np.errstate(invalid='ignore'):
+            level = np.select([cci > 200, cci >= 100, cci > -100, cci >= -200],
+                              ['极度超买', '强势超买', '常态波动', '弱势超卖'], default='极度超卖')
+        cci_text = (pd.Series(level, index=snapshot.index) + ' (' + fmt(cci, '{:.2f}') + ')').where(~np.isnan(cci), 'N/A')
+        out['CCI_Signal'] = cci_text.where(snapshot['HAS_CCI'].astype(bool), '')
+
+        rsi = fmt(snapshot['RSI'], '{:.1f}')
+        rsi_text = ('RSI底背离! (' + rsi + ')').where(snapshot['RSI_DIVERGENCE'].astype(bool), 'RSI=' + rsi)
+        out['RSI_Signal'] = rsi_text.where(snapshot['HAS_RSI'].astype(bool), '')
+
+        boll_text = pd.Series(np.where(snapshot['BOLL_NARROW'].astype(bool), '低波/缩口', '常态/张口'),
+                              index=snapshot.index)
+        out['BOLL_Signal'] = boll_text.where(snapshot['HAS_BOLL'].astype(bool), '')
+        return out
+
+    def _build_ta_signals(self, all_codes: List[str], pure_codes_list: List[str],
+                          snapshot: Dict[str, Dict]) -> Dict[str, pd.DataFrame]:
+        """按股票顺序把信号快照整理为各指标的信号表"""
+        ta_signals = self._empty_signals()
+        pairs = [(code, pure_code) for code, pure_code in zip(all_codes, pure_codes_list) if pure_code in snapshot]
+        if pairs:
+            frame = pd.DataFrame.from_dict({i: snapshot[pure_code] for i, (_, pure_code) in enumerate(pairs)},
+                                           orient='index')
+            texts = self.signal_texts(frame)
+            texts.insert(0, '股票代码', [code for code, _ in pairs])
+
+            ta_signals['MACD_DIF_MOMENTUM'] = texts[ta_signals['MACD_DIF_MOMENTUM'].columns].reset_index(drop=True)
+            for key in ta_signals:
+                if key == 'MACD_DIF_MOMENTUM':
+                    continue
+                column = f'{key}_Signal'
+                ta_signals[key] = texts.loc[texts[column] != '', ['股票代码', column]].reset_index(drop=True)
 
         for key in ta_signals:
             if not ta_signals[key].empty and '股票代码' in ta_signals[key].columns:
                 # 提取 6 位数字，去除 sh/sz 等前缀
                 ta_signals[key]['股票代码'] = ta_signals[key]['股票代码'].astype(str).str.extract(r'(\d{6})')
         return ta_signals
+
+
+def _self_check():
+    """
+    测试代码：合成行情上，默认的增量模式（含首次全量、逐日折算、除权重算、同日重跑）与带结果缓存的全量模式信号一致；
+    按交易日历窗口加载时，停牌股票在窗口前移后仍命中结果缓存
+    """
+    import os
+    import tempfile
+    from DataManager.DataProvider import FakeMarketProvider
+
+    mk = FakeMarketProvider(n_symbols=300, n_days=300, seed=7).market
+    codes, dates = list(mk['symbols']), pd.DatetimeIndex(mk['dates'])
+    bars = pd.DataFrame({'trade_date': np.tile(dates.values, len(codes)),
+                         'symbol': np.repeat(np.array(codes), len(dates))})
+    for col in ['open', 'close', 'high', 'low']:
+        bars[col] = mk[col].T.ravel()
+    bars['adj_ratio'] = 1.0
+    bars = bars[np.random.default_rng(7).random(len(bars)) > 0.03].reset_index(drop=True)  # 随机停牌
+
+    class MemoryKlineLoader:
+        """内存中的 KlineHistoryLoader：load 返回截止日前的全部K线，使两种模式所用历史完全相同"""
+        COLUMNS = KlineHistoryLoader.COLUMNS
+
+        def read_typed(self, symbols, start_date=None, end_date=None, columns=None):
+            df = bars[bars['symbol'].isin(symbols)]
+            if start_date is not None:
+                df = df[df['trade_date'] >= pd.Timestamp(start_date)]
+            if end_date is not None:
+                df = df[df['trade_date'] <= pd.Timestamp(end_date)]
+            return df[columns or self.COLUMNS].sort_values(['symbol', 'trade_date']).reset_index(drop=True)
+
+        def load(self, symbols, lookback, end_date, columns=None):
+            return self.read_typed(symbols, end_date=end_date, columns=columns)
+
+    def same(a: Dict[str, pd.DataFrame], b: Dict[str, pd.DataFrame]) -> bool:
+        for key in a:
+            x, y = a[key].reset_index(drop=True), b[key].reset_index(drop=True)
+            if list(x.columns) != list(y.columns) or len(x) != len(y):
+                return False
+            for col in x.columns:
+                if pd.api.types.is_float_dtype(x[col]):
+                    if not np.allclose(x[col], y[col], rtol=1e-9, atol=1e-9, equal_nan=True):
+                        return False
+                elif not (x[col].astype(str) == y[col].astype(str)).all():
+                    return False
+        return True
+
+    loader, work_dir = MemoryKlineLoader(), tempfile.mkdtemp()
+    store = IndicatorStateStore(work_dir)
+    incremental = TASignalProcessor(None)
+    full = TASignalProcessor(None, memo_cache=IndicatorMemoCache(work_dir, 5000))
+    for i, day in enumerate(dates[-4:]):
+        if i == 2:
+            # 除权：一只股票的历史按新复权比例整体重算，增量模式须对其全量重算
+            mask = (bars['symbol'] == codes[5]) & (bars['trade_date'] < day)
+            bars.loc[mask, ['open', 'close', 'high', 'low']] *= 0.9
+            bars.loc[mask, 'adj_ratio'] = 0.9
+        end = day.strftime('%Y-%m-%d')
+        for _ in range(1 if i else 2):  # 首日同日重跑一次
+            inc = incremental.process_signals_incremental(codes, loader, end, store, None)
+            assert same(inc, full.process_signals(codes, loader.load(codes, 0, end), None)), end
+    print("[INFO] 增量模式与带结果缓存的全量模式信号一致。")
+
+    # 停牌：最后 5 个交易日无K线，加载窗口（最近 lookback 个交易日）逐日前移时它每天丢掉最早的一根
+    lookback, pure_codes = TASignalProcessor.required_lookback(), TASignalProcessor._pure_codes(codes)
+    suspended = pure_codes[9]
+    bars = bars[~((bars['symbol'] == codes[9]) & (bars['trade_date'] > dates[-6]))].reset_index(drop=True)
+    memo = IndicatorMemoCache(os.path.join(work_dir, 'memo'), 5000)
+    cached = TASignalProcessor(None, memo_cache=memo)
+    keys = []
+    for day in dates[-4:]:
+        end = day.strftime('%Y-%m-%d')
+        hist = loader.read_typed(codes, start_date=dates[dates <= day][-lookback], end_date=end)
+        panel = KlinePanel.from_long(TASignalProcessor._prepare_history(hist.copy(), pure_codes), pure_codes,
+                                     min_rows=MIN_HISTORY_ROWS)
+        key = memo.digests(panel, INDICATOR_PARAMS, lookback)[panel.codes.index(suspended)]
+        if keys:
+            assert memo.get_many([suspended], [key]), f"{end} 停牌股票未命中指标结果缓存"
+        keys.append(key)
+        cached.process_signals(codes, hist, None)
+    print("[INFO] 加载窗口前移后停牌股票命中指标结果缓存。")
+
+    # 只修订较早一段的复权价格（最后 60 根之前），仍在指标预热窗口内，缓存键须随之变化
+    old = (bars['symbol'] == codes[9]) & (bars['trade_date'] < dates[-100])
+    bars.loc[old, ['open', 'close', 'high', 'low']] *= 0.9
+    hist = loader.read_typed(codes, start_date=dates[-lookback], end_date=dates[-1].strftime('%Y-%m-%d'))
+    panel = KlinePanel.from_long(TASignalProcessor._prepare_history(hist.copy(), pure_codes), pure_codes,
+                                 min_rows=MIN_HISTORY_ROWS)
+    key = memo.digests(panel, INDICATOR_PARAMS, lookback)[panel.codes.index(suspended)]
+    assert key != keys[-1] and not memo.get_many([suspended], [key]), "较早K线修订后仍命中指标结果缓存"
+    print("[INFO] 预热窗口内较早K线修订后指标结果缓存失效。")
+
+
+if __name__ == "__main__":
+    _self_check()
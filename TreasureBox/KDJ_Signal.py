@@ -8,6 +8,7 @@ from openpyxl.utils import get_column_letter
 from sqlalchemy import create_engine
 import warnings
 from ConfigParser import Config  # 确保 Config.py 在同一环境或路径下
+from DataManager.KlineHistoryLoader import KlineHistoryLoader
 
 if __name__ == "__main__":
     # --- 1. 配置与路径初始化 ---
@@ -248,17 +249,12 @@ if __name__ == "__main__":
     # --- 4.8 获取30天交易数据 ---
     engine = create_engine(DB_URI)
     prefixed_stock_symbols = [stock_info_map[code]['symbol'] for code in final_effective_stock_codes]
-    in_clause = "', '".join(prefixed_stock_symbols)
 
-    query_kline = f"""
-    SELECT symbol, trade_date, "close" 
-    FROM stock_daily_kline 
-    WHERE symbol IN ('{in_clause}') 
-    AND trade_date >= '{one_month_ago}' 
-    AND "close" IS NOT NULL 
-    ORDER BY symbol, trade_date;
-    """
-    df_kline = pd.read_sql(query_kline, engine)
+    # COPY 流式读取，收盘价直接解析为 float64
+    df_kline = KlineHistoryLoader(engine).read_typed(prefixed_stock_symbols, start_date=one_month_ago,
+                                                     columns=['symbol', 'trade_date', 'close'])
+    df_kline = df_kline.dropna(subset=['close'])
+    df_kline['symbol'] = df_kline['symbol'].astype(str)
     engine.dispose()
 
     if df_kline.empty:
@@ -1,18 +1,18 @@
 import os
-import tushare as ts
 import pandas as pd
+from DataManager.DataProvider import DataProvider, TushareProvider
 
 
 class TushareStockManager:
     """Tushare 股票数据管理类"""
 
-    def __init__(self, token: str):
+    def __init__(self, token: str, provider: DataProvider = None):
         """
         初始化 API 连接
         :param token: Tushare 用户凭证
+        :param provider: 行情数据源，默认 Tushare；传入本地合成数据源时不访问接口
         """
-        ts.set_token(token)
-        self.pro = ts.pro_api()
+        self.provider = provider or TushareProvider(token)
         self.HOME_DIRECTORY = os.path.expanduser('~')
 
     def get_basic_data(self, list_status='L', market='主板', save_path='stock_basic_data.txt') -> pd.DataFrame:
@@ -23,16 +23,8 @@ class TushareStockManager:
         :return: 包含指定字段和标准化股票代码的 pandas DataFrame
         """
         try:
-            # 定义需要的字段
-            target_fields = 'ts_code,symbol,name,industry,market'
-
-            # 从接口拉取数据
-            df = self.pro.stock_basic(
-                exchange='',
-                list_status=list_status,
-                market=market,
-                fields=target_fields
-            )
+            # 从数据源拉取数据（字段：ts_code,symbol,name,industry,market）
+            df = self.provider.stock_basic(list_status=list_status, market=market)
 
             if df.empty:
                 print("⚠️ 警告：获取到的数据为空，请检查权限或参数。")